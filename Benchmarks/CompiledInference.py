@@ -0,0 +1,79 @@
+# -*- coding: latin-1 -*-
+import sys
+import json
+import time
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.ensemble import ExtraTreesRegressor
+from sklearn.linear_model import LinearRegression
+from sklearn.linear_model import Ridge
+from sklearn.linear_model import Lasso
+from ServicesDisolution.Benchmarks import Synthetic
+from ServicesDisolution.DataProcessing import Processing
+from ServicesDisolution.Simulation import CompiledModel
+
+# Tamaños de lote medidos: una predicción, un enjambre de optimización y un bloque de predicciones por lotes
+SIZES = [1,50,1000]
+
+# METODO: se obtienen los modelos de prueba, entrenados con entradas sintéticas (matriz de entradas del simulador) y
+# sus medias de disolución, de una y de varias salidas
+# PARAMETROS DE ENTRADA:
+# - features(Array): matriz de entradas
+# - means(Array): medias de disolución
+# PARAMETROS DE SALIDA:
+# - models(List): pares (nombre, modelo entrenado)
+def getModels(features, means):
+    return [('bosque', RandomForestRegressor(n_estimators=50,max_depth=10,random_state=0).fit(features,means)),
+            ('bosqueProfundo', RandomForestRegressor(n_estimators=100,random_state=0).fit(features,means)),
+            ('arbolesExtremos', ExtraTreesRegressor(n_estimators=30,random_state=0).fit(features,means)),
+            ('lineal', LinearRegression().fit(features,means)),
+            ('ridge', Ridge().fit(features,means[:,1])),
+            ('lasso', Lasso(alpha=0.1).fit(features,means))]
+
+# METODO: se verifica que cada modelo compilado prediga lo mismo que el original (sobre experimentos sintéticos nuevos y
+# con la verificación de CompiledModel.verifyModel) y se compara la latencia de predict de ambos. En los lotes grandes
+# de un conjunto de árboles el modelo compilado usa el original (ver CompiledModel.TREES_BATCH_LIMIT).
+# PARAMETROS DE ENTRADA:
+# - sizes(List): tamaños de lote
+# - repeat(Int): número de repeticiones, se toma el mejor tiempo
+# PARAMETROS DE SALIDA:
+# - results(List): por modelo, si es equivalente, diferencia máxima y milisegundos por llamado de ambos
+def benchmark(sizes=SIZES, repeat=20):
+    rng = np.random.RandomState(0)
+    features = rng.rand(2000,len(Processing.ORDER))*100
+    means = Synthetic.getSyntheticMeans(features)+rng.normal(0,1,(2000,3))
+    test = rng.rand(max(sizes),len(Processing.ORDER))*100
+    results = []
+    for name,model in getModels(features,means):
+        compiled = CompiledModel.compileModel(model)
+        expected = model.predict(test)
+        estimate = compiled.predictArrays(test)
+        result = {'modelo': name, 'equivalente': bool(CompiledModel.verifyModel(model,compiled)) and
+                  np.allclose(estimate,expected,rtol=CompiledModel.TOLERANCE,atol=CompiledModel.TOLERANCE),
+                  'diferenciaMaxima': float(np.abs(estimate-expected).max())}
+        for n in sizes:
+            result['originalMs%d' % n] = bestTime(lambda: model.predict(test[:n]),repeat)*1000
+            result['compiladoMs%d' % n] = bestTime(lambda: compiled.predict(test[:n]),repeat)*1000
+        results.append(result)
+    return results
+
+# METODO: se retorna el mejor tiempo, en segundos, de varias ejecuciones de una función
+# PARAMETROS DE ENTRADA:
+# - function(Function): función a medir
+# - repeat(Int): número de repeticiones
+# PARAMETROS DE SALIDA:
+# - best(Float): mejor tiempo en segundos
+def bestTime(function, repeat):
+    best = None
+    for i in range(repeat):
+        start = time.time()
+        function()
+        elapsed = time.time()-start
+        if(best is None or elapsed < best):
+            best = elapsed
+    return best
+
+if __name__ == "__main__":
+    results = benchmark()
+    print(json.dumps(results, indent=1, sort_keys=True))
+    sys.exit(0 if all(result['equivalente'] for result in results) else 1)
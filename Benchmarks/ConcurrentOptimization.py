@@ -0,0 +1,53 @@
+# -*- coding: latin-1 -*-
+import sys
+import json
+import time
+import shutil
+import tempfile
+import threading
+from ServicesDisolution.Benchmarks import Synthetic
+from ServicesDisolution.Optimization import OptimizationExperiment
+from ServicesDisolution.Optimization import Workers
+
+# METODO: prueba de carga: se lanzan solicitudes de optimización concurrentes al grupo de trabajadores, cada una con su
+# semilla, y se verifica que cada resultado sea igual al de la misma solicitud ejecutada sola
+# PARAMETROS DE ENTRADA:
+# - requests(Int): número de solicitudes distintas
+# - repeat(Int): número de veces que se lanza cada solicitud al mismo tiempo
+# PARAMETROS DE SALIDA:
+# - result(Dict): tiempos secuencial y concurrente, y número de resultados distintos al esperado
+def stress(requests=4, repeat=3):
+    route = tempfile.mkdtemp()
+    try:
+        Synthetic.setUpEnvironment(route)
+        fJSONs = [Synthetic.generateOptimizationRequest(seed) for seed in range(requests)]
+
+        start = time.time()
+        expected = [OptimizationExperiment.makeOptimization(fJSON) for fJSON in fJSONs]
+        sequential = time.time()-start
+
+        # El grupo se crea después de configurar el ambiente para que los procesos lo hereden
+        Workers.getPool()
+        results = {}
+        def send(i, j):
+            results[(i,j)] = Workers.runOptimization(fJSONs[i])
+        threads = [threading.Thread(target=send,args=(i,j)) for j in range(repeat) for i in range(requests)]
+        start = time.time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        concurrent = time.time()-start
+
+        mismatches = [key for key in results if results[key] != expected[key[0]]]
+        return {'solicitudes': requests*repeat, 'secuencialPorSolicitud': sequential/requests,
+                'concurrenteTotal': concurrent, 'trabajadores': Workers.WORKERS, 'modo': Workers.MODE,
+                'distintos': len(mismatches)}
+    finally:
+        Workers.closePool()
+        shutil.rmtree(route)
+
+if __name__ == "__main__":
+    result = stress()
+    print(json.dumps(result))
+    sys.exit(1 if result['distintos'] else 0)
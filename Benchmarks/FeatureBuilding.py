@@ -0,0 +1,58 @@
+# -*- coding: latin-1 -*-
+import tempfile
+import shutil
+import time
+from ServicesDisolution.Benchmarks import Synthetic
+from ServicesDisolution.DataProcessing import Processing
+from ServicesDisolution.DataProcessing import ReferenceTables
+
+SIZES = [1,100,10000]
+
+# METODO: se mide el tiempo por experimento de construir la matriz de entrada del simulador (buildFeatureMatrix) y de la
+# vista como tabla (organizeExperiment), usando tablas de referencia sintéticas
+# PARAMETROS DE ENTRADA:
+# - sizes(List): números de experimentos a medir
+# - repeat(Int): número de repeticiones, se toma la mejor
+# PARAMETROS DE SALIDA:
+# - results(List): microsegundos por experimento para cada tamaño
+def benchmark(sizes=SIZES, repeat=3):
+    route = tempfile.mkdtemp()
+    previousRoute = ReferenceTables.TABLES_ROUTE
+    try:
+        Synthetic.writeReferenceTables(route)
+        ReferenceTables.TABLES_ROUTE = route
+        ReferenceTables.preloadTables()
+
+        results = []
+        for n in sizes:
+            experimentsJSON = Synthetic.generateExperiments(n)
+            result = {'experimentos': n}
+            result['matrizUs'] = bestTime(lambda: Processing.buildFeatureMatrix(experimentsJSON),repeat)/n*1e6
+            # La vista como tabla se mide con pocos experimentos, su costo por fila no depende del tamaño
+            sample = experimentsJSON[:100]
+            result['tablaUs'] = bestTime(lambda: [Processing.organizeExperiment(e) for e in sample],repeat)/len(sample)*1e6
+            results.append(result)
+        return results
+    finally:
+        ReferenceTables.TABLES_ROUTE = previousRoute
+        shutil.rmtree(route)
+
+# METODO: se retorna el mejor tiempo, en segundos, de varias ejecuciones de una función
+# PARAMETROS DE ENTRADA:
+# - function(Function): función a medir
+# - repeat(Int): número de repeticiones
+# PARAMETROS DE SALIDA:
+# - best(Float): mejor tiempo en segundos
+def bestTime(function, repeat):
+    best = None
+    for i in range(repeat):
+        start = time.time()
+        function()
+        elapsed = time.time()-start
+        if(best is None or elapsed < best):
+            best = elapsed
+    return best
+
+if __name__ == "__main__":
+    for result in benchmark():
+        print('%(experimentos)6d experimentos: %(matrizUs)9.1f us/fila (matriz), %(tablaUs)9.1f us/fila (tabla)' % result)
@@ -0,0 +1,54 @@
+# -*- coding: latin-1 -*-
+import json
+import time
+import shutil
+import tempfile
+from ServicesDisolution.Benchmarks import Synthetic
+from ServicesDisolution.Optimization import Workers
+
+# METODO: se compara la latencia de una optimización de un solo inicio con la de una de varios inicios ejecutada en el
+# grupo de procesos trabajadores, y la mejora del F2 que se obtiene con los inicios adicionales
+# PARAMETROS DE ENTRADA:
+# - requests(Int): número de solicitudes sintéticas
+# - starts(Int): número de inicios
+# PARAMETROS DE SALIDA:
+# - result(Dict): latencias promedio, F2 promedio de un inicio y del mejor inicio, y dispersión promedio
+def benchmark(requests=5, starts=4):
+    route = tempfile.mkdtemp()
+    try:
+        Synthetic.setUpEnvironment(route)
+        Workers.getPool()
+        single = []
+        multi = []
+        singleF2 = []
+        bestF2 = []
+        spread = []
+        for seed in range(requests):
+            fJSON = Synthetic.generateOptimizationRequest(seed)
+            fJSON['semilla'] = seed*1000
+
+            start = time.time()
+            Workers.runOptimization(fJSON)
+            single.append(time.time()-start)
+
+            fJSON['inicios'] = starts
+            start = time.time()
+            data = json.loads(Workers.runOptimization(fJSON))
+            multi.append(time.time()-start)
+
+            f2 = data['inicios']['f2']
+            if(f2[0] is not None):
+                singleF2.append(f2[0])
+            if(data['inicios']['factibles'] > 0):
+                bestF2.append(data['inicios']['f2Maximo'])
+                spread.append(data['inicios']['f2Maximo']-data['inicios']['f2Minimo'])
+        mean = lambda values: sum(values)/len(values) if values else None
+        return {'solicitudes': requests, 'inicios': starts, 'trabajadores': Workers.WORKERS, 'modo': Workers.MODE,
+                'latenciaUnInicio': mean(single), 'latenciaVariosInicios': mean(multi),
+                'f2UnInicio': mean(singleF2), 'f2MejorInicio': mean(bestF2), 'rangoF2': mean(spread)}
+    finally:
+        Workers.closePool()
+        shutil.rmtree(route)
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(), indent=1, sort_keys=True))
@@ -0,0 +1,73 @@
+# -*- coding: latin-1 -*-
+import json
+import shutil
+import tempfile
+import numpy as np
+from ServicesDisolution.Benchmarks import Synthetic
+from ServicesDisolution.Optimization import OptimizationExperiment
+from ServicesDisolution.Optimization import Swarm
+
+# Variables de la comparación: se incluyen varios porcentajes para que la restricción de suma sea relevante
+VARIABLES = ['porcentajePA','aglutinantes','desintegrantes','diluyentes','lubricantes','tamanoAglutinantes',
+             'durezaPromedio','tiempoMezcladoGranulado','tiempoMezclaTotalFormula']
+
+# METODO: se ejecuta una optimización y se registra la evolución del mejor F2 (evaluaciones, mejor F2) en cada iteración
+# PARAMETROS DE ENTRADA:
+# - fJSON(Dict): solicitud de optimización
+# PARAMETROS DE SALIDA:
+# - factible(Bool): si se encontró una solución factible
+# - history(List): pares (evaluaciones, mejor F2) por iteración, solo cuando hay una solución factible
+def runOptimization(fJSON):
+    history = []
+    def callback(it, g, fg, evaluations):
+        if(fg != Swarm.NOT_FEASIBLE):
+            history.append((evaluations,-fg))
+    optimizer = OptimizationExperiment.Optimizer(fJSON)
+    optimizer.run(callback)
+    return (optimizer.fopt != Swarm.NOT_FEASIBLE, history)
+
+# METODO: se compara el modo de penalización (restricciones como desigualdades) con el modo de reparación (proyección a
+# la región factible). Para cada solicitud el F2 objetivo es el mejor F2 obtenido por cualquiera de los dos modos menos
+# una tolerancia; se reporta el porcentaje de corridas factibles, el porcentaje que alcanza el objetivo, la mediana de
+# evaluaciones hasta alcanzarlo y el F2 promedio obtenido.
+# PARAMETROS DE ENTRADA:
+# - requests(Int): número de solicitudes sintéticas
+# - tolerance(Float): diferencia de F2 con el mejor resultado que se acepta como objetivo alcanzado
+# PARAMETROS DE SALIDA:
+# - results(Dict): resultados por modo
+def benchmark(requests=20, tolerance=0.5):
+    modes = [OptimizationExperiment.PENALTY, OptimizationExperiment.REPAIR]
+    route = tempfile.mkdtemp()
+    try:
+        Synthetic.setUpEnvironment(route)
+        runs = dict((mode,[]) for mode in modes)
+        for seed in range(requests):
+            fJSON = Synthetic.generateOptimizationRequest(seed,VARIABLES)
+            for mode in modes:
+                fJSON['modo'] = mode
+                runs[mode].append(runOptimization(fJSON))
+
+        results = {}
+        for mode in modes:
+            feasible = 0
+            evaluations = []
+            bestF2 = []
+            for i in range(requests):
+                best = max([history[-1][1] for factible,history in [runs[m][i] for m in modes] if history] or [None])
+                factible, history = runs[mode][i]
+                feasible += factible
+                if history:
+                    bestF2.append(history[-1][1])
+                    reached = [e for e,f2 in history if f2 >= best-tolerance]
+                    if reached:
+                        evaluations.append(reached[0])
+            results[mode] = {'corridas': requests, 'factibles': feasible/float(requests),
+                             'exito': len(evaluations)/float(requests),
+                             'evaluacionesMediana': float(np.median(evaluations)) if evaluations else None,
+                             'f2Promedio': float(np.mean(bestF2)) if bestF2 else None}
+        return results
+    finally:
+        shutil.rmtree(route)
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(), indent=1, sort_keys=True))
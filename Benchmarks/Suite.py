@@ -0,0 +1,288 @@
+# -*- coding: latin-1 -*-
+import sys
+import json
+import time
+import shutil
+import socket
+import urllib2
+import argparse
+import platform
+import tempfile
+import threading
+import multiprocessing
+import numpy as np
+import pandas as pd
+import sklearn
+import web
+from web import wsgiserver
+from ServicesDisolution.Benchmarks import Synthetic
+from ServicesDisolution.DataProcessing import Processing
+from ServicesDisolution.Simulation import Prediction
+from ServicesDisolution.Simulation import PredictionCache
+from ServicesDisolution.Optimization import OptimizationExperiment
+from ServicesDisolution.Optimization import Workers
+
+# Tamaños medidos: experimentos por llamado (organización y predicción por lotes) y partículas del enjambre de la
+# optimización. Con --rapido se usan los tamaños pequeños.
+SIZES = [1,100,1000,10000]
+SWARM_SIZES = [10,50,200]
+QUICK_SIZES = [1,100]
+QUICK_SWARM_SIZES = [10,50]
+
+# Aumento relativo del tiempo a partir del cual una medición se considera una regresión al comparar dos ejecuciones
+TOLERANCE = 0.2
+
+# METODO: se retorna el mejor tiempo, en segundos, de varias ejecuciones de una función
+# PARAMETROS DE ENTRADA:
+# - function(Function): función a medir
+# - repeat(Int): número de repeticiones
+# PARAMETROS DE SALIDA:
+# - best(Float): mejor tiempo en segundos
+def bestTime(function, repeat):
+    best = None
+    for i in range(repeat):
+        start = time.time()
+        function()
+        elapsed = time.time()-start
+        if(best is None or elapsed < best):
+            best = elapsed
+    return best
+
+# METODO: se crea el resultado de una medición
+# PARAMETROS DE ENTRADA:
+# - test(String): nombre de la medición
+# - size(Int): tamaño medido (experimentos o partículas)
+# - seconds(Float): mejor tiempo en segundos
+# - items(Int): elementos procesados en ese tiempo, para el tiempo por elemento
+# PARAMETROS DE SALIDA:
+# - result(Dict): medición
+def getResult(test, size, seconds, items):
+    return {'prueba': test, 'tamano': size, 'segundos': seconds, 'usPorElemento': seconds/max(items,1)*1e6}
+
+# METODO: se mide la organización de experimentos: organizeExperiment (un experimento a la vez, como lo usa el
+# servicio) y buildFeatureMatrix (todo el grupo)
+# PARAMETROS DE ENTRADA:
+# - sizes(List): números de experimentos
+# - repeat(Int): número de repeticiones
+# PARAMETROS DE SALIDA:
+# - results(List): mediciones
+def benchmarkProcessing(sizes, repeat):
+    results = []
+    for n in sizes:
+        experimentsJSON = Synthetic.generateExperiments(n)
+        seconds = bestTime(lambda: [Processing.organizeExperiment(e) for e in experimentsJSON],repeat)
+        results.append(getResult('organizeExperiment',n,seconds,n))
+        seconds = bestTime(lambda: Processing.buildFeatureMatrix(experimentsJSON),repeat)
+        results.append(getResult('buildFeatureMatrix',n,seconds,n))
+    return results
+
+# METODO: se miden las predicciones: makePrediction para cada experimento y makeBatchPrediction para todo el grupo,
+# con la caché de predicciones vacía
+# PARAMETROS DE ENTRADA:
+# - sizes(List): números de experimentos
+# - repeat(Int): número de repeticiones
+# PARAMETROS DE SALIDA:
+# - results(List): mediciones
+def benchmarkPrediction(sizes, repeat):
+    def uncached(function):
+        def run():
+            PredictionCache.clear()
+            function()
+        return run
+
+    results = []
+    for n in sizes:
+        experimentsJSON = Synthetic.generateExperiments(n,seed=1)
+        # Una predicción por llamado se mide con a lo sumo 1000 experimentos, su costo por experimento no cambia
+        sample = experimentsJSON[:1000]
+        seconds = bestTime(uncached(lambda: [Prediction.makePrediction(e) for e in sample]),repeat)
+        results.append(getResult('makePrediction',n,seconds,len(sample)))
+        seconds = bestTime(uncached(lambda: Prediction.makeBatchPrediction(experimentsJSON)),repeat)
+        results.append(getResult('makeBatchPrediction',n,seconds,n))
+    return results
+
+# METODO: se mide makeOptimization con distintos tamaños del enjambre. El tiempo por elemento es por evaluación del
+# modelo.
+# PARAMETROS DE ENTRADA:
+# - swarmSizes(List): números de partículas
+# - repeat(Int): número de repeticiones
+# PARAMETROS DE SALIDA:
+# - results(List): mediciones
+def benchmarkOptimization(swarmSizes, repeat):
+    fJSON = Synthetic.generateOptimizationRequest(0)
+    previous = OptimizationExperiment.SWARM_SIZE
+    results = []
+    try:
+        for size in swarmSizes:
+            OptimizationExperiment.SWARM_SIZE = size
+            data = {}
+            def run():
+                PredictionCache.clear()
+                data.update(json.loads(OptimizationExperiment.makeOptimization(fJSON)))
+            seconds = bestTime(run,repeat)
+            results.append(getResult('makeOptimization',size,seconds,data['evaluaciones']))
+    finally:
+        OptimizationExperiment.SWARM_SIZE = previous
+    return results
+
+# METODO: se inicia el servicio en un hilo, en un puerto libre de la máquina local
+# PARAMETROS DE ENTRADA:
+# - Ninguno
+# PARAMETROS DE SALIDA:
+# - server(Server): servidor WSGI iniciado
+# - url(String): dirección del servicio
+def startService():
+    from ServicesDisolution import WebService
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    port = listener.getsockname()[1]
+    listener.close()
+    server = wsgiserver.CherryPyWSGIServer(('127.0.0.1', port), WebService.app.wsgifunc(), numthreads=4)
+    thread = threading.Thread(target=server.start)
+    thread.daemon = True
+    thread.start()
+    while not server.ready:
+        time.sleep(0.05)
+    return (server, 'http://127.0.0.1:%d' % port)
+
+# METODO: se envía una solicitud POST al servicio
+# PARAMETROS DE ENTRADA:
+# - url(String): dirección de la ruta
+# - body(String): cuerpo de la solicitud
+# PARAMETROS DE SALIDA:
+# - content(String): respuesta
+def post(url, body):
+    response = urllib2.urlopen(url, body, timeout=600)
+    content = response.read()
+    response.close()
+    return content
+
+# METODO: se miden las rutas del servicio de principio a fin (HTTP en la máquina local): /simulator y /data_processing
+# con un experimento, /simulator/batch con cada tamaño y /optimization con el enjambre por defecto
+# PARAMETROS DE ENTRADA:
+# - sizes(List): números de experimentos del lote
+# - repeat(Int): número de repeticiones
+# PARAMETROS DE SALIDA:
+# - results(List): mediciones
+def benchmarkService(sizes, repeat):
+    # Las optimizaciones se ejecutan en hilos para no crear un grupo de procesos en la medición
+    previousMode = Workers.MODE
+    Workers.MODE = 'hilos'
+    server, url = startService()
+    results = []
+    try:
+        experimentJSON = json.dumps(Synthetic.generateExperiments(1,seed=2)[0])
+        for path in ['/simulator','/data_processing']:
+            seconds = bestTime(lambda: post(url+path,experimentJSON),max(repeat,20))
+            results.append(getResult('POST '+path,1,seconds,1))
+        for n in sizes:
+            body = json.dumps(Synthetic.generateExperiments(n,seed=3))
+            seconds = bestTime(lambda: post(url+'/simulator/batch',body),repeat)
+            results.append(getResult('POST /simulator/batch',n,seconds,n))
+        body = json.dumps(Synthetic.generateOptimizationRequest(1))
+        seconds = bestTime(lambda: post(url+'/optimization',body),repeat)
+        results.append(getResult('POST /optimization',OptimizationExperiment.SWARM_SIZE,seconds,1))
+    finally:
+        server.stop()
+        Workers.closePool()
+        Workers.MODE = previousMode
+    return results
+
+# METODO: se obtienen los datos de la máquina y de las versiones de las librerías, para saber si dos ejecuciones se
+# pueden comparar
+# PARAMETROS DE ENTRADA:
+# - Ninguno
+# PARAMETROS DE SALIDA:
+# - environment(Dict): datos del ambiente
+def getEnvironment():
+    return {'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__,
+            'sklearn': sklearn.__version__, 'web': web.__version__, 'plataforma': platform.platform(),
+            'procesador': platform.processor(), 'nucleos': multiprocessing.cpu_count(),
+            'fecha': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+# METODO: se ejecutan todas las mediciones en un ambiente sintético (tablas de referencia, tabla de entradas y modelo
+# en una carpeta temporal, ver Synthetic.setUpEnvironment), sin acceso a la red
+# PARAMETROS DE ENTRADA:
+# - sizes(List): números de experimentos
+# - swarmSizes(List): números de partículas
+# - repeat(Int): número de repeticiones de cada medición
+# PARAMETROS DE SALIDA:
+# - report(Dict): ambiente ('ambiente') y mediciones ('resultados')
+def runSuite(sizes=SIZES, swarmSizes=SWARM_SIZES, repeat=3):
+    route = tempfile.mkdtemp()
+    try:
+        Synthetic.setUpEnvironment(route)
+        # Las tablas y el modelo se cargan antes de medir, la primera medición no debe incluir su carga
+        Prediction.makeBatchPrediction(Synthetic.generateExperiments(1))
+        results = []
+        results.extend(benchmarkProcessing(sizes,repeat))
+        results.extend(benchmarkPrediction(sizes,repeat))
+        results.extend(benchmarkOptimization(swarmSizes,repeat))
+        results.extend(benchmarkService(sizes,repeat))
+        return {'ambiente': getEnvironment(), 'resultados': results}
+    finally:
+        shutil.rmtree(route)
+
+# METODO: se comparan dos ejecuciones de la suite: para cada medición presente en ambas se calcula la razón entre los
+# tiempos y se marcan las que aumentaron más que la tolerancia
+# PARAMETROS DE ENTRADA:
+# - previous(Dict): reporte anterior
+# - current(Dict): reporte actual
+# - tolerance(Float): aumento relativo tolerado
+# PARAMETROS DE SALIDA:
+# - comparison(List): por medición, tiempos de ambas ejecuciones, razón y si es una regresión
+def compareReports(previous, current, tolerance=TOLERANCE):
+    before = dict(((result['prueba'], result['tamano']), result) for result in previous['resultados'])
+    comparison = []
+    for result in current['resultados']:
+        key = (result['prueba'], result['tamano'])
+        if key not in before:
+            continue
+        ratio = result['segundos']/max(before[key]['segundos'],1e-12)
+        comparison.append({'prueba': key[0], 'tamano': key[1], 'anterior': before[key]['segundos'],
+                           'actual': result['segundos'], 'razon': ratio, 'regresion': ratio > 1+tolerance})
+    return comparison
+
+# METODO: punto de entrada de línea de comandos:
+# python -m ServicesDisolution.Benchmarks.Suite [--salida resultados.json] [--comparar anterior.json] [--rapido]
+# Con --comparar el código de salida es 1 si alguna medición tiene una regresión.
+# PARAMETROS DE ENTRADA:
+# - argv(List): argumentos de la línea de comandos
+# PARAMETROS DE SALIDA:
+# - code(Int): código de salida
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Suite de mediciones del simulador con datos sinteticos')
+    parser.add_argument('--salida', help='archivo JSON en donde se escriben los resultados')
+    parser.add_argument('--comparar', help='archivo JSON de una ejecucion anterior')
+    parser.add_argument('--rapido', action='store_true', help='solo tamanos pequenos')
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--tolerancia', type=float, default=TOLERANCE)
+    args = parser.parse_args(argv)
+
+    if args.rapido:
+        report = runSuite(QUICK_SIZES,QUICK_SWARM_SIZES,args.repeticiones)
+    else:
+        report = runSuite(SIZES,SWARM_SIZES,args.repeticiones)
+    content = json.dumps(report, indent=1, sort_keys=True)
+    if args.salida:
+        output = open(args.salida,'wb')
+        output.write(content)
+        output.close()
+    else:
+        print(content)
+
+    if args.comparar:
+        previousFile = open(args.comparar,'rb')
+        previous = json.load(previousFile)
+        previousFile.close()
+        comparison = compareReports(previous,report,args.tolerancia)
+        for item in comparison:
+            print('%-26s %6d %10.4f s %10.4f s %6.2fx%s' % (item['prueba'], item['tamano'], item['anterior'],
+                                                          item['actual'], item['razon'],
+                                                          ' REGRESION' if item['regresion'] else ''))
+        if any(item['regresion'] for item in comparison):
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
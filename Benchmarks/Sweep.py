@@ -0,0 +1,48 @@
+# -*- coding: latin-1 -*-
+import json
+import time
+import shutil
+import tempfile
+from ServicesDisolution.Benchmarks import Synthetic
+from ServicesDisolution.Simulation import Prediction
+from ServicesDisolution.Simulation import PredictionCache
+from ServicesDisolution.Simulation import Sweep
+
+# METODO: se compara un barrido de dos variables con el mismo barrido hecho como una predicción por punto (como se hacía
+# con llamados a /simulator), y se mide el barrido de 100000 puntos por hipercubo latino
+# PARAMETROS DE ENTRADA:
+# - points(Int): valores por variable de la malla
+# PARAMETROS DE SALIDA:
+# - result(Dict): tiempos en segundos
+def benchmark(points=15):
+    route = tempfile.mkdtemp()
+    try:
+        Synthetic.setUpEnvironment(route)
+        fJSON = Synthetic.generateOptimizationRequest(0,['durezaPromedio','tiempoSecado'])
+        fJSON['puntos'] = points
+
+        start = time.time()
+        data = Sweep.makeSweep(fJSON)
+        sweep = time.time()-start
+
+        PredictionCache.clear()
+        start = time.time()
+        for i in range(data['puntos']):
+            experimentJSON = dict(fJSON['experimento'])
+            for name in data['variables']:
+                experimentJSON[name] = data['variables'][name][i]
+            Prediction.makePrediction(experimentJSON)
+        perPoint = time.time()-start
+
+        fJSON['muestreo'] = Sweep.LHS
+        fJSON['puntos'] = Sweep.MAX_POINTS
+        start = time.time()
+        json.dumps(Sweep.makeSweep(fJSON),separators=(',',':'))
+        lhs = time.time()-start
+        return {'puntosMalla': data['puntos'], 'barridoMalla': sweep, 'prediccionPorPunto': perPoint,
+                'puntosLhs': Sweep.MAX_POINTS, 'barridoLhsConJson': lhs}
+    finally:
+        shutil.rmtree(route)
+
+if __name__ == "__main__":
+    print(json.dumps(benchmark(), indent=1, sort_keys=True))
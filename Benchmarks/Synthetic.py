@@ -0,0 +1,176 @@
+# -*- coding: latin-1 -*-
+import os
+import numpy as np
+import pandas as pd
+from ServicesDisolution.DataProcessing import Processing
+from ServicesDisolution.DataProcessing import ReferenceTables
+
+# Cantidad de códigos en las tablas de referencia sintéticas
+N_EXCIPIENTS = 60
+N_PAS = 30
+
+PHYSICAL_CHEMICAL = ['pesoMolecular','logP','pKaBasico','solubilidadEnAgua','logS','areaSuperficialPolar',
+                     'cargaFisiologica','enlacesRotables','enlacesAceptoresDeHidrogeno','enlacesDonadoresDeHidrogeno']
+
+# METODO: se crean en una carpeta tablas de referencia sintéticas (solubilidad de excipientes y variables físico 
+# químicas de PA) con la misma estructura de las tablas reales
+# PARAMETROS DE ENTRADA:
+# - route(String): carpeta en donde se escriben las tablas
+# - seed(Int): semilla del generador aleatorio
+# PARAMETROS DE SALIDA:
+# - Ninguno
+def writeReferenceTables(route, seed=0):
+    rng = np.random.RandomState(seed)
+    if(not os.path.isdir(route)):
+        os.makedirs(route)
+
+    codes = ['E%d' % (i+1) for i in range(N_EXCIPIENTS)]
+    solubility = pd.DataFrame({'codigo': codes, 'solubilidadEnAgua': np.round(rng.rand(N_EXCIPIENTS)*100,3)})
+    solubility.to_excel(os.path.join(route,ReferenceTables.SOLUBILITY_FILE),index=False)
+
+    physicalChemical = pd.DataFrame({'codigo': ['P%d' % (i+1) for i in range(N_PAS)]})
+    for name in ReferenceTables.ERASE_PHYSICAL_CHEMICAL[1:]:
+        physicalChemical[name] = 'x' if name.startswith('nombre') else rng.randint(0,3,N_PAS)
+    for name in PHYSICAL_CHEMICAL:
+        physicalChemical[name] = np.round(rng.rand(N_PAS)*100,3)
+    physicalChemical.to_csv(os.path.join(route,ReferenceTables.PHYSICAL_CHEMICAL_FILE),index=False)
+
+# METODO: se genera un perfil de disolución creciente que supera el 85%
+# PARAMETROS DE ENTRADA:
+# - rng(RandomState): generador aleatorio
+# PARAMETROS DE SALIDA:
+# - profile(List): perfil de disolución con tiempos y medias
+def generateProfile(rng):
+    times = [5,10,15,20,30,45,60]
+    means = np.sort(rng.uniform(10,100,len(times)))
+    means[-1] = max(means[-1],90)
+    return [{'tiempo': times[i], 'media': round(means[i],2)} for i in range(len(times))]
+
+# METODO: se genera un experimento registrado sintético con la estructura que recibe el servicio
+# PARAMETROS DE ENTRADA:
+# - rng(RandomState): generador aleatorio
+# PARAMETROS DE SALIDA:
+# - experimentJSON(Dict): experimento registrado
+def generateExperiment(rng):
+    experimentJSON = {}
+    codePA = int(rng.randint(1,N_PAS+1))
+    experimentJSON['principioActivoValorado'] = codePA
+    experimentJSON['principiosActivos'] = [
+        {'nombre': str(codePA), 'porcentaje': round(rng.uniform(5,30),2), 'tamanoParticula': round(rng.uniform(10,200),1)},
+        {'nombre': str(codePA % N_PAS + 1), 'porcentaje': 2.0, 'tamanoParticula': 50.0}]
+
+    # Los surfactantes y otros pueden no estar presentes en la formulación. Los porcentajes de los excipientes se
+    # escalan para que junto con el PA valorado no superen el 100%.
+    excipients = []
+    for excipient in Processing.EXCIPIENTS:
+        minimum = 0 if excipient in ['surfactantes','otros'] else 1
+        codes = rng.choice(N_EXCIPIENTS,rng.randint(minimum,4),replace=False)+1
+        experimentJSON[excipient] = [{'nombre': str(code), 'porcentaje': rng.uniform(1,12),
+                                      'tamanoParticula': round(rng.uniform(10,300),1)} for code in codes]
+        excipients.extend(experimentJSON[excipient])
+    available = rng.uniform(90,99)-experimentJSON['principiosActivos'][0]['porcentaje']
+    total = sum(excipient['porcentaje'] for excipient in excipients)
+    for excipient in excipients:
+        excipient['porcentaje'] = np.floor(excipient['porcentaje']*available/total*100)/100
+
+    experimentJSON['via'] = ['Via_Seca','Via_Humeda'][rng.randint(2)]
+    experimentJSON['recubrimiento'] = ['Tableta_Recubierta','Tableta_No_Recubierta'][rng.randint(2)]
+    experimentJSON['metodo'] = ['Metodo_HPLC','Metodo_UV'][rng.randint(2)]
+    experimentJSON['aparatoDisolucion'] = ['Aparato_Dis1','Aparato_Dis2'][rng.randint(2)]
+    for name in Processing.GENERAL_VARIABLES:
+        experimentJSON[name] = round(rng.uniform(0,100),3)
+    experimentJSON['tiempos'] = generateProfile(rng)
+
+    return experimentJSON
+
+# METODO: se genera un grupo de experimentos registrados sintéticos
+# PARAMETROS DE ENTRADA:
+# - n(Int): número de experimentos
+# - seed(Int): semilla del generador aleatorio
+# PARAMETROS DE SALIDA:
+# - experimentsJSON(List): experimentos registrados
+def generateExperiments(n, seed=0):
+    rng = np.random.RandomState(seed)
+    return [generateExperiment(rng) for i in range(n)]
+
+# METODO: se crea la tabla de entradas del simulador (3_Entradas_Integracion.csv) a partir de experimentos sintéticos,
+# con sus medias de disolución registradas (ver getSyntheticMeans) más un poco de ruido
+# PARAMETROS DE ENTRADA:
+# - route(String): carpeta de tablas de referencia, ya con las tablas sintéticas
+# - n(Int): número de experimentos
+# - seed(Int): semilla del generador aleatorio
+# PARAMETROS DE SALIDA:
+# - features(Array): matriz de entradas escrita en la tabla
+def writeInputsTable(route, n=500, seed=1):
+    previousRoute = ReferenceTables.TABLES_ROUTE
+    ReferenceTables.TABLES_ROUTE = route
+    try:
+        features = Processing.buildFeatureMatrix(generateExperiments(n,seed))
+    finally:
+        ReferenceTables.TABLES_ROUTE = previousRoute
+    table = pd.DataFrame(features,columns=Processing.ORDER)
+    means = getSyntheticMeans(features)+np.random.RandomState(seed).normal(0,1,(n,3))
+    for i in range(3):
+        table['media%d' % (i+1)] = means[:,i]
+    table.to_csv(os.path.join(route,'3_Entradas_Integracion.csv'),index=False)
+    return features
+
+# METODO: se calculan medias de disolución sintéticas (primer tiempo, antes y después de 85%) para una matriz de
+# entradas, con una relación suave con algunas de las variables
+# PARAMETROS DE ENTRADA:
+# - features(Array): matriz de entradas del simulador
+# PARAMETROS DE SALIDA:
+# - means(Array): matriz con las 3 medias de disolución por experimento
+def getSyntheticMeans(features):
+    column = lambda name: features[:,Processing.SLOTS[name]]
+    media1 = 10+0.3*column('desintegrantes')+0.1*column('durezaPromedio')+0.05*column('tiempoSecado')
+    media2 = 40+0.2*column('aglutinantes')+0.2*column('tiempoMezclaTotalFormula')-0.05*column('tamanoAglutinantes')
+    media3 = 80+0.1*column('diluyentes')+0.05*column('tiempoMezcladoGranulado')
+    return np.column_stack([media1,media2,media3])
+
+# METODO: se entrena y guarda un modelo sintético pequeño (bosque aleatorio de scikit-learn) que reemplaza al modelo
+# del sistema en las mediciones
+# PARAMETROS DE ENTRADA:
+# - modelRoute(String): ruta del archivo en donde se guarda el modelo
+# - features(Array): matriz de entradas con la que se entrena el modelo
+# - seed(Int): semilla del modelo
+# PARAMETROS DE SALIDA:
+# - model(Model): modelo entrenado
+def writeModel(modelRoute, features, seed=0):
+    import pickle
+    from sklearn.ensemble import RandomForestRegressor
+    model = RandomForestRegressor(n_estimators=20,max_depth=8,random_state=seed)
+    model.fit(features,getSyntheticMeans(features))
+    route = open(modelRoute,'wb')
+    pickle.dump(model,route)
+    route.close()
+    return model
+
+# METODO: se crea una solicitud de optimización sintética
+# PARAMETROS DE ENTRADA:
+# - seed(Int): semilla del generador aleatorio de la solicitud
+# - variables(List): variables a optimizar
+# PARAMETROS DE SALIDA:
+# - fJSON(Dict): solicitud de optimización
+def generateOptimizationRequest(seed=0, variables=None):
+    rng = np.random.RandomState(seed)
+    if variables is None:
+        variables = ['durezaPromedio','tiempoSecado','aglutinantes','tamanoAglutinantes','desintegrantes',
+                     'tiempoMezcladoGranulado','tiempoMezclaTotalFormula']
+    return {'experimento': generateExperiment(rng),'perfil': generateProfile(rng),'variables': variables,
+            'semilla': seed}
+
+# METODO: se crea un ambiente sintético completo en una carpeta (tablas de referencia, tabla de entradas y modelo) y se
+# configura el servicio para usarlo
+# PARAMETROS DE ENTRADA:
+# - route(String): carpeta del ambiente
+# - n(Int): número de experimentos de la tabla de entradas
+# PARAMETROS DE SALIDA:
+# - Ninguno
+def setUpEnvironment(route, n=500):
+    from ServicesDisolution.Retraining import Comparison
+    writeReferenceTables(route)
+    features = writeInputsTable(route,n)
+    writeModel(os.path.join(route,'model.pckl'),features)
+    ReferenceTables.TABLES_ROUTE = route
+    Comparison.MODEL_ROUTE = os.path.join(route,'model.pckl')
@@ -0,0 +1,214 @@
+# -*- coding: latin-1 -*-
+import os
+import sys
+import csv
+import json
+import time
+import uuid
+import shutil
+import argparse
+import multiprocessing
+from collections import deque
+import numpy as np
+from ServicesDisolution.DataProcessing import Processing
+from ServicesDisolution.DataProcessing import ReferenceTables
+from ServicesDisolution.DataProcessing import FeatureStore
+
+# ¡¡¡REEMPLAZAR POR LA CARPETA DE LOTES EN EL SERVIDOR!!! (o definir la variable de entorno SD_RUTA_LOTES)
+BULK_ROUTE = os.environ.get('SD_RUTA_LOTES', 'C:/Users/ing-y-soft/Documents/Proyecto/Code/Integracion/lotes')
+
+# Número de experimentos que se procesan por bloque; la memoria usada depende del bloque y no del tamaño del archivo
+CHUNK_SIZE = int(os.environ.get('SD_LOTES_BLOQUE', 1000))
+
+# Número máximo de procesos con los que se procesa un lote enviado al servicio (variable de entorno SD_LOTES_PROCESOS),
+# el cliente no puede pedir más
+MAX_WORKERS = int(os.environ.get('SD_LOTES_PROCESOS', multiprocessing.cpu_count()))
+
+# Extensiones de los archivos de salida: tabla CSV, matriz NumPy y experimentos rechazados
+CSV_EXTENSION = '.csv'
+NUMPY_EXTENSION = '.npy'
+REJECT_EXTENSION = '.rechazos.ndjson'
+
+# METODO: se leen las líneas de un archivo NDJSON de experimentos registrados en bloques
+# PARAMETROS DE ENTRADA:
+# - lines(Iterable): líneas del archivo
+# - size(Int): número de experimentos por bloque
+# PARAMETROS DE SALIDA:
+# - chunks(Generator): bloques de pares (número de línea, línea), sin las líneas vacías
+def readChunks(lines, size):
+    chunk = []
+    number = 0
+    for line in lines:
+        number += 1
+        if line.strip():
+            chunk.append((number,line))
+            if(len(chunk) == size):
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+# METODO: se construye la matriz de entrada del simulador de un bloque de experimentos (las filas de los experimentos
+# que ya estan en el almacén sin cambios se toman de allí, ver FeatureStore). Un experimento que no se puede procesar
+# (JSON inválido, código sin solubilidad, ...) se rechaza sin detener el bloque.
+# PARAMETROS DE ENTRADA:
+# - chunk(List): pares (número de línea, línea) del bloque
+# PARAMETROS DE SALIDA:
+# - features(Array): matriz con una fila por experimento procesado, en el orden del bloque
+# - rejects(List): experimentos rechazados con su número de línea ('linea'), el error ('error') y la línea original
+#   ('experimento')
+def processChunk(chunk):
+    features = np.empty((len(chunk),len(Processing.ORDER)))
+    rejects = []
+    n = 0
+    for number,line in chunk:
+        try:
+            experimentJSON = json.loads(line)
+            if(not isinstance(experimentJSON,dict)):
+                raise ValueError('Experimento no es un JSON valido')
+            FeatureStore.getFeatureRow(experimentJSON,features[n])
+            n += 1
+        except Exception as e:
+            rejects.append({'linea': number, 'error': str(e), 'experimento': line.rstrip('\r\n')})
+    return (features[:n], rejects)
+
+# METODO: se procesan los bloques, en el proceso actual o en un grupo de procesos. Con procesos se mantienen a lo sumo
+# dos bloques pendientes por proceso, así la memoria sigue acotada y los resultados salen en el orden de entrada.
+# PARAMETROS DE ENTRADA:
+# - chunks(Iterable): bloques de experimentos
+# - workers(Int): número de procesos, con 1 se procesa en el proceso actual
+# PARAMETROS DE SALIDA:
+# - results(Generator): resultado de processChunk para cada bloque, en orden
+def processChunks(chunks, workers=1):
+    if(workers <= 1):
+        for chunk in chunks:
+            yield processChunk(chunk)
+        return
+
+    # Las tablas de referencia se cargan antes de crear los procesos para que las hereden
+    ReferenceTables.preloadTables()
+    pool = multiprocessing.Pool(workers)
+    try:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.apply_async(processChunk,(chunk,)))
+            if(len(pending) >= 2*workers):
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+# METODO: se escribe un archivo .npy a partir de las filas ya escritas en binario en un archivo temporal. El formato
+# .npy necesita el número de filas en el encabezado, que solo se conoce al final.
+# PARAMETROS DE ENTRADA:
+# - route(String): ruta del archivo .npy
+# - rawRoute(String): ruta del archivo temporal con las filas (float64, por filas)
+# - rows(Int): número de filas
+# PARAMETROS DE SALIDA:
+# - Ninguno
+def writeNumpy(route, rawRoute, rows):
+    numpyFile = open(route, 'wb')
+    try:
+        header = {'descr': np.lib.format.dtype_to_descr(np.dtype(np.float64)), 'fortran_order': False,
+                  'shape': (rows, len(Processing.ORDER))}
+        np.lib.format.write_array_header_1_0(numpyFile, header)
+        rawFile = open(rawRoute, 'rb')
+        shutil.copyfileobj(rawFile, numpyFile)
+        rawFile.close()
+    finally:
+        numpyFile.close()
+    os.remove(rawRoute)
+
+# METODO: se procesa un grupo de experimentos registrados en NDJSON y se escribe su matriz de entrada del simulador
+# en CSV (con las columnas de Processing.ORDER, como la tabla de entradas) y en formato NumPy (.npy), junto con un
+# archivo NDJSON con los experimentos rechazados. Los experimentos se leen y escriben por bloques.
+# PARAMETROS DE ENTRADA:
+# - lines(Iterable): líneas NDJSON, una por experimento
+# - output(String): ruta de salida sin extensión, se crean output.csv, output.npy y output.rechazos.ndjson
+# - workers(Int): número de procesos
+# - chunkSize(Int): número de experimentos por bloque
+# PARAMETROS DE SALIDA:
+# - summary(Dict): filas escritas ('filas'), experimentos rechazados ('rechazados'), segundos ('segundos') y rutas de
+#   los archivos ('archivos')
+def processLines(lines, output, workers=1, chunkSize=CHUNK_SIZE):
+    start = time.time()
+    routes = {'csv': output+CSV_EXTENSION, 'npy': output+NUMPY_EXTENSION, 'rechazos': output+REJECT_EXTENSION}
+    rawRoute = routes['npy']+'.tmp'
+    rows = 0
+    rejected = 0
+    csvFile = open(routes['csv'], 'wb')
+    rawFile = open(rawRoute, 'wb')
+    rejectFile = open(routes['rechazos'], 'wb')
+    try:
+        writer = csv.writer(csvFile)
+        writer.writerow(Processing.ORDER)
+        for features,rejects in processChunks(readChunks(lines,chunkSize),workers):
+            # repr conserva todos los dígitos de los flotantes, igual que to_csv
+            writer.writerows([[repr(value) for value in row] for row in features.tolist()])
+            rawFile.write(np.ascontiguousarray(features, dtype=np.float64).tobytes())
+            for reject in rejects:
+                rejectFile.write(json.dumps(reject)+'\n')
+            rows += len(features)
+            rejected += len(rejects)
+    finally:
+        csvFile.close()
+        rawFile.close()
+        rejectFile.close()
+    writeNumpy(routes['npy'], rawRoute, rows)
+    return {'filas': rows, 'rechazados': rejected, 'segundos': time.time()-start, 'archivos': routes}
+
+# METODO: se procesa un archivo NDJSON de experimentos registrados (ver processLines)
+# PARAMETROS DE ENTRADA:
+# - route(String): ruta del archivo NDJSON
+# - output(String): ruta de salida sin extensión
+# - workers(Int): número de procesos
+# - chunkSize(Int): número de experimentos por bloque
+# PARAMETROS DE SALIDA:
+# - summary(Dict): resumen del procesamiento
+def processFile(route, output, workers=1, chunkSize=CHUNK_SIZE):
+    inputFile = open(route, 'rb')
+    try:
+        return processLines(inputFile, output, workers, chunkSize)
+    finally:
+        inputFile.close()
+
+# METODO: se procesa un lote enviado al servicio. Los archivos se escriben en la carpeta de lotes con un identificador
+# nuevo.
+# PARAMETROS DE ENTRADA:
+# - lines(Iterable): líneas NDJSON, una por experimento
+# - workers(Int): número de procesos, a lo sumo MAX_WORKERS
+# PARAMETROS DE SALIDA:
+# - summary(Dict): resumen del procesamiento junto con el identificador del lote ('id')
+def processBatch(lines, workers=1):
+    if(not os.path.isdir(BULK_ROUTE)):
+        os.makedirs(BULK_ROUTE)
+    batchId = uuid.uuid4().hex
+    summary = processLines(lines, os.path.join(BULK_ROUTE, batchId), min(workers, MAX_WORKERS))
+    summary['id'] = batchId
+    return summary
+
+# METODO: punto de entrada de línea de comandos:
+# python -m ServicesDisolution.DataProcessing.Bulk experimentos.ndjson salida [--procesos N] [--bloque N]
+# PARAMETROS DE ENTRADA:
+# - argv(List): argumentos de la línea de comandos
+# PARAMETROS DE SALIDA:
+# - code(Int): código de salida
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Procesa experimentos registrados en NDJSON a la estructura de entrada '
+                                                 'del simulador')
+    parser.add_argument('entrada', help='archivo NDJSON con un experimento por linea')
+    parser.add_argument('salida', help='ruta de salida sin extension (.csv, .npy y .rechazos.ndjson)')
+    parser.add_argument('--procesos', type=int, default=1, help='numero de procesos')
+    parser.add_argument('--bloque', type=int, default=CHUNK_SIZE, help='experimentos por bloque')
+    args = parser.parse_args(argv)
+    summary = processFile(args.entrada, args.salida, args.procesos, args.bloque)
+    print(json.dumps(summary))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+# -*- coding: latin-1 -*-
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+from ServicesDisolution.DataProcessing import Processing
+from ServicesDisolution.DataProcessing import ReferenceTables
+
+# Archivo SQLite del almacén de filas de entrada del simulador (variable de entorno SD_RUTA_ALMACEN). Si no se define,
+# el almacén no se usa y las filas se construyen siempre a partir del JSON.
+STORE_ROUTE = os.environ.get('SD_RUTA_ALMACEN')
+
+# Campo del experimento registrado con su identificador; los experimentos sin identificador no se guardan
+ID_FIELD = 'id'
+
+# Conexión por hilo (y por proceso, una conexión no se puede usar después de un fork) y matriz de todas las filas
+# guardadas, junto con la versión del almacén con la que se leyó
+_local = threading.local()
+_matrixLock = threading.Lock()
+_state = {'matriz': None, 'version': None, 'ruta': None}
+
+# METODO: se obtiene la conexión al almacén del hilo actual, se crea la primera vez junto con las tablas. Si cambió la
+# estructura de entrada del simulador (Processing.ORDER) las filas guardadas se descartan.
+# PARAMETROS DE ENTRADA:
+# - Ninguno
+# PARAMETROS DE SALIDA:
+# - connection(Connection): conexión SQLite
+def getConnection():
+    key = (os.getpid(), STORE_ROUTE)
+    if(getattr(_local, 'key', None) == key):
+        return _local.connection
+
+    connection = sqlite3.connect(STORE_ROUTE, timeout=30)
+    # Con WAL las lecturas no esperan a las escrituras de otros procesos
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    with connection:
+        connection.execute('CREATE TABLE IF NOT EXISTS filas (id TEXT PRIMARY KEY, contenido TEXT, tablas TEXT, '
+                           'fila BLOB, actualizado REAL)')
+        connection.execute('CREATE TABLE IF NOT EXISTS meta (clave TEXT PRIMARY KEY, valor TEXT)')
+        connection.execute("INSERT OR IGNORE INTO meta VALUES ('version', '0')")
+        columns = Processing.getSchemaHash()
+        stored = connection.execute("SELECT valor FROM meta WHERE clave = 'columnas'").fetchone()
+        if(stored is None or stored[0] != columns):
+            connection.execute('DELETE FROM filas')
+            connection.execute("INSERT OR REPLACE INTO meta VALUES ('columnas', ?)", (columns,))
+            connection.execute("UPDATE meta SET valor = CAST(valor AS INTEGER)+1 WHERE clave = 'version'")
+    _local.key = key
+    _local.connection = connection
+    return connection
+
+# METODO: se calcula el hash del contenido de un experimento registrado. Solo se ordenan las llaves del primer nivel
+# (json.dumps con sort_keys es varias veces más lento); si dos JSON iguales se serializan distinto la fila solo se
+# vuelve a calcular.
+# PARAMETROS DE ENTRADA:
+# - experimentJSON(JSON): experimento registrado
+# PARAMETROS DE SALIDA:
+# - hash(String): hash SHA1 del contenido
+def getContentHash(experimentJSON):
+    return hashlib.sha1(json.dumps(sorted(experimentJSON.items()))).hexdigest()
+
+# METODO: se obtiene la fila de entrada del simulador de un experimento registrado. Si el experimento tiene
+# identificador y en el almacén está su fila calculada con el mismo contenido y las mismas tablas de referencia, se toma
+# del almacén; si no, se construye (ver Processing.buildFeatureRow) y se guarda.
+# PARAMETROS DE ENTRADA:
+# - experimentJSON(JSON): experimento registrado
+# - row(Array): fila de tamaño len(ORDER) en donde se escriben las variables, o None para crear una nueva
+# PARAMETROS DE SALIDA:
+# - row(Array): fila con las variables del experimento
+def getFeatureRow(experimentJSON, row=None):
+    if row is None:
+        row = np.empty(len(Processing.ORDER))
+    experimentId = experimentJSON.get(ID_FIELD) if isinstance(experimentJSON, dict) else None
+    if(STORE_ROUTE is None or experimentId is None):
+        return Processing.buildFeatureRow(experimentJSON, row)
+
+    experimentId = unicode(experimentId)
+    content = getContentHash(experimentJSON)
+    tables = ReferenceTables.getTablesVersion()
+    connection = getConnection()
+    stored = connection.execute('SELECT contenido, tablas, fila FROM filas WHERE id = ?', (experimentId,)).fetchone()
+    if(stored is not None and stored[0] == content and stored[1] == tables):
+        row[:] = np.frombuffer(stored[2], dtype=np.float64)
+        return row
+
+    Processing.buildFeatureRow(experimentJSON, row)
+    with connection:
+        connection.execute('INSERT OR REPLACE INTO filas VALUES (?, ?, ?, ?, ?)',
+                           (experimentId, content, tables, sqlite3.Binary(np.asarray(row, dtype=np.float64).tobytes()),
+                            time.time()))
+        connection.execute("UPDATE meta SET valor = CAST(valor AS INTEGER)+1 WHERE clave = 'version'")
+    return row
+
+# METODO: se retorna un JSON con la información de un experimento registrado de acuerdo a la estructura de entrada del
+# simulador, igual que Processing.getInputExperiment pero usando el almacén de filas
+# PARAMETROS DE ENTRADA:
+# - experimentJSON(JSON): experimento registrado
+# PARAMETROS DE SALIDA:
+# - orderedExperiment(JSON): información organizada de acuerdo a la estructura de entrada del simulador
+def getInputExperiment(experimentJSON):
+    return pd.Series(getFeatureRow(experimentJSON), index=Processing.ORDER).to_json()
+
+# METODO: se obtiene la matriz con todas las filas guardadas en el almacén. Se mantiene en memoria y solo se vuelve a
+# leer cuando el almacén cambia.
+# PARAMETROS DE ENTRADA:
+# - Ninguno
+# PARAMETROS DE SALIDA:
+# - features(Array): matriz con una fila por experimento guardado, columnas en el orden Processing.ORDER
+def getMatrix():
+    connection = getConnection()
+    version = connection.execute("SELECT valor FROM meta WHERE clave = 'version'").fetchone()[0]
+    if(_state['version'] == version and _state['ruta'] == STORE_ROUTE):
+        return _state['matriz']
+
+    with _matrixLock:
+        rows = connection.execute('SELECT fila FROM filas ORDER BY id').fetchall()
+        features = np.empty((len(rows), len(Processing.ORDER)))
+        for i in range(len(rows)):
+            features[i] = np.frombuffer(rows[i][0], dtype=np.float64)
+        _state.update({'matriz': features, 'version': version, 'ruta': STORE_ROUTE})
+    return features
+
+# METODO: se obtienen los límites de un grupo de variables a partir de las filas guardadas en el almacén: mínimo y
+# máximo, o los percentiles pedidos (ver BoundsIndex.getBounds)
+# PARAMETROS DE ENTRADA:
+# - names(List): nombres de las variables
+# - percentiles(List): percentiles inferior y superior (0 a 100), o None para usar mínimo y máximo
+# PARAMETROS DE SALIDA:
+# - lb(Array): límites inferiores de las variables
+# - ub(Array): límites superiores de las variables
+def getBounds(names, percentiles=None):
+    features = getMatrix()
+    if(len(features) == 0):
+        raise ValueError('El almacen de filas de entrada esta vacio')
+    features = features[:,[Processing.SLOTS[name] for name in names]]
+    if percentiles is None:
+        return (np.nanmin(features, axis=0), np.nanmax(features, axis=0))
+    return (np.nanpercentile(features, percentiles[0], axis=0), np.nanpercentile(features, percentiles[1], axis=0))
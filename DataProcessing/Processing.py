@@ -1,288 +1,269 @@
 # -*- coding: latin-1 -*-
 import pandas as pd
 import numpy as np
+import time
+import hashlib
+from ServicesDisolution import Metrics
+from ServicesDisolution.DataProcessing import ReferenceTables
+from ServicesDisolution.DataProcessing import Schema
 
-# METODO: se retorna un JSON con la informacin de un experimento registrado de acuerdo a la estructura de entrada del 
+# METODO: se retorna un JSON con la información de un experimento registrado de acuerdo a la estructura de entrada del 
 # simulador
 # PARAMETROS DE ENTRADA:
 # - experimentJSON(JSON): arreglo con un experimento registrado.
 # PARAMETROS DE SALIDA: 
-# - orderedExperiment(JSON): arreglo la informacin organizada de acuerdo a la estructura de entrada del simulador para un 
+# - orderedExperiment(JSON): arreglo la información organizada de acuerdo a la estructura de entrada del simulador para un 
 #   experimento registrado
 def getInputExperiment(experimentJSON):    
     experimentDF = organizeExperiment(experimentJSON)
     experimentDF = experimentDF.iloc[0]
     return experimentDF.to_json()
 
-# Mtodo: para un experimento registrado, se seleccionan y organizan sus variables segn la estructura de entrada 
+# Orden de las variables en la estructura de entrada del simulador
+ORDER = ['humedadGranulado','proporcionGranulado','tiempoMezcladoGranulado','proporcionSolvente','temperaturaSecado',
+         'tiempoSecado','largoPromedio','largoSTD','anchoPromedio','anchoSTD','alturaPromedio','alturaSTD',
+         'tiempoMezclaTotalFormula','pesoPromedio','pesoSTD','durezaPromedio','durezaSTD','tamanoParticulaMezcla',
+         'humedadMezcla','tiempoDesintegracionMinima','tiempoDesintegracionMaxima','viaSeca','viaHumeda',
+         'tabletaRecubierta','tabletaNoRecubierta','longitudOnda','velocidadRotacional','PHMedio','volumen','metodoHPLC',
+         'metodoUV','aparatoDis1','aparatoDis2','porcentajePA','tamanoParticulaPA','pesoMolecular','logP','pKaBasico',
+         'solubilidadEnAgua','logS','areaSuperficialPolar','cargaFisiologica','enlacesRotables',
+         'enlacesAceptoresDeHidrogeno','enlacesDonadoresDeHidrogeno','aglutinantes','desintegrantes','deslizantes',
+         'diluyentes','lubricantes','otros','surfactantes','solubilidadAglutinantes','solubilidadDesintegrantes',
+         'solubilidadDeslizantes','solubilidadDiluyentes','solubilidadLubricantes','solubilidadSurfactantes',
+         'tamanoAglutinantes','tamanoDesintegrantes','tamanoDeslizantes','tamanoDiluyentes','tamanoLubricantes',
+         'tamanoOtros','tamanoSurfactantes','tiempo1','tiempo2','tiempo3']
+
+# METODO: se obtiene el hash de la estructura de entrada del simulador (nombres y orden de las columnas). Un modelo
+# entrenado con otra estructura no se puede usar.
+# PARAMETROS DE ENTRADA:
+# - Ninguno
+# PARAMETROS DE SALIDA:
+# - schema(String): hash MD5 de las columnas de ORDER
+def getSchemaHash():
+    return hashlib.md5(','.join(ORDER)).hexdigest()
+
+# Posición de cada variable dentro de la fila de entrada del simulador
+SLOTS = dict((name,i) for i,name in enumerate(ORDER))
+
+EXCIPIENTS = Schema.EXCIPIENTS
+
+# Posiciones, por tipo de excipiente, del porcentaje, el tamaño de partícula y la solubilidad ('otros' no tiene
+# solubilidad)
+PERCENTAGE_SLOTS = [SLOTS[name] for name in EXCIPIENTS]
+SIZE_SLOTS = [SLOTS['tamano'+name[0].upper()+name[1:]] for name in EXCIPIENTS]
+SOLUBILITY_SLOTS = [SLOTS['solubilidad'+name[0].upper()+name[1:]] for name in EXCIPIENTS[:-1]]
+
+GENERAL_VARIABLES = Schema.GENERAL_VARIABLES
+GENERAL_SLOTS = [SLOTS[name] for name in GENERAL_VARIABLES]
+
+# Método: para un experimento registrado, se seleccionan y organizan sus variables según la estructura de entrada 
 # del simulador
 # PARAMETROS DE ENTRADA
 # - experimentJSON(JSON): arreglo con un experimento registrado.
 # PARAMETROS DE SALIDA
-# - experimentDF(Data Frame): tabla con la informacin organizada segn la estructura de entrada del simulador para el
+# - experimentDF(Data Frame): tabla con la información organizada según la estructura de entrada del simulador para el
 #   experimento registrado
 def organizeExperiment(experimentJSON):
+    # La fila se construye directamente en un arreglo (ver buildFeatureRow), la tabla es solo una vista sobre él
+    return pd.DataFrame(buildFeatureMatrix([experimentJSON]),columns=ORDER)
+
+# METODO: para un grupo de experimentos registrados, se construye la matriz de entrada del simulador, una fila por 
+# experimento y las columnas en el orden ORDER
+# PARAMETROS DE ENTRADA
+# - experimentsJSON(List): arreglo de experimentos registrados
+# PARAMETROS DE SALIDA
+# - features(Array): matriz con la información organizada según la estructura de entrada del simulador
+def buildFeatureMatrix(experimentsJSON):
+    features = np.empty((len(experimentsJSON),len(ORDER)))
+    for i in range(len(experimentsJSON)):
+        buildFeatureRow(experimentsJSON[i],features[i])
+    return features
+
+# METODO: para un experimento registrado, se escribe cada variable de la estructura de entrada del simulador 
+# directamente en su posición de una fila
+# PARAMETROS DE ENTRADA
+# - experimentJSON(JSON): arreglo con un experimento registrado, o un experimento ya decodificado (ver Schema)
+# - row(Array): fila de tamaño len(ORDER) en donde se escriben las variables
+# PARAMETROS DE SALIDA
+# - row(Array): misma fila de entrada con las variables del experimento
+def buildFeatureRow(experimentJSON, row):
+    start = time.time()
+    # Se valida el experimento y se extraen en un solo recorrido todos sus valores (Schema.SchemaError si no es válido),
+    # antes de consultar las tablas de referencia
+    experiment = Schema.decodeExperiment(experimentJSON)
     
-    # Se crea un Data Frame con atributos para el cdigo, tamao de partcula y porcentaje del PA valorado en la formulacin
-    experimentDF = getInfoPA(experimentJSON)
-    
-    # Se crea un Data Frame con informacin para los porcentajes, tamao de partcula y solubilidad de cada tipo de 
-    # excipientes en la formulacin
-    infoExcipient = getInfoExcipient(experimentJSON)
+    # Código, porcentaje y tamaño de partícula del PA valorado en la formulación
+    code = fillInfoPA(experiment,row)
     
-    # Se crea un Data Frame con las variables categricas codificadas (Via, Recubrimiento y Metodo)
-    categorical = getOneHotEncoding(experimentJSON)
+    # Porcentajes, tamaño de partícula y solubilidad de cada tipo de excipientes en la formulación
+    stageStart = time.time()
+    fillInfoExcipient(experiment,row)
+    Metrics.observeStage('excipientes',stageStart)
     
-    # Se crea un Data Frame con las variables fsico qumicas del PA valorado
-    experimentDF = getPhysicalChemical(experimentDF)
+    # Variables categóricas codificadas (Via, Recubrimiento, Metodo y Aparato)
+    fillOneHotEncoding(experiment,row)
     
-    # Se crea un Data Frame con 3 tiempos seleccionados del perfil de disolucin (primer tiempo, el inmediatamente anterior 
-    # a 85% y el inmediatamente superior a 85%)
-    timesDF = getTimes(experimentJSON)
+    # Variables físico químicas del PA valorado
+    stageStart = time.time()
+    fillPhysicalChemical(code,row)
+    Metrics.observeStage('fisicoquimicas',stageStart)
     
-    # Se crea un Data Frame con las demas variables que deben estar presentes en la formulacin
-    generalVariables = getInfoGeneral(experimentJSON)
+    # 3 tiempos seleccionados del perfil de disolución (primer tiempo, el inmediatamente anterior a 85% y el 
+    # inmediatamente superior a 85%)
+    fillTimes(experiment,row)
     
-    # Se juntan todos los Data Frame antes creados 
-    experimentDF = pd.concat([experimentDF,infoExcipient,categorical,timesDF,generalVariables],axis=1)
+    # Demas variables que deben estar presentes en la formulación
+    fillInfoGeneral(experiment,row)
     
-    # Se ordenan las variables para que esten en el orden que las necesita el simulador y se retorna    
-    return organizeVariables(experimentDF)
+    Metrics.observeStage('organizacion',start)
+    return row
 
-# METODO: para la informacin registrada de de experimento, se crean variables para el cdigo, porcentaje del 
-# principio activo valorado y para su correspondiente tamao de partcula de cada experimento.
+# METODO: para la información registrada de de experimento, se escriben el porcentaje del principio activo valorado y
+# su correspondiente tamaño de partícula.
 # PARAMETROS DE ENTRADA
-# - experimentJSON(JSON): arreglo con experimento registrado.
+# - experiment(Experiment): experimento decodificado
+# - row(Array): fila de la estructura de entrada del simulador
 # PARAMETROS DE SALIDA
-# - experimentDF(Data Frame): tabla con las variables para el cdigo, porcentaje y tamao de partcula del PA valorado
-def getInfoPA(experimentJSON):
-    PAs = experimentJSON['principiosActivos']
-    namePA = experimentJSON['principioActivoValorado']
-
-    percentage = 0
-    size = 0
-    for PA in PAs:
-        if(int(PA['nombre']) == namePA):
-            code = int(PA['nombre'])
-            percentage = PA['porcentaje']
-            size = PA['tamanoParticula']    
-
-    experimentDF = pd.DataFrame([[code,percentage,size]],columns=['codigo','porcentajePA','tamanoParticulaPA'])
+# - code(Int): código del PA valorado
+def fillInfoPA(experiment, row):
+    row[SLOTS['porcentajePA']] = experiment.percentagePA
+    row[SLOTS['tamanoParticulaPA']] = experiment.sizePA
     
-    return experimentDF
+    return experiment.codePA
 
-# METODO: para la informacin registrada de un experimento, se crean las variables que indican el porcentaje, 
-# el tamao de partcula y la solubilidad de cada tipo de excipiente presente en la formulacin.
+# METODO: para la información registrada de un experimento, se escriben las variables que indican el porcentaje, 
+# el tamaño de partícula y la solubilidad de cada tipo de excipiente presente en la formulación.
 # PARAMETROS DE ENTRADA
-# - experimentJSON(JSON): arreglo con experimento registrado.
+# - experiment(Experiment): experimento decodificado
+# - row(Array): fila de la estructura de entrada del simulador
 # PARAMETROS DE SALIDA
-# - experimentDF(Data Frame): tabla con las variables que indican el porcentaje, el tamao de partcula y la 
-#   solubilidad de cada tipo de excipiente presente en la formulacin
-def getInfoExcipient(experimentJSON):
-    # Se obtiene la informacin, por tipo, de cada excipiente, su porcentaje y su tamao de partcula
-    infoExcipients = getMultiInputs(experimentJSON)
+# - Ninguno
+def fillInfoExcipient(experiment, row):
+    # Información, por tipo, de cada excipiente: códigos, porcentajes y tamaños de partícula
+    infoExcipients = experiment.excipients
     
-    # Se asocia por tipo la solubilidad para cada excipiente presente en una formulacin
+    # Se asocia por tipo la solubilidad para cada excipiente presente en una formulación
     solubilities = getSolubility(infoExcipients)
     
-    names = ['aglutinantes','desintegrantes','deslizantes','diluyentes','lubricantes','surfactantes','otros',
-             'tamanoAglutinantes','tamanoDesintegrantes','tamanoDeslizantes','tamanoDiluyentes','tamanoLubricantes',
-             'tamanoSurfactantes','tamanoOtros','solubilidadAglutinantes','solubilidadDesintegrantes',
-             'solubilidadDeslizantes','solubilidadDiluyentes','solubilidadLubricantes','solubilidadSurfactantes']
-    
-    percentageExcipients = []    
-    sizeExcipients = []    
-    for excipient in infoExcipients:
-        percentageExcipients.append(excipient[1].sum())
-        sizeExcipients.append(((excipient[1]*excipient[2])/excipient[1].sum()).sum())
+    for i in range(len(infoExcipients)):
+        percentages = infoExcipients[i][1]
+        total = addValues(percentages)
+        row[PERCENTAGE_SLOTS[i]] = total
+        row[SIZE_SLOTS[i]] = getWeightedMean(percentages,infoExcipients[i][2],total)
+        if(i < len(solubilities)):
+            row[SOLUBILITY_SLOTS[i]] = getWeightedMean(percentages,solubilities[i],total)
 
-    soluExcipients = []
-    for i in range(len(solubilities)):
-        iSolubility = ((infoExcipients[i][1]*solubilities[i])/infoExcipients[i][1].sum()).sum()
-        soluExcipients.append(iSolubility)
+# Número de sumandos desde el cual las sumas se hacen con NumPy. Con menos, NumPy suma en orden igual que Python (el
+# resultado es el mismo) y sumar en Python evita el costo de cada llamado a NumPy, que en listas tan cortas es casi todo.
+SMALL_SUM = 8
 
-    info = []
-    info.extend(percentageExcipients)
-    info.extend(sizeExcipients)
-    info.extend(soluExcipients)
-
-    infoExcipients = pd.DataFrame([info],columns=names)
-    
-    return infoExcipients
-
-# METODO: Se extrae la informacin de excipientes presentes en cada tipo(cdigos, porcentajes, tamaos de partculas) para
-# un experimento registrado
+# METODO: se suman los valores de una lista (los porcentajes de los excipientes de un tipo)
 # PARAMETROS DE ENTRADA
-# - experimentJSON(JSON): arreglo con experimento registrado.
+# - values(List): valores
 # PARAMETROS DE SALIDA
-# - infoExcipient(List): informacin de excipientes presentes en cada tipo(cdigos, porcentajes, tamaos de partculas) para
-#   un experimento registrado
-#   Estructrura:
-#   - Tipo Excipiente(List)
-#     - Codigo(list)
-#     - Porcentaje(Array)
-#     - Tamao Particula(Array)
-def getMultiInputs(experimentJSON):
-    excipients = ['aglutinantes','desintegrantes','deslizantes','diluyentes','lubricantes','surfactantes','otros']
-        
-    infoExcipients = []
-    for excipient in excipients:
-        iExcipient = experimentJSON[excipient]
-
-        codes = []
-        percentages = []
-        sizes = []        
-        for i in range(len(iExcipient)):
-            codes.append(int(iExcipient[i]['nombre']))
-            percentages.append(iExcipient[i]['porcentaje'])
-            sizes.append(iExcipient[i]['tamanoParticula'])
+# - total(Float): suma
+def addValues(values):
+    if(len(values) >= SMALL_SUM):
+        return np.array(values).sum()
+    return sum(values)
 
-        percentages = np.array(percentages)
-        sizes = np.array(sizes)            
-        infoExcipients.append([codes,percentages,sizes])    
-    
-    return infoExcipients
+# METODO: se calcula el promedio de unos valores ponderado por los porcentajes de los excipientes de un tipo, con las
+# mismas operaciones que sobre arreglos de NumPy: cada producto se divide por el total y luego se suman
+# PARAMETROS DE ENTRADA
+# - percentages(List): porcentajes de los excipientes
+# - values(List): valores de los excipientes (tamaño de partícula o solubilidad)
+# - total(Float): suma de los porcentajes
+# PARAMETROS DE SALIDA
+# - mean(Float): promedio ponderado
+def getWeightedMean(percentages, values, total):
+    # Con total cero NumPy da NaN o infinito (Python lanzaría ZeroDivisionError)
+    if(len(percentages) >= SMALL_SUM or total == 0):
+        return ((np.array(percentages)*np.array(values))/total).sum()
+    return sum([percentages[j]*values[j]/total for j in range(len(percentages))])
 
-# METODO: se extrae la informacin de solubilidad de excipientes presentes en cada tipo para un experimento resgistrados.
+# METODO: se extrae la información de solubilidad de excipientes presentes en cada tipo para un experimento resgistrados.
 # PARAMETROS DE ENTRADA
-# - infoExcipients(List): informacin de excipientes presentes en cada tipo(cdigos, porcentajes, tamaos de partculas) para
+# - infoExcipients(List): información de excipientes presentes en cada tipo(códigos, porcentajes, tamaños de partículas) para
 #   un experimento registrado
 # PARAMETROS DE SALIDA
 # - experiSolubilities(List):  solubilidad de excipientes presentes en cada tipo para un experimento resgistrado.
 #   Estructura:
 #   - Tipo Excipient(List)
-#     - Solubilidad(Array)
+#     - Solubilidad(List)
 def getSolubility(infoExcipients):
-    # REEMPLAZAR POR LA TABLA EN EL SERVIDOR!!!
-    solubility = pd.read_excel('C:/Users/ing-y-soft/Documents/Proyecto/Code/Integracion/tablas/Solubilidad_de_Excipientes_Integracion2.xlsx')
-    solubility.codigo = [int(s[1:]) for s in solubility.codigo]      
-    
-    typeExcipients = []    
+    # La tabla de solubilidad se mantiene en memoria indexada por código (ver ReferenceTables). Se busca la solubilidad
+    # de todos los excipientes en una sola consulta y luego se separa por tipo.
+    codes = []
+    limits = [0]
     for excipient in infoExcipients[:-1]:
-        typeExcipients.append(pd.DataFrame(excipient[0],columns=['codigo']))
-
-    typeSolu = []
-    for df in typeExcipients:
-        typeSolu.append(pd.merge(df,solubility,on='codigo'))
+        codes.extend(excipient[0])
+        limits.append(len(codes))
+    allSolubilities = ReferenceTables.getSolubilities(codes).tolist()
 
-    solubilities = []
-    for element in typeSolu:
-        solubilities.append(np.array(element.solubilidadEnAgua))
+    return [allSolubilities[limits[i]:limits[i+1]] for i in range(len(limits)-1)]
 
-    return solubilities
-
-# METODO: se codifican la variables categricas Via, Recubrimiento y Metodo segn One Hot Encoding de un experimento 
-# registrado
+# METODO: se codifican la variables categóricas Via, Recubrimiento, Metodo y Aparato según One Hot Encoding de un
+# experimento registrado
 # PARAMETROS DE ENTRADA
-# - experimentJSON(JSON): arreglo con un experimento registrado
+# - experiment(Experiment): experimento decodificado
+# - row(Array): fila de la estructura de entrada del simulador
 # PARAMETROS DE SALIDA
-# - categorical(Data Frame): tabla con las variables categoricas codificadas para un experimento registrado
-def getOneHotEncoding(experimentJSON):
-    names = ['viaSeca','viaHumeda','tabletaRecubierta','tabletaNoRecubierta','metodoHPLC','metodoUV','aparatoDis1',
-             'aparatoDis2']
-    
-    via = experimentJSON['via']
-    recubrimiento = experimentJSON['recubrimiento']
-    metodo = experimentJSON['metodo']
-    aparato = experimentJSON['aparatoDisolucion']
+# - Ninguno
+def fillOneHotEncoding(experiment, row):
+    via,recubrimiento,metodo,aparato = experiment.categories
+    via = via == 'Via_Seca'
+    recubrimiento = recubrimiento == 'Tableta_Recubierta'
+    metodo = metodo == 'Metodo_HPLC'
+    aparato = aparato == 'Aparato_Dis1'
 
-    values = []
-    if(via == 'Via_Seca'):
-        values.extend([1,0])
-    else:
-        values.extend([0,1])
-    if(recubrimiento == 'Tableta_Recubierta'):
-        values.extend([1,0])
-    else:
-        values.extend([0,1])
-    if(metodo == 'Metodo_HPLC'):
-        values.extend([1,0])
-    else:
-        values.extend([0,1])
-    if(aparato == 'Aparato_Dis1'):
-        values.extend([1,0])
-    else:
-        values.extend([0,1])
+    row[SLOTS['viaSeca']] = int(via)
+    row[SLOTS['viaHumeda']] = int(not via)
+    row[SLOTS['tabletaRecubierta']] = int(recubrimiento)
+    row[SLOTS['tabletaNoRecubierta']] = int(not recubrimiento)
+    row[SLOTS['metodoHPLC']] = int(metodo)
+    row[SLOTS['metodoUV']] = int(not metodo)
+    row[SLOTS['aparatoDis1']] = int(aparato)
+    row[SLOTS['aparatoDis2']] = int(not aparato)
 
-    categorical = pd.DataFrame([values],columns=names)
-    
-    return categorical
-
-# METODO: se agregan las variables fsico qumicas del pricipio activo en un experimento registrado.
+# METODO: se escriben las variables físico químicas del pricipio activo en un experimento registrado.
 # PARAMETROS DE ENTRADA 
-# - experimentDF(Data Frame): tabla que contiene informacin del cdigo del PA valorado en un experimento registrado
+# - code(Int): código del PA valorado en un experimento registrado
+# - row(Array): fila de la estructura de entrada del simulador
 # PARAMETROS DE SALIDA
-# - experimentDF(Data Frame): misma tabla de entrada junto con las variables fsico qumicas del experimiento
-def getPhysicalChemical(experimentDF):
-    # REEMPLAZAR POR LA TABLA EN EL SERVIDOR!!!
-    physicalChemical = pd.read_csv('C:/Users/ing-y-soft/Documents/Proyecto/Code/Integracion/tablas/PA_Esp_Eng_Var_Integracion.csv')
-    #physicalChemical = pd.read_csv('C:\Users\ing-y-soft\Documents\Proyecto\Code\Integracion\tablas\PA_Esp_Eng_Var_Integracion.csv')
-    physicalChemical.codigo = [int(s[1:]) for s in physicalChemical.codigo]
-    
-    experimentDF = pd.merge(experimentDF,physicalChemical,on='codigo')
-    
-    erase = ['codigo','nombreEsp','nombreEng','hidroxilos','aldehidos','cetonas','carboxilos','aminas','iminas',
-             'amidas','imidas','nitro','nitrilo','hidrazina','haluros','eter','azoNitrogenado']
-    experimentDF.drop(erase,axis=1,inplace=True)
-    
-    return experimentDF
+# - Ninguno
+def fillPhysicalChemical(code, row):
+    # La tabla físico química se mantiene en memoria indexada por código (ver ReferenceTables)
+    names,values = ReferenceTables.getPhysicalChemicals([code])
+    for j in range(len(names)):
+        if(names[j] in SLOTS):
+            row[SLOTS[names[j]]] = values[0,j]
 
-# METODO: para un experimento registrado, del perfil de disolucin se seleccionan los tiempos correspondientes al primer 
+# METODO: para un experimento registrado, del perfil de disolución se seleccionan los tiempos correspondientes al primer 
 # porcentaje, al inmediatamente inferior a 85% y al inmediatamente mayor a 85%
 # PARAMETROS DE ENTRADA
-# - experimentJSON(JSON): arreglo con un experimento registrado
+# - experiment(Experiment): experimento decodificado (el esquema garantiza que el perfil alcanza el 85%)
+# - row(Array): fila de la estructura de entrada del simulador
 # PARAMETROS DE SALIDA
-# - timesDF(Data Frame): tabla con los tiempos seleccionados del perfil de disolucin de un experimento registrado
-def getTimes(experimentJSON):    
-    names = ['tiempo1','tiempo2','tiempo3']
-    times = experimentJSON['tiempos']
-    i = 0
-    while(times[i]['media'] < 85):
-        i += 1
-    values = [times[0]['tiempo'],times[i-1]['tiempo'],times[i]['tiempo']]
-    timesDF = pd.DataFrame([values],columns=names)
-    
-    return(timesDF)
+# - Ninguno
+def fillTimes(experiment, row):
+    row[SLOTS['tiempo1']],row[SLOTS['tiempo2']],row[SLOTS['tiempo3']] = experiment.times
 
-# METODO: para un experimento registrado se extrae la informacin de las variables que no requieren ningn tipo de 
-# procesamiento.
+# METODO: para un experimento registrado se escriben las variables que no requieren ningún tipo de procesamiento.
 # PARAMETROS DE ENTRADA: 
-# - experimentJSON(JSON): arreglo con un experimento registrado
+# - experiment(Experiment): experimento decodificado
+# - row(Array): fila de la estructura de entrada del simulador
 # PARAMETROS DE SALIDA:
-# - generalVariables(Data Frame): tabla con informacin de variables que no requieren ningn tipo de procesamiento para un 
-#   experimento registrado
-def getInfoGeneral(experimentJSON):    
-    names = ['humedadGranulado','proporcionGranulado','tiempoMezcladoGranulado','proporcionSolvente','temperaturaSecado',
-             'tiempoSecado','largoPromedio','largoSTD','anchoPromedio','anchoSTD','alturaPromedio','alturaSTD',
-             'tiempoMezclaTotalFormula','pesoPromedio','pesoSTD','durezaPromedio','durezaSTD','tamanoParticulaMezcla',
-             'humedadMezcla','tiempoDesintegracionMinima','tiempoDesintegracionMaxima', 'longitudOnda',
-             'velocidadRotacional','PHMedio','volumen']
-    
-    variables = []
-    for var in names:
-        variables.append(experimentJSON[var])            
-    generalVariables = pd.DataFrame([variables],columns=names)
-    return generalVariables
+# - Ninguno
+def fillInfoGeneral(experiment, row):
+    row[GENERAL_SLOTS] = experiment.general
 
-# METODO: se organizan las variables de la tabla construida con la informacin de un experimento de acuerdo al orden de 
+# METODO: se organizan las variables de la tabla construida con la información de un experimento de acuerdo al orden de 
 # entrada del simulador
 # PARAMETROS DE ENTRADA
 # - experimentDF(Data Frame): tabla con los valores de un experimento registrado
 # PARAMETROS DE SALIDA
 # - experimentDF(Data Frame): tabla con las variables organizadas
 def organizeVariables(experimentDF):
-    order = ['humedadGranulado','proporcionGranulado','tiempoMezcladoGranulado','proporcionSolvente','temperaturaSecado',
-             'tiempoSecado','largoPromedio','largoSTD','anchoPromedio','anchoSTD','alturaPromedio','alturaSTD',
-             'tiempoMezclaTotalFormula','pesoPromedio','pesoSTD','durezaPromedio','durezaSTD','tamanoParticulaMezcla',
-             'humedadMezcla','tiempoDesintegracionMinima','tiempoDesintegracionMaxima','viaSeca','viaHumeda',
-             'tabletaRecubierta','tabletaNoRecubierta','longitudOnda','velocidadRotacional','PHMedio','volumen','metodoHPLC',
-             'metodoUV','aparatoDis1','aparatoDis2','porcentajePA','tamanoParticulaPA','pesoMolecular','logP','pKaBasico',
-             'solubilidadEnAgua','logS','areaSuperficialPolar','cargaFisiologica','enlacesRotables',
-             'enlacesAceptoresDeHidrogeno','enlacesDonadoresDeHidrogeno','aglutinantes','desintegrantes','deslizantes',
-             'diluyentes','lubricantes','otros','surfactantes','solubilidadAglutinantes','solubilidadDesintegrantes',
-             'solubilidadDeslizantes','solubilidadDiluyentes','solubilidadLubricantes','solubilidadSurfactantes',
-             'tamanoAglutinantes','tamanoDesintegrantes','tamanoDeslizantes','tamanoDiluyentes','tamanoLubricantes',
-             'tamanoOtros','tamanoSurfactantes','tiempo1','tiempo2','tiempo3']
-    experimentDF = experimentDF.loc[:,order]
+    experimentDF = experimentDF.loc[:,ORDER]
     
-    return experimentDF
\ No newline at end of file
+    return experimentDF
@@ -0,0 +1,178 @@
+# -*- coding: latin-1 -*-
+import os
+import time
+import hashlib
+import threading
+import pandas as pd
+import numpy as np
+from ServicesDisolution import Metrics
+
+# ¡¡¡REEMPLAZAR POR LA CARPETA DE TABLAS EN EL SERVIDOR!!! (o definir la variable de entorno SD_RUTA_TABLAS)
+TABLES_ROUTE = os.environ.get('SD_RUTA_TABLAS', 'C:/Users/ing-y-soft/Documents/Proyecto/Code/Integracion/tablas')
+SOLUBILITY_FILE = 'Solubilidad_de_Excipientes_Integracion2.xlsx'
+PHYSICAL_CHEMICAL_FILE = 'PA_Esp_Eng_Var_Integracion.csv'
+
+# Variables de la tabla físico química que no hacen parte de la estructura de entrada del simulador
+ERASE_PHYSICAL_CHEMICAL = ['codigo','nombreEsp','nombreEng','hidroxilos','aldehidos','cetonas','carboxilos','aminas',
+                           'iminas','amidas','imidas','nitro','nitrilo','hidrazina','haluros','eter','azoNitrogenado']
+
+# Variables de la tabla físico química que hacen parte de la estructura de entrada del simulador (ver Processing.ORDER),
+# la tabla debe tenerlas todas
+PHYSICAL_CHEMICAL = ['pesoMolecular','logP','pKaBasico','solubilidadEnAgua','logS','areaSuperficialPolar',
+                     'cargaFisiologica','enlacesRotables','enlacesAceptoresDeHidrogeno','enlacesDonadoresDeHidrogeno']
+
+# Tablas cargadas en memoria: nombre de la tabla -> (tabla, checksum del archivo, firma del archivo)
+_loadedTables = {}
+_loadLock = threading.Lock()
+
+# METODO: se obtiene la ruta de un archivo de la carpeta de tablas de referencia
+# PARAMETROS DE ENTRADA:
+# - fileName(String): nombre del archivo
+# PARAMETROS DE SALIDA:
+# - route(String): ruta del archivo
+def getTableRoute(fileName):
+    return os.path.join(TABLES_ROUTE, fileName)
+
+# METODO: se convierten los códigos de una tabla de referencia ('E12', 'P7', ...) a enteros
+# PARAMETROS DE ENTRADA:
+# - codes(Series): códigos tal como estan en la tabla
+# PARAMETROS DE SALIDA:
+# - codes(Array): códigos numéricos
+def getNumericCodes(codes):
+    return np.array([int(s[1:]) for s in codes], dtype=int)
+
+# METODO: se crea una tabla densa en donde la fila i corresponde al código i. Las filas de códigos que no existen en la
+# tabla de referencia quedan marcadas como no presentes.
+# PARAMETROS DE ENTRADA:
+# - codes(Array): códigos numéricos
+# - values(Array): matriz de valores, una fila por código
+# PARAMETROS DE SALIDA:
+# - table(Dict): matriz de valores indexada por código ('valores') y marcas de códigos presentes ('presentes')
+def getDenseTable(codes, values):
+    size = codes.max()+1 if len(codes) else 0
+    dense = np.full((size,values.shape[1]), np.nan)
+    dense[codes] = values
+    presents = np.zeros(size, dtype=bool)
+    presents[codes] = True
+    return {'valores': dense, 'presentes': presents}
+
+# METODO: se carga la tabla de solubilidad de excipientes
+# PARAMETROS DE ENTRADA:
+# - route(String): ruta del archivo de solubilidad
+# PARAMETROS DE SALIDA:
+# - table(Dict): tabla densa con la solubilidad en agua indexada por código de excipiente
+def loadSolubility(route):
+    solubility = pd.read_excel(route)
+    codes = getNumericCodes(solubility.codigo)
+    values = np.array(solubility.solubilidadEnAgua, dtype=float).reshape(-1,1)
+    return getDenseTable(codes, values)
+
+# METODO: se carga la tabla de variables físico químicas de los principios activos
+# PARAMETROS DE ENTRADA:
+# - route(String): ruta del archivo de variables físico químicas
+# PARAMETROS DE SALIDA:
+# - table(Dict): tabla densa con las variables físico químicas indexada por código de PA, junto con los nombres de las
+#   variables ('nombres'). ValueError si le falta alguna variable de PHYSICAL_CHEMICAL.
+def loadPhysicalChemical(route):
+    physicalChemical = pd.read_csv(route)
+    codes = getNumericCodes(physicalChemical.codigo)
+    physicalChemical = physicalChemical.drop(ERASE_PHYSICAL_CHEMICAL, axis=1)
+    missing = [name for name in PHYSICAL_CHEMICAL if name not in physicalChemical.columns]
+    if missing:
+        raise ValueError('La tabla de variables fisico quimicas no tiene las columnas: %s' % missing)
+    table = getDenseTable(codes, physicalChemical.values.astype(float))
+    table['nombres'] = list(physicalChemical.columns)
+    return table
+
+# METODO: se obtiene una tabla de referencia cargada en memoria. La tabla se lee una sola vez y se vuelve a leer
+# solamente cuando su archivo cambia (fecha de modificación o tamaño). Al leerla se guarda también el checksum MD5 del
+# archivo (ver getTablesVersion).
+# PARAMETROS DE ENTRADA:
+# - fileName(String): nombre del archivo de la tabla
+# - loader(Function): función que carga la tabla a partir de la ruta del archivo
+# PARAMETROS DE SALIDA:
+# - table(Dict): tabla de referencia
+def getTable(fileName, loader):
+    return getLoadedTable(fileName, loader)[0]
+
+# METODO: se obtiene una tabla de referencia cargada en memoria junto con el checksum de su archivo
+# PARAMETROS DE ENTRADA:
+# - fileName(String): nombre del archivo de la tabla
+# - loader(Function): función que carga la tabla a partir de la ruta del archivo
+# PARAMETROS DE SALIDA:
+# - table(Dict): tabla de referencia
+# - checksum(String): checksum MD5 del archivo de la tabla
+def getLoadedTable(fileName, loader):
+    route = getTableRoute(fileName)
+    stat = os.stat(route)
+    signature = (route, stat.st_mtime, stat.st_size)
+    table, checksum, loadedSignature = _loadedTables.get(fileName, (None, None, None))
+    if(signature == loadedSignature):
+        return (table, checksum)
+
+    with _loadLock:
+        table, checksum, loadedSignature = _loadedTables.get(fileName, (None, None, None))
+        if(signature != loadedSignature):
+            start = time.time()
+            tableFile = open(route, 'rb')
+            checksum = hashlib.md5(tableFile.read()).hexdigest()
+            tableFile.close()
+            table = loader(route)
+            _loadedTables[fileName] = (table, checksum, signature)
+            Metrics.observeStage('carga_tablas', start)
+    return (table, checksum)
+
+# METODO: se cargan en memoria todas las tablas de referencia, por ejemplo al iniciar el servicio
+# PARAMETROS DE ENTRADA:
+# - Ninguno
+# PARAMETROS DE SALIDA:
+# - Ninguno
+def preloadTables():
+    getTable(SOLUBILITY_FILE, loadSolubility)
+    getTable(PHYSICAL_CHEMICAL_FILE, loadPhysicalChemical)
+
+# METODO: se obtiene la versión de las tablas de referencia: un hash de los checksums de sus archivos. Cambia cuando
+# cambia el contenido de cualquiera de las tablas.
+# PARAMETROS DE ENTRADA:
+# - Ninguno
+# PARAMETROS DE SALIDA:
+# - version(String): versión de las tablas de referencia
+def getTablesVersion():
+    solubility = getLoadedTable(SOLUBILITY_FILE, loadSolubility)[1]
+    physicalChemical = getLoadedTable(PHYSICAL_CHEMICAL_FILE, loadPhysicalChemical)[1]
+    return hashlib.md5(solubility+physicalChemical).hexdigest()
+
+# METODO: se buscan en la tabla densa los valores para un grupo de códigos
+# PARAMETROS DE ENTRADA:
+# - table(Dict): tabla densa
+# - codes(List): códigos numéricos a buscar
+# - description(String): descripción de la tabla para el mensaje de error
+# PARAMETROS DE SALIDA:
+# - values(Array): matriz con una fila por código
+def lookupCodes(table, codes, description):
+    codes = np.asarray(codes, dtype=int).reshape(-1)
+    presents = table['presentes']
+    found = (codes >= 0) & (codes < len(presents))
+    found[found] = presents[codes[found]]
+    if(not found.all()):
+        raise ValueError('Codigos sin %s: %s' % (description, list(codes[~found])))
+    return table['valores'][codes]
+
+# METODO: se obtiene la solubilidad en agua de un grupo de excipientes
+# PARAMETROS DE ENTRADA:
+# - codes(List): códigos numéricos de los excipientes
+# PARAMETROS DE SALIDA:
+# - solubilities(Array): solubilidad de cada excipiente, en el mismo orden de los códigos
+def getSolubilities(codes):
+    table = getTable(SOLUBILITY_FILE, loadSolubility)
+    return lookupCodes(table, codes, 'solubilidad')[:,0]
+
+# METODO: se obtienen las variables físico químicas de un grupo de principios activos
+# PARAMETROS DE ENTRADA:
+# - codes(List): códigos numéricos de los principios activos
+# PARAMETROS DE SALIDA:
+# - names(List): nombres de las variables físico químicas
+# - values(Array): matriz con las variables físico químicas, una fila por código
+def getPhysicalChemicals(codes):
+    table = getTable(PHYSICAL_CHEMICAL_FILE, loadPhysicalChemical)
+    return (table['nombres'], lookupCodes(table, codes, 'variables fisico quimicas'))
@@ -0,0 +1,501 @@
+# -*- coding: latin-1 -*-
+import os
+import math
+import numpy as np
+
+# Tipos de excipiente, en el orden de la estructura de entrada del simulador
+EXCIPIENTS = ['aglutinantes','desintegrantes','deslizantes','diluyentes','lubricantes','surfactantes','otros']
+
+# Variables numéricas que pasan sin procesamiento a la estructura de entrada del simulador
+GENERAL_VARIABLES = ['humedadGranulado','proporcionGranulado','tiempoMezcladoGranulado','proporcionSolvente',
+                     'temperaturaSecado','tiempoSecado','largoPromedio','largoSTD','anchoPromedio','anchoSTD',
+                     'alturaPromedio','alturaSTD','tiempoMezclaTotalFormula','pesoPromedio','pesoSTD','durezaPromedio',
+                     'durezaSTD','tamanoParticulaMezcla','humedadMezcla','tiempoDesintegracionMinima',
+                     'tiempoDesintegracionMaxima','longitudOnda','velocidadRotacional','PHMedio','volumen']
+
+# Variables categóricas (se codifican con One Hot Encoding, ver Processing.fillOneHotEncoding)
+CATEGORIES = ['via','recubrimiento','metodo','aparatoDisolucion']
+
+# Porcentaje de disolución que debe alcanzar un perfil: de él se toman los tiempos inmediatamente anterior y superior
+DISSOLUTION_LIMIT = 85
+
+# Número máximo de inicios de una solicitud de optimización (variable de entorno SD_OPTIMIZACION_INICIOS): cada inicio
+# es una optimización completa
+MAX_STARTS = int(os.environ.get('SD_OPTIMIZACION_INICIOS', 16))
+
+# Esquema compilado de un experimento registrado: funciones que leen y validan cada parte del experimento campo por
+# campo. Se arma una sola vez al cargar el módulo (ver decodePA y las siguientes); decodeExperiment lo recorre solo si la
+# decodificación rápida (convertExperiment) encuentra un problema.
+SCHEMA = []
+
+# Esquema de los demás campos de una solicitud de optimización y de barrido (ver decodeStopping y las siguientes):
+# funciones que los leen y validan antes de cargar tablas o el modelo, así una solicitud mal formada se responde con sus
+# errores
+OPTIMIZATION_SCHEMA = []
+SWEEP_SCHEMA = []
+
+# Criterios de la política de parada de una optimización (ver OptimizationExperiment.getStoppingCallback): números y
+# cuentas (enteros mayores o iguales a 1)
+STOPPING_FIELDS = ['f2Objetivo','tolerancia','tiempoMaximo']
+STOPPING_COUNTS = ['ventana','maxEvaluaciones']
+
+# Clase del error de un experimento o una solicitud que no cumple el esquema. Es un ValueError, así los llamados que ya
+# reportaban errores de valor (lotes, barridos) siguen funcionando.
+class SchemaError(ValueError):
+
+    # METODO: se crea el error a partir de todos los problemas encontrados
+    # PARAMETROS DE ENTRADA
+    # - errors(List): problemas encontrados, cada uno con el campo ('campo') y la descripción ('error')
+    def __init__(self, errors):
+        ValueError.__init__(self, '; '.join('%s: %s' % (error['campo'], error['error']) for error in errors))
+        self.errors = errors
+
+# Clase del experimento decodificado: el mismo JSON del experimento (se puede usar en donde se usaba el JSON) junto con
+# los valores que necesita la construcción de la fila de entrada del simulador (ver Processing.buildFeatureRow):
+# - codePA(Int), percentagePA(Float), sizePA(Float): código, porcentaje y tamaño de partícula del PA valorado
+# - excipients(List): por tipo de excipiente (EXCIPIENTS), listas de códigos, porcentajes y tamaños de partícula
+# - categories(List): valores de las variables categóricas (CATEGORIES)
+# - times(List): primer tiempo del perfil, el inmediatamente anterior a 85% y el inmediatamente superior a 85%
+# - general(List): valores de las variables generales (GENERAL_VARIABLES)
+class Experiment(dict):
+    pass
+
+# METODO: se registra un problema del experimento
+# PARAMETROS DE ENTRADA:
+# - errors(List): problemas encontrados
+# - path(String): campo con el problema
+# - message(String): descripción del problema
+# PARAMETROS DE SALIDA:
+# - None: valor del campo con problema
+def addError(errors, path, message):
+    errors.append({'campo': path, 'error': message})
+    return None
+
+# METODO: se lee un campo obligatorio de un objeto JSON
+# PARAMETROS DE ENTRADA:
+# - data(Dict): objeto JSON
+# - name(String): nombre del campo
+# - path(String): ruta del campo, para los errores
+# - errors(List): problemas encontrados
+# - reader(Function): función que lee y valida el valor (readNumber, readCode, ...), o None para tomarlo sin cambios
+# PARAMETROS DE SALIDA:
+# - value(Object): valor del campo, o None si no está o no es válido
+def readField(data, name, path, errors, reader=None):
+    if name not in data:
+        return addError(errors, path, 'es obligatorio')
+    if reader is None:
+        return data[name]
+    return reader(data[name], path, errors)
+
+# METODO: se lee un número finito (también se aceptan textos con un número, como antes de validar el esquema)
+# PARAMETROS DE ENTRADA:
+# - value(Object): valor del campo
+# - path(String): ruta del campo, para los errores
+# - errors(List): problemas encontrados
+# PARAMETROS DE SALIDA:
+# - number(Float): número, o None si no es válido
+def readNumber(value, path, errors):
+    if(isinstance(value, bool) or not isinstance(value, (int, long, float, basestring))):
+        return addError(errors, path, 'debe ser un numero')
+    try:
+        number = float(value)
+    except ValueError:
+        return addError(errors, path, 'debe ser un numero')
+    if(math.isnan(number) or math.isinf(number)):
+        return addError(errors, path, 'debe ser un numero finito')
+    return number
+
+# METODO: se lee una cuenta: un entero mayor o igual a 1 (también se aceptan textos y números sin decimales)
+# PARAMETROS DE ENTRADA:
+# - value(Object): valor del campo
+# - path(String): ruta del campo, para los errores
+# - errors(List): problemas encontrados
+# PARAMETROS DE SALIDA:
+# - count(Int): cuenta, o None si no es válida
+def readCount(value, path, errors):
+    number = readNumber(value, path, errors)
+    if number is None:
+        return None
+    if(not number.is_integer() or number < 1):
+        return addError(errors, path, 'debe ser un entero mayor o igual a 1')
+    return int(number)
+
+# METODO: se lee el código de un PA o de un excipiente (entero o texto con un entero)
+# PARAMETROS DE ENTRADA:
+# - value(Object): valor del campo
+# - path(String): ruta del campo, para los errores
+# - errors(List): problemas encontrados
+# PARAMETROS DE SALIDA:
+# - code(Int): código, o None si no es válido
+def readCode(value, path, errors):
+    if(isinstance(value, float) and value.is_integer()):
+        return int(value)
+    if(isinstance(value, bool) or not isinstance(value, (int, long, basestring))):
+        return addError(errors, path, 'debe ser un codigo entero')
+    try:
+        return int(value)
+    except ValueError:
+        return addError(errors, path, 'debe ser un codigo entero')
+
+# METODO: se lee un texto
+# PARAMETROS DE ENTRADA:
+# - value(Object): valor del campo
+# - path(String): ruta del campo, para los errores
+# - errors(List): problemas encontrados
+# PARAMETROS DE SALIDA:
+# - text(String): texto, o None si no es válido
+def readText(value, path, errors):
+    if(not isinstance(value, basestring)):
+        return addError(errors, path, 'debe ser un texto')
+    return value
+
+# METODO: se lee una lista de componentes (principios activos o excipientes de un tipo), cada uno con su código
+# ('nombre'), porcentaje y tamaño de partícula
+# PARAMETROS DE ENTRADA:
+# - value(Object): valor del campo
+# - path(String): ruta del campo, para los errores
+# - errors(List): problemas encontrados
+# PARAMETROS DE SALIDA:
+# - components(List): códigos, porcentajes y tamaños de partícula, o None si no es una lista
+def readComponents(value, path, errors):
+    if(not isinstance(value, list)):
+        return addError(errors, path, 'debe ser una lista')
+    codes = []
+    percentages = []
+    sizes = []
+    for i in range(len(value)):
+        itemPath = '%s[%d]' % (path, i)
+        item = value[i]
+        if(not isinstance(item, dict)):
+            addError(errors, itemPath, 'debe ser un objeto')
+            continue
+        codes.append(readField(item, 'nombre', itemPath+'.nombre', errors, readCode))
+        percentages.append(readField(item, 'porcentaje', itemPath+'.porcentaje', errors, readNumber))
+        sizes.append(readField(item, 'tamanoParticula', itemPath+'.tamanoParticula', errors, readNumber))
+    return [codes, percentages, sizes]
+
+# METODO: se lee un perfil de disolución (lista de puntos con 'tiempo' y 'media') y se ubica el primer punto que
+# alcanza el 85%. Un perfil que no lo alcanza no se puede usar (ver Processing.fillTimes).
+# PARAMETROS DE ENTRADA:
+# - value(Object): valor del campo
+# - path(String): ruta del campo, para los errores
+# - errors(List): problemas encontrados
+# PARAMETROS DE SALIDA:
+# - profile(List): tiempos, medias y posición del primer punto que alcanza el 85%, o None si no es válido
+def readProfile(value, path, errors):
+    if(not isinstance(value, list) or len(value) == 0):
+        return addError(errors, path, 'debe ser una lista no vacia')
+    count = len(errors)
+    times = []
+    means = []
+    for i in range(len(value)):
+        itemPath = '%s[%d]' % (path, i)
+        item = value[i]
+        if(not isinstance(item, dict)):
+            addError(errors, itemPath, 'debe ser un objeto')
+            continue
+        times.append(readField(item, 'tiempo', itemPath+'.tiempo', errors, readNumber))
+        means.append(readField(item, 'media', itemPath+'.media', errors, readNumber))
+    if(len(errors) > count):
+        return None
+    for i in range(len(means)):
+        if(means[i] >= DISSOLUTION_LIMIT):
+            return [times, means, i]
+    return addError(errors, path, 'el perfil debe alcanzar el %d%% de disolucion' % DISSOLUTION_LIMIT)
+
+# METODO: se leen el PA valorado y la lista de principios activos
+# PARAMETROS DE ENTRADA:
+# - experimentJSON(Dict): experimento registrado
+# - experiment(Experiment): experimento decodificado, en donde se escriben los valores
+# - errors(List): problemas encontrados
+# PARAMETROS DE SALIDA:
+# - Ninguno
+def decodePA(experimentJSON, experiment, errors):
+    namePA = readField(experimentJSON, 'principioActivoValorado', 'principioActivoValorado', errors, readCode)
+    PAs = readField(experimentJSON, 'principiosActivos', 'principiosActivos', errors, readComponents)
+    if(namePA is None or PAs is None):
+        return
+    # Si el PA valorado aparece varias veces se toma el último, como antes
+    position = None
+    for i in range(len(PAs[0])):
+        if(PAs[0][i] == namePA):
+            position = i
+    if position is None:
+        addError(errors, 'principioActivoValorado', 'no esta en principiosActivos')
+        return
+    experiment.codePA = namePA
+    experiment.percentagePA = PAs[1][position]
+    experiment.sizePA = PAs[2][position]
+
+# METODO: se leen los excipientes de cada tipo
+# PARAMETROS DE ENTRADA:
+# - experimentJSON(Dict): experimento registrado
+# - experiment(Experiment): experimento decodificado, en donde se escriben los valores
+# - errors(List): problemas encontrados
+# PARAMETROS DE SALIDA:
+# - Ninguno
+def decodeExcipients(experimentJSON, experiment, errors):
+    experiment.excipients = [readField(experimentJSON, name, name, errors, readComponents) for name in EXCIPIENTS]
+
+# METODO: se leen las variables categóricas
+# PARAMETROS DE ENTRADA:
+# - experimentJSON(Dict): experimento registrado
+# - experiment(Experiment): experimento decodificado, en donde se escriben los valores
+# - errors(List): problemas encontrados
+# PARAMETROS DE SALIDA:
+# - Ninguno
+def decodeCategories(experimentJSON, experiment, errors):
+    experiment.categories = [readField(experimentJSON, name, name, errors, readText) for name in CATEGORIES]
+
+# METODO: se leen los tiempos seleccionados del perfil de disolución del experimento
+# PARAMETROS DE ENTRADA:
+# - experimentJSON(Dict): experimento registrado
+# - experiment(Experiment): experimento decodificado, en donde se escriben los valores
+# - errors(List): problemas encontrados
+# PARAMETROS DE SALIDA:
+# - Ninguno
+def decodeTimes(experimentJSON, experiment, errors):
+    profile = readField(experimentJSON, 'tiempos', 'tiempos', errors, readProfile)
+    if profile is not None:
+        times, means, i = profile
+        # Si el primer punto ya alcanza el 85% el tiempo anterior es el último del perfil, como antes
+        experiment.times = [times[0], times[i-1], times[i]]
+
+# METODO: se leen las variables generales
+# PARAMETROS DE ENTRADA:
+# - experimentJSON(Dict): experimento registrado
+# - experiment(Experiment): experimento decodificado, en donde se escriben los valores
+# - errors(List): problemas encontrados
+# PARAMETROS DE SALIDA:
+# - Ninguno
+def decodeGeneral(experimentJSON, experiment, errors):
+    experiment.general = [readField(experimentJSON, name, name, errors, readNumber) for name in GENERAL_VARIABLES]
+
+# Las funciones de decodificación de cada parte del experimento reciben el JSON, el experimento decodificado en donde
+# escriben sus valores y la lista de problemas encontrados
+SCHEMA.extend([decodePA, decodeExcipients, decodeCategories, decodeTimes, decodeGeneral])
+
+# Tipos de los valores que aceptan readNumber y readCode sin más revisiones (el tipo exacto: bool no es un número). Se
+# incluyen los números de NumPy de los experimentos armados en el servidor.
+NUMBER_TYPES = frozenset([int, long, float, str, unicode, np.float64])
+CODE_TYPES = frozenset([int, long, str, unicode])
+LIST_TYPE = set([list])
+
+# METODO: se convierten a números todos los valores de una lista a la vez, solo si todos son válidos (ver readNumber)
+# PARAMETROS DE ENTRADA:
+# - values(List): valores
+# - types(Set): tipos aceptados
+# - convert(Function): conversión (float o int)
+# PARAMETROS DE SALIDA:
+# - numbers(List): valores convertidos (ValueError o TypeError si alguno no es válido)
+def convertAll(values, types, convert):
+    if(not types.issuperset(map(type, values))):
+        raise ValueError('Tipo no valido')
+    numbers = map(convert, values)
+    # La suma de números finitos es finita (salvo desbordamiento, que también se revisa en detalle); con un NaN o un
+    # infinito la resta da NaN
+    total = sum(numbers)
+    if(total-total != 0):
+        raise ValueError('Numero no finito')
+    return numbers
+
+# METODO: se decodifica un experimento asumiendo que es válido: los códigos se convierten en una sola lista y todos
+# los números (porcentajes, tamaños de partícula, variables generales y perfil) en otra, en lugar de revisar cada campo
+# por separado. Cualquier problema lanza una excepción y el experimento se vuelve a recorrer campo por campo (ver
+# decodeExperiment), que es la revisión que decide y reporta los errores.
+# PARAMETROS DE ENTRADA:
+# - experimentJSON(Dict): experimento registrado
+# PARAMETROS DE SALIDA:
+# - experiment(Experiment): experimento decodificado
+def convertExperiment(experimentJSON):
+    experiment = Experiment(experimentJSON)
+    # Principios activos y luego los excipientes de cada tipo, todos los componentes en una sola lista
+    lists = [experimentJSON['principiosActivos']]+[experimentJSON[name] for name in EXCIPIENTS]
+    profile = experimentJSON['tiempos']
+    lists.append(profile)
+    if(set(map(type, lists)) != LIST_TYPE):
+        raise ValueError('Tipo no valido')
+    lists.pop()
+    components = [component for components in lists for component in components]
+    n = len(components)
+    codes = convertAll([component['nombre'] for component in components]+[experimentJSON['principioActivoValorado']],
+                       CODE_TYPES, int)
+    numbers = convertAll([component['porcentaje'] for component in components]+
+                         [component['tamanoParticula'] for component in components]+
+                         [experimentJSON[name] for name in GENERAL_VARIABLES]+
+                         [point['tiempo'] for point in profile]+[point['media'] for point in profile],
+                         NUMBER_TYPES, float)
+    percentages = numbers[:n]
+    sizes = numbers[n:2*n]
+    parts = []
+    start = 0
+    for components in lists:
+        end = start+len(components)
+        parts.append([codes[start:end], percentages[start:end], sizes[start:end]])
+        start = end
+
+    # Si el PA valorado aparece varias veces se toma el último
+    namePA = codes[-1]
+    position = len(parts[0][0])-1-parts[0][0][::-1].index(namePA)
+    experiment.codePA = namePA
+    experiment.percentagePA = parts[0][1][position]
+    experiment.sizePA = parts[0][2][position]
+    experiment.excipients = parts[1:]
+    experiment.categories = [experimentJSON[name] for name in CATEGORIES]
+    if(not all(isinstance(value, basestring) for value in experiment.categories)):
+        raise ValueError('Tipo no valido')
+    start = 2*n+len(GENERAL_VARIABLES)
+    experiment.general = numbers[2*n:start]
+    times = numbers[start:start+len(profile)]
+    means = numbers[start+len(profile):]
+    i = 0
+    while(means[i] < DISSOLUTION_LIMIT):
+        i += 1
+    experiment.times = [times[0], times[i-1], times[i]]
+    return experiment
+
+# METODO: se valida un experimento registrado contra el esquema y se extraen, en un solo recorrido, todos los valores
+# que necesita la construcción de la fila de entrada del simulador. Se reportan todos los problemas a la vez.
+# PARAMETROS DE ENTRADA:
+# - experimentJSON(JSON): experimento registrado, o un experimento ya decodificado (se retorna sin cambios)
+# - prefix(String): prefijo de los campos en los errores (por ejemplo 'experimento.' en una optimización)
+# PARAMETROS DE SALIDA:
+# - experiment(Experiment): experimento decodificado
+def decodeExperiment(experimentJSON, prefix=''):
+    if isinstance(experimentJSON, Experiment):
+        return experimentJSON
+    if(not isinstance(experimentJSON, dict)):
+        raise SchemaError([{'campo': prefix.rstrip('.') or 'experimento', 'error': 'debe ser un objeto JSON'}])
+    # Casi todos los experimentos son válidos: primero se intenta la decodificación rápida
+    try:
+        return convertExperiment(experimentJSON)
+    except (KeyError, IndexError, TypeError, ValueError, OverflowError):
+        pass
+    errors = []
+    experiment = Experiment(experimentJSON)
+    for decode in SCHEMA:
+        decode(experimentJSON, experiment, errors)
+    if errors:
+        for error in errors:
+            error['campo'] = prefix+error['campo']
+        raise SchemaError(errors)
+    return experiment
+
+# METODO: se valida la política de parada de una solicitud de optimización ('parada'), si la tiene. En la copia de la
+# solicitud sus criterios quedan convertidos a números, así la optimización no compara textos con números.
+# PARAMETROS DE ENTRADA:
+# - fJSON(Dict): copia de la solicitud
+# - errors(List): problemas encontrados
+# PARAMETROS DE SALIDA:
+# - Ninguno
+def decodeStopping(fJSON, errors):
+    policy = fJSON.get('parada')
+    if policy is None:
+        return
+    if(not isinstance(policy, dict)):
+        addError(errors, 'parada', 'debe ser un objeto JSON')
+        return
+    policy = fJSON['parada'] = dict(policy)
+    for name in STOPPING_FIELDS+STOPPING_COUNTS:
+        if(policy.get(name) is not None):
+            reader = readNumber if name in STOPPING_FIELDS else readCount
+            policy[name] = reader(policy[name], 'parada.'+name, errors)
+
+# METODO: se validan los percentiles de la tabla de entradas que limitan la búsqueda o el barrido ('percentiles'), si
+# se envían: [inferior, superior] con 0 <= inferior < superior <= 100. En la copia de la solicitud quedan convertidos a
+# números.
+# PARAMETROS DE ENTRADA:
+# - fJSON(Dict): copia de la solicitud
+# - errors(List): problemas encontrados
+# PARAMETROS DE SALIDA:
+# - Ninguno
+def decodePercentiles(fJSON, errors):
+    percentiles = fJSON.get('percentiles')
+    if percentiles is None:
+        return
+    if(not isinstance(percentiles, list) or len(percentiles) != 2):
+        addError(errors, 'percentiles', 'debe ser una lista [inferior, superior]')
+        return
+    percentiles = [readNumber(percentiles[i], 'percentiles[%d]' % i, errors) for i in range(2)]
+    if None in percentiles:
+        return
+    if(not 0 <= percentiles[0] < percentiles[1] <= 100):
+        addError(errors, 'percentiles', 'deben cumplir 0 <= inferior < superior <= 100')
+        return
+    fJSON['percentiles'] = percentiles
+
+# METODO: se valida el manejo de las restricciones de una solicitud de optimización ('modo'), si se envía: un modo
+# desconocido (por ejemplo con otra ortografía) no debe ejecutar otro algoritmo sin avisar
+# PARAMETROS DE ENTRADA:
+# - fJSON(Dict): copia de la solicitud
+# - errors(List): problemas encontrados
+# PARAMETROS DE SALIDA:
+# - Ninguno
+def decodeMode(fJSON, errors):
+    from ServicesDisolution.Optimization import OptimizationExperiment
+    modes = [OptimizationExperiment.PENALTY, OptimizationExperiment.REPAIR]
+    mode = fJSON.get('modo')
+    if(mode is not None and mode not in modes):
+        addError(errors, 'modo', 'debe ser uno de: %s' % ', '.join(modes))
+
+OPTIMIZATION_SCHEMA.extend([decodeStopping, decodePercentiles, decodeMode])
+SWEEP_SCHEMA.extend([decodePercentiles])
+
+# METODO: se valida una solicitud sobre un experimento (optimización o barrido) y se decodifica su experimento
+# PARAMETROS DE ENTRADA:
+# - fJSON(JSON): solicitud con el experimento ('experimento'), las variables ('variables') y el perfil de referencia
+#   ('perfil')
+# - profileRequired(Bool): si el perfil de referencia es obligatorio; si no, solo se valida cuando se envía
+# - schema(List): funciones que validan los demás campos de la solicitud (por ejemplo OPTIMIZATION_SCHEMA), reciben la
+#   copia de la solicitud y la lista de problemas encontrados
+# PARAMETROS DE SALIDA:
+# - fJSON(Dict): copia de la solicitud con el experimento decodificado
+def decodeRequest(fJSON, profileRequired, schema=()):
+    from ServicesDisolution.DataProcessing import Processing
+    if(not isinstance(fJSON, dict)):
+        raise SchemaError([{'campo': 'solicitud', 'error': 'debe ser un objeto JSON'}])
+    errors = []
+    fJSON = dict(fJSON)
+    if 'experimento' not in fJSON:
+        addError(errors, 'experimento', 'es obligatorio')
+    else:
+        try:
+            fJSON['experimento'] = decodeExperiment(fJSON['experimento'], 'experimento.')
+        except SchemaError as e:
+            errors.extend(e.errors)
+    if(profileRequired or fJSON.get('perfil')):
+        readField(fJSON, 'perfil', 'perfil', errors, readProfile)
+    variables = readField(fJSON, 'variables', 'variables', errors)
+    if(variables is not None and not isinstance(variables, list)):
+        addError(errors, 'variables', 'debe ser una lista')
+    elif variables is not None:
+        for i in range(len(variables)):
+            if(not isinstance(variables[i], basestring) or variables[i] not in Processing.SLOTS):
+                addError(errors, 'variables[%d]' % i, 'no es una variable del simulador')
+    for name in ('semilla', 'inicios'):
+        value = fJSON.get(name)
+        if(value is not None and (isinstance(value, bool) or not isinstance(value, (int, long)))):
+            addError(errors, name, 'debe ser un entero')
+        elif(name == 'inicios' and value is not None and not 1 <= value <= MAX_STARTS):
+            addError(errors, name, 'debe estar entre 1 y %d' % MAX_STARTS)
+    for decode in schema:
+        decode(fJSON, errors)
+    if errors:
+        raise SchemaError(errors)
+    return fJSON
+
+# METODO: se valida una solicitud de optimización (ver OptimizationExperiment.Optimizer) y se decodifica su experimento
+# PARAMETROS DE ENTRADA:
+# - fJSON(JSON): solicitud de optimización
+# PARAMETROS DE SALIDA:
+# - fJSON(Dict): copia de la solicitud con el experimento decodificado
+def decodeOptimization(fJSON):
+    return decodeRequest(fJSON, True, OPTIMIZATION_SCHEMA)
+
+# METODO: se valida una solicitud de barrido (ver Sweep.makeSweep) y se decodifica su experimento
+# PARAMETROS DE ENTRADA:
+# - fJSON(JSON): solicitud de barrido
+# PARAMETROS DE SALIDA:
+# - fJSON(Dict): copia de la solicitud con el experimento decodificado
+def decodeSweep(fJSON):
+    return decodeRequest(fJSON, False, SWEEP_SCHEMA)
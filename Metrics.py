@@ -0,0 +1,237 @@
+# -*- coding: latin-1 -*-
+import os
+import json
+import time
+import bisect
+import threading
+import multiprocessing.util
+
+# Uso de las métricas (variable de entorno SD_METRICAS, '0' para no registrar nada)
+ENABLED = os.environ.get('SD_METRICAS', '1') != '0'
+
+# Carpeta en donde cada proceso escribe sus métricas para que cualquier proceso del servicio las reporte todas (variable
+# de entorno SD_RUTA_METRICAS). Si no se define cada proceso reporta solo las suyas; con varios procesos el servidor
+# usa una carpeta temporal (ver Server.serve). Cada proceso escribe sus métricas a lo sumo cada FLUSH_INTERVAL segundos.
+# Los procesos trabajadores de optimización no las escriben: las envían al proceso del servicio junto con el resultado
+# de cada tarea (ver popSnapshot y merge).
+METRICS_ROUTE = os.environ.get('SD_RUTA_METRICAS')
+FLUSH_INTERVAL = float(os.environ.get('SD_METRICAS_INTERVALO', 5))
+
+# Límites de los intervalos de los histogramas: segundos y número de evaluaciones del modelo
+TIME_BUCKETS = [0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, float('inf')]
+EVALUATION_BUCKETS = [100, 250, 500, 1000, 2500, 5000, 10000, 25000, float('inf')]
+
+# Métricas conocidas: nombre -> (tipo, descripción, nombre de la etiqueta, límites de los intervalos)
+REQUEST_SECONDS = 'sd_solicitud_segundos'
+REQUESTS = 'sd_solicitudes_total'
+ERRORS = 'sd_errores_total'
+STAGE_SECONDS = 'sd_etapa_segundos'
+EVALUATIONS = 'sd_optimizacion_evaluaciones'
+CACHE_HITS = 'sd_cache_aciertos_total'
+CACHE_MISSES = 'sd_cache_fallos_total'
+METRICS = {
+    REQUEST_SECONDS: ('histogram', 'Duracion de las solicitudes por ruta', 'ruta', TIME_BUCKETS),
+    REQUESTS: ('counter', 'Solicitudes atendidas por ruta', 'ruta', None),
+    ERRORS: ('counter', 'Solicitudes con error (codigo 4xx o 5xx) por ruta', 'ruta', None),
+    STAGE_SECONDS: ('histogram', 'Duracion de cada etapa del procesamiento', 'etapa', TIME_BUCKETS),
+    EVALUATIONS: ('histogram', 'Evaluaciones del modelo por optimizacion', None, EVALUATION_BUCKETS),
+    CACHE_HITS: ('counter', 'Filas tomadas de la cache de predicciones', None, None),
+    CACHE_MISSES: ('counter', 'Filas predichas con el modelo por no estar en la cache', None, None),
+}
+
+# Valores del proceso: (nombre, etiqueta) -> contador, o lista con las cuentas de cada intervalo, la suma y el total
+_values = {}
+_lock = threading.Lock()
+_state = {'escrito': 0.0}
+
+# METODO: se descartan las métricas del proceso. Un proceso hijo empieza con una copia de las métricas del padre, que
+# ya se reportan en el archivo del padre: se llama después de crear el proceso (automáticamente en los procesos de
+# multiprocessing).
+# PARAMETROS DE ENTRADA:
+# - Ninguno
+# PARAMETROS DE SALIDA:
+# - Ninguno
+def reset():
+    global _lock
+    _lock = threading.Lock()
+    _values.clear()
+    _state['escrito'] = 0.0
+
+multiprocessing.util.register_after_fork(reset, lambda function: function())
+
+# METODO: se registra una observación en un histograma
+# PARAMETROS DE ENTRADA:
+# - name(String): nombre del histograma
+# - value(Float): valor observado
+# - label(String): valor de la etiqueta, o None si el histograma no tiene etiqueta
+# PARAMETROS DE SALIDA:
+# - Ninguno
+def observe(name, value, label=None):
+    if not ENABLED:
+        return
+    buckets = METRICS[name][3]
+    index = bisect.bisect_left(buckets, value)
+    key = (name, label)
+    with _lock:
+        series = _values.get(key)
+        if series is None:
+            series = _values[key] = [0]*(len(buckets)+2)
+        series[index] += 1
+        series[-2] += value
+        series[-1] += 1
+
+# METODO: se registra la duración de una etapa, desde su inicio hasta ahora
+# PARAMETROS DE ENTRADA:
+# - stage(String): nombre de la etapa
+# - start(Float): momento de inicio de la etapa (time.time())
+# PARAMETROS DE SALIDA:
+# - Ninguno
+def observeStage(stage, start):
+    observe(STAGE_SECONDS, time.time()-start, stage)
+
+# METODO: se incrementa un contador
+# PARAMETROS DE ENTRADA:
+# - name(String): nombre del contador
+# - label(String): valor de la etiqueta, o None si el contador no tiene etiqueta
+# - value(Float): incremento
+# PARAMETROS DE SALIDA:
+# - Ninguno
+def increment(name, label=None, value=1):
+    if not ENABLED:
+        return
+    key = (name, label)
+    with _lock:
+        _values[key] = _values.get(key, 0)+value
+
+# METODO: se obtiene una copia de las métricas del proceso
+# PARAMETROS DE ENTRADA:
+# - Ninguno
+# PARAMETROS DE SALIDA:
+# - values(List): tripletas (nombre, etiqueta, valor)
+def getSnapshot():
+    with _lock:
+        return [(name, label, list(value) if isinstance(value, list) else value)
+                for (name, label), value in _values.items()]
+
+# METODO: se obtienen las métricas del proceso y se descartan, para enviarlas a otro proceso (ver merge)
+# PARAMETROS DE ENTRADA:
+# - Ninguno
+# PARAMETROS DE SALIDA:
+# - values(List): tripletas (nombre, etiqueta, valor)
+def popSnapshot():
+    with _lock:
+        snapshot = [(name, label, value) for (name, label), value in _values.items()]
+        _values.clear()
+    return snapshot
+
+# METODO: se suman a las métricas del proceso las de otro proceso (por ejemplo las que registró un proceso trabajador
+# al ejecutar una tarea, ver popSnapshot)
+# PARAMETROS DE ENTRADA:
+# - snapshot(List): tripletas (nombre, etiqueta, valor)
+# PARAMETROS DE SALIDA:
+# - Ninguno
+def merge(snapshot):
+    with _lock:
+        for name, label, value in snapshot:
+            _values[(name, label)] = addValues(_values.get((name, label)), value)
+
+# METODO: se escriben las métricas del proceso en la carpeta de métricas, si pasaron más de FLUSH_INTERVAL segundos
+# desde la última vez. El archivo se escribe en uno temporal que luego lo reemplaza.
+# PARAMETROS DE ENTRADA:
+# - force(Bool): si es True se escriben aunque no haya pasado el intervalo
+# PARAMETROS DE SALIDA:
+# - Ninguno
+def flush(force=False):
+    if(METRICS_ROUTE is None or not ENABLED):
+        return
+    now = time.time()
+    if(not force and now-_state['escrito'] < FLUSH_INTERVAL):
+        return
+    _state['escrito'] = now
+    try:
+        route = os.path.join(METRICS_ROUTE, '%d.json' % os.getpid())
+        temporal = route+'.tmp'
+        output = open(temporal, 'wb')
+        json.dump(getSnapshot(), output)
+        output.close()
+        if(os.name == 'nt' and os.path.exists(route)):
+            os.remove(route)
+        os.rename(temporal, route)
+    except (IOError, OSError):
+        pass
+
+# METODO: se suman dos valores de una métrica (contadores o histogramas)
+# PARAMETROS DE ENTRADA:
+# - total(Object): valor acumulado, o None
+# - value(Object): valor a sumar
+# PARAMETROS DE SALIDA:
+# - total(Object): suma
+def addValues(total, value):
+    if total is None:
+        return list(value) if isinstance(value, list) else value
+    if isinstance(value, list):
+        return [total[i]+value[i] for i in range(len(value))]
+    return total+value
+
+# METODO: se reúnen las métricas de todos los procesos: las del proceso actual y las escritas en la carpeta de métricas
+# por los demas (también las de procesos que ya terminaron, los contadores nunca disminuyen)
+# PARAMETROS DE ENTRADA:
+# - Ninguno
+# PARAMETROS DE SALIDA:
+# - values(Dict): (nombre, etiqueta) -> valor sumado
+def collect():
+    values = {}
+    snapshots = [getSnapshot()]
+    if METRICS_ROUTE is not None and os.path.isdir(METRICS_ROUTE):
+        own = '%d.json' % os.getpid()
+        for fileName in os.listdir(METRICS_ROUTE):
+            if(fileName.endswith('.json') and fileName != own):
+                try:
+                    metricsFile = open(os.path.join(METRICS_ROUTE, fileName), 'rb')
+                    snapshots.append(json.load(metricsFile))
+                    metricsFile.close()
+                except (IOError, OSError, ValueError):
+                    continue
+    for snapshot in snapshots:
+        for name, label, value in snapshot:
+            if name in METRICS:
+                values[(name, label)] = addValues(values.get((name, label)), value)
+    return values
+
+# METODO: se formatea un número en el formato de texto de Prometheus
+# PARAMETROS DE ENTRADA:
+# - value(Float): número
+# PARAMETROS DE SALIDA:
+# - text(String): número formateado
+def formatValue(value):
+    if(value == float('inf')):
+        return '+Inf'
+    return repr(value) if isinstance(value, float) else str(value)
+
+# METODO: se obtienen las métricas de todos los procesos en el formato de texto de Prometheus (versión 0.0.4)
+# PARAMETROS DE ENTRADA:
+# - Ninguno
+# PARAMETROS DE SALIDA:
+# - text(String): métricas en formato de texto
+def render():
+    values = collect()
+    lines = []
+    for name in sorted(METRICS):
+        kind, description, labelName, buckets = METRICS[name]
+        series = sorted((label, value) for (metric, label), value in values.items() if metric == name)
+        lines.append('# HELP %s %s' % (name, description))
+        lines.append('# TYPE %s %s' % (name, kind))
+        for label, value in series:
+            labels = '' if label is None else '%s="%s"' % (labelName, label.replace('\\', '\\\\').replace('"', '\\"'))
+            if(kind == 'counter'):
+                lines.append('%s%s %s' % (name, '{%s}' % labels if labels else '', formatValue(value)))
+                continue
+            cumulative = 0
+            for i in range(len(buckets)):
+                cumulative += value[i]
+                bucketLabels = (labels+',' if labels else '')+'le="%s"' % formatValue(float(buckets[i]))
+                lines.append('%s_bucket{%s} %d' % (name, bucketLabels, cumulative))
+            suffix = '{%s}' % labels if labels else ''
+            lines.append('%s_sum%s %s' % (name, suffix, formatValue(float(value[-2]))))
+            lines.append('%s_count%s %d' % (name, suffix, value[-1]))
+    return '\n'.join(lines)+'\n'
@@ -0,0 +1,238 @@
+# -*- coding: latin-1 -*-
+import os
+import csv
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+from StringIO import StringIO
+
+# Tamaño de los bloques que se leen de la tabla de entradas, número de filas de la muestra con la que se calculan los
+# percentiles y número de bytes antes de la posición leída con los que se verifica que la tabla no se reescribió
+BLOCK_SIZE = 8*1024*1024
+SAMPLE_SIZE = 4096
+CHECK_SIZE = 4096
+
+# Índice cargado en memoria: ruta de la tabla -> (índice, firma de la tabla, índice hasta la última línea completa)
+_loadedIndexes = {}
+_lock = threading.Lock()
+
+# METODO: se obtiene la ruta del archivo auxiliar en donde se guarda el índice de una tabla de entradas
+# PARAMETROS DE ENTRADA:
+# - route(String): ruta de la tabla de entradas
+# PARAMETROS DE SALIDA:
+# - indexRoute(String): ruta del archivo del índice
+def getIndexRoute(route):
+    return route+'.limites.npz'
+
+# METODO: se calcula el checksum de los bytes de la tabla inmediatamente anteriores a una posición
+# PARAMETROS DE ENTRADA:
+# - tableFile(File): archivo de la tabla abierto en modo binario
+# - offset(Int): posición
+# PARAMETROS DE SALIDA:
+# - checksum(String): checksum MD5 de los bytes
+def getChecksum(tableFile, offset):
+    start = max(0, offset-CHECK_SIZE)
+    tableFile.seek(start)
+    return hashlib.md5(tableFile.read(offset-start)).hexdigest()
+
+# METODO: se crea un índice vacío para una tabla de entradas, a partir de su encabezado
+# PARAMETROS DE ENTRADA:
+# - tableFile(File): archivo de la tabla abierto en modo binario
+# PARAMETROS DE SALIDA:
+# - index(Dict): índice vacío, posicionado después del encabezado
+def createIndex(tableFile):
+    tableFile.seek(0)
+    header = tableFile.readline()
+    columns = next(csv.reader([header.strip()]))
+    index = {'encabezado': header, 'columnas': columns, 'filas': 0, 'posicion': len(header),
+             'minimo': np.full(len(columns), np.nan), 'maximo': np.full(len(columns), np.nan),
+             'muestra': np.empty((0, len(columns)))}
+    index['checksum'] = getChecksum(tableFile, index['posicion'])
+    return index
+
+# METODO: se agregan al índice las filas de un bloque de la tabla: se actualizan los mínimos y máximos por columna y la
+# muestra aleatoria (muestreo de reservorio) con la que se calculan los percentiles
+# PARAMETROS DE ENTRADA:
+# - index(Dict): índice
+# - rows(Array): matriz con las filas nuevas
+# PARAMETROS DE SALIDA:
+# - Ninguno
+def addRows(index, rows):
+    if(len(rows) == 0):
+        return
+    with np.errstate(invalid='ignore'):
+        index['minimo'] = np.fmin(index['minimo'], np.nanmin(rows, axis=0))
+        index['maximo'] = np.fmax(index['maximo'], np.nanmax(rows, axis=0))
+
+    # La posición de cada fila en la muestra se sortea con una semilla que depende del número de filas ya vistas: la
+    # misma tabla leída en los mismos bloques da la misma muestra. Leída en otros bloques (por ejemplo a medida que
+    # crece) la muestra puede ser otra, con la misma distribución.
+    seen = index['filas']
+    sample = index['muestra']
+    free = min(SAMPLE_SIZE-len(sample), len(rows))
+    if(free > 0):
+        sample = np.vstack([sample, rows[:free]])
+    if(free < len(rows)):
+        rng = np.random.RandomState(seen % (2**32))
+        positions = rng.randint(0, np.arange(seen+free, seen+len(rows))+1)
+        replace = positions < SAMPLE_SIZE
+        sample[positions[replace]] = rows[free:][replace]
+    index['muestra'] = sample
+    index['filas'] = seen+len(rows)
+
+# METODO: se convierten líneas de la tabla de entradas a una matriz de filas
+# PARAMETROS DE ENTRADA:
+# - index(Dict): índice
+# - text(String): líneas de la tabla
+# PARAMETROS DE SALIDA:
+# - rows(Array): matriz con las filas, los valores que no son números quedan en NaN
+def parseRows(index, text):
+    rows = pd.read_csv(StringIO(text), header=None, names=index['columnas'])
+    return rows.apply(pd.to_numeric, errors='coerce').values.astype(float)
+
+# METODO: se obtiene una copia de un índice que se puede actualizar sin modificar el original
+# PARAMETROS DE ENTRADA:
+# - index(Dict): índice
+# PARAMETROS DE SALIDA:
+# - index(Dict): copia del índice
+def copyIndex(index):
+    index = dict(index)
+    index['muestra'] = index['muestra'].copy()
+    return index
+
+# METODO: se leen las filas de la tabla que estan después de la posición del índice y se agregan a él. Se leen por
+# bloques y solo hasta la última línea completa; lo que queda después de ella se retorna (una última fila sin salto de
+# línea, o una fila que se está escribiendo).
+# PARAMETROS DE ENTRADA:
+# - index(Dict): índice
+# - tableFile(File): archivo de la tabla abierto en modo binario
+# PARAMETROS DE SALIDA:
+# - pending(String): contenido después de la última línea completa
+def readNewRows(index, tableFile):
+    tableFile.seek(index['posicion'])
+    pending = ''
+    while True:
+        block = tableFile.read(BLOCK_SIZE)
+        if not block:
+            break
+        block = pending+block
+        end = block.rfind('\n')+1
+        pending = block[end:]
+        if(end > 0):
+            addRows(index, parseRows(index, block[:end]))
+            index['posicion'] += end
+    index['checksum'] = getChecksum(tableFile, index['posicion'])
+    return pending
+
+# METODO: se carga el índice guardado en el archivo auxiliar, si existe y corresponde a la tabla actual: mismo
+# encabezado y mismos bytes antes de la posición leída (si la tabla se reescribió y no solo se le agregaron filas, el
+# índice no sirve)
+# PARAMETROS DE ENTRADA:
+# - route(String): ruta de la tabla de entradas
+# - tableFile(File): archivo de la tabla abierto en modo binario
+# PARAMETROS DE SALIDA:
+# - index(Dict): índice guardado, o None si no existe o no corresponde a la tabla
+def loadIndex(route, tableFile):
+    indexRoute = getIndexRoute(route)
+    if(not os.path.exists(indexRoute)):
+        return None
+    try:
+        stored = np.load(indexRoute)
+        index = {'encabezado': str(stored['encabezado']), 'columnas': [str(c) for c in stored['columnas']],
+                 'filas': int(stored['filas']), 'posicion': int(stored['posicion']), 'minimo': stored['minimo'],
+                 'maximo': stored['maximo'], 'muestra': stored['muestra'], 'checksum': str(stored['checksum'])}
+        stored.close()
+    except Exception:
+        return None
+
+    tableFile.seek(0)
+    if(tableFile.readline() != index['encabezado']):
+        return None
+    if(os.fstat(tableFile.fileno()).st_size < index['posicion']):
+        return None
+    if(getChecksum(tableFile, index['posicion']) != index['checksum']):
+        return None
+    return index
+
+# METODO: se guarda el índice en el archivo auxiliar. Se escribe en un archivo temporal que luego reemplaza al anterior.
+# PARAMETROS DE ENTRADA:
+# - route(String): ruta de la tabla de entradas
+# - index(Dict): índice
+# PARAMETROS DE SALIDA:
+# - Ninguno
+def saveIndex(route, index):
+    indexRoute = getIndexRoute(route)
+    temporal = indexRoute+'.tmp'
+    indexFile = open(temporal, 'wb')
+    np.savez(indexFile, encabezado=index['encabezado'], columnas=np.array(index['columnas']), filas=index['filas'],
+             posicion=index['posicion'], minimo=index['minimo'], maximo=index['maximo'], muestra=index['muestra'],
+             checksum=index['checksum'])
+    indexFile.close()
+    if(os.name == 'nt' and os.path.exists(indexRoute)):
+        os.remove(indexRoute)
+    os.rename(temporal, indexRoute)
+
+# METODO: se obtiene el índice de límites de una tabla de entradas. Se mantiene en memoria; si la tabla cambió solo se
+# leen las filas agregadas desde la última vez y se actualiza el archivo auxiliar. Si la tabla se reescribió el índice se
+# construye de nuevo. Una última fila sin salto de línea se agrega solo al índice en memoria: el índice guardado llega
+# hasta la última línea completa y la fila se vuelve a leer cuando la tabla cambie. Si el archivo auxiliar no se puede
+# escribir (por ejemplo la carpeta es de solo lectura) se sigue con el índice en memoria.
+# PARAMETROS DE ENTRADA:
+# - route(String): ruta de la tabla de entradas
+# PARAMETROS DE SALIDA:
+# - index(Dict): índice con columnas, filas, mínimos, máximos y muestra de filas
+def getIndex(route):
+    stat = os.stat(route)
+    signature = (stat.st_mtime, stat.st_size)
+    current, loadedSignature, index = _loadedIndexes.get(route, (None, None, None))
+    if(signature == loadedSignature):
+        return current
+
+    with _lock:
+        current, loadedSignature, index = _loadedIndexes.get(route, (None, None, None))
+        if(signature == loadedSignature):
+            return current
+        tableFile = open(route, 'rb')
+        try:
+            if(index is None or getChecksum(tableFile, index['posicion']) != index['checksum']):
+                index = loadIndex(route, tableFile)
+            if index is None:
+                index = createIndex(tableFile)
+            else:
+                # Se actualiza una copia, las consultas en curso siguen usando el índice anterior
+                index = copyIndex(index)
+            position = index['posicion']
+            pending = readNewRows(index, tableFile)
+        finally:
+            tableFile.close()
+        if(index['posicion'] != position or not os.path.exists(getIndexRoute(route))):
+            try:
+                saveIndex(route, index)
+            except (IOError, OSError):
+                pass
+        current = index
+        if pending.strip():
+            current = copyIndex(index)
+            addRows(current, parseRows(index, pending))
+        _loadedIndexes[route] = (current, signature, index)
+    return current
+
+# METODO: se obtienen los límites de un grupo de columnas de la tabla de entradas: mínimo y máximo, o los percentiles
+# pedidos para una caja de búsqueda más estrecha
+# PARAMETROS DE ENTRADA:
+# - route(String): ruta de la tabla de entradas
+# - names(List): nombres de las columnas
+# - percentiles(List): percentiles inferior y superior (0 a 100), o None para usar mínimo y máximo
+# PARAMETROS DE SALIDA:
+# - lb(Array): límites inferiores de las columnas
+# - ub(Array): límites superiores de las columnas
+def getBounds(route, names, percentiles=None):
+    index = getIndex(route)
+    positions = [index['columnas'].index(name) for name in names]
+    if percentiles is None:
+        return (index['minimo'][positions], index['maximo'][positions])
+    sample = index['muestra'][:,positions]
+    lb = np.nanpercentile(sample, percentiles[0], axis=0)
+    ub = np.nanpercentile(sample, percentiles[1], axis=0)
+    return (lb, ub)
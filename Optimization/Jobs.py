@@ -0,0 +1,460 @@
+# -*- coding: latin-1 -*-
+import os
+import time
+import uuid
+import signal
+import threading
+import multiprocessing
+import Queue
+from collections import OrderedDict
+from multiprocessing.managers import BaseManager
+from ServicesDisolution import Metrics
+from ServicesDisolution.Optimization import OptimizationExperiment
+from ServicesDisolution.Optimization import Swarm
+
+# Número de procesos que ejecutan trabajos de optimización, número máximo de trabajos en cola (si la cola está llena
+# se rechazan nuevos trabajos) y número máximo y tiempo de vida (segundos) de los trabajos terminados que se conservan.
+WORKERS = int(os.environ.get('SD_TRABAJOS_PROCESOS', multiprocessing.cpu_count()))
+QUEUE_SIZE = int(os.environ.get('SD_TRABAJOS_COLA', 20))
+RESULTS_SIZE = int(os.environ.get('SD_TRABAJOS_RESULTADOS', 1000))
+RESULTS_TTL = float(os.environ.get('SD_TRABAJOS_TTL', 3600))
+
+# Avance de los trabajos seguidos en vivo (ver streamJob): se reporta cada PROGRESS_EVERY iteraciones y, si pasan
+# HEARTBEAT segundos sin reportar nada, se reporta el estado actual. Solo escribiendo se sabe si el cliente se
+# desconectó, así un trabajo abandonado se cancela a lo sumo unos pocos HEARTBEAT después.
+PROGRESS_EVERY = int(os.environ.get('SD_TRABAJOS_AVANCE', 10))
+HEARTBEAT = float(os.environ.get('SD_TRABAJOS_LATIDO', 1))
+
+QUEUED = 'en_cola'
+RUNNING = 'ejecutando'
+FINISHED = 'terminado'
+CANCELLED = 'cancelado'
+FAILED = 'error'
+
+# Evento con las métricas que registró un trabajador al ejecutar un trabajo, se suman a las del proceso principal
+METRICS_EVENT = 'metricas'
+
+# Trabajos conocidos por el proceso principal: id -> estado del trabajo. Se mantienen en orden de creación para
+# eliminar primero los más antiguos.
+_jobs = OrderedDict()
+_tickets = {}
+# Tickets de los trabajos cancelados mientras estaban en cola. Se guardan aparte porque el trabajo puede eliminarse
+# (ver evictJobs) antes de que un trabajador lo tome y aun así hay que avisarle que no lo ejecute.
+_cancelledTickets = set()
+_lock = threading.Lock()
+# Se avisa a quienes esperan un cambio de un trabajo (ver waitJob)
+_changed = threading.Condition(_lock)
+# Con el servicio atendido por varios procesos los trabajos se guardan en un solo proceso de trabajos (ver
+# startService): 'direccion' es su dirección y 'almacen' la conexión del proceso del servicio con él.
+_state = {'iniciado': False, 'ticket': 0, 'direccion': None, 'almacen': None, 'servicio': None}
+_storeLock = threading.Lock()
+
+# EXCEPCION: la cola de trabajos está llena, el cliente debe intentar más tarde
+class QueueFull(Exception):
+    pass
+
+# METODO: ciclo de un proceso trabajador: toma trabajos de la cola, los ejecuta (ver runJob) y reporta su estado final
+# al proceso principal
+# PARAMETROS DE ENTRADA:
+# - index(Int): posición del trabajador
+# - tasks(Queue): cola de trabajos (ticket, solicitud)
+# - events(Queue): cola de eventos hacia el proceso principal (ticket, estado, datos)
+# - cancelTickets(Array): ticket a cancelar por trabajador
+# PARAMETROS DE SALIDA:
+# - Ninguno
+def workerLoop(index, tasks, events, cancelTickets):
+    # El proceso hereda el manejo de SIGTERM del proceso del servicio (ver Server.runWorker), stop lo termina con SIGTERM
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        ticket, fJSON = task
+        events.put((ticket, RUNNING, {'trabajador': index}))
+        try:
+            event = runJob(index, ticket, fJSON, events, cancelTickets)
+        except Exception as e:
+            event = (ticket, FAILED, {'error': str(e)})
+        # Las métricas van antes del estado final, así al terminar el trabajo ya se reportan
+        events.put((ticket, METRICS_EVENT, Metrics.popSnapshot()))
+        events.put(event)
+
+# METODO: se ejecuta la optimización de un trabajo y se reporta su avance al proceso principal. Con varios inicios
+# ('inicios') se ejecutan uno tras otro y el resultado es el mismo de OptimizationExperiment.makeOptimization; el avance
+# suma las iteraciones y evaluaciones de todos los inicios y reporta el mejor F2 entre ellos. El trabajo se cancela
+# cuando el proceso principal escribe su ticket en la posición del trabajador.
+# PARAMETROS DE ENTRADA:
+# - index(Int): posición del trabajador
+# - ticket(Int): ticket del trabajo
+# - fJSON(JSON): solicitud de optimización
+# - events(Queue): cola de eventos hacia el proceso principal
+# - cancelTickets(Array): ticket a cancelar por trabajador
+# PARAMETROS DE SALIDA:
+# - event(Tuple): evento con el estado final del trabajo (terminado o cancelado)
+def runJob(index, ticket, fJSON, events, cancelTickets):
+    starts = [fJSON]
+    if('inicios' in fJSON):
+        starts = OptimizationExperiment.getStarts(fJSON)
+    # Avance de los inicios ya terminados y último avance reportado
+    done = {'iteraciones': 0, 'evaluaciones': 0}
+    last = {'mejorF2': None, 'mejoresVariables': None}
+    names = []
+
+    def callback(it, g, fg, evaluations):
+        if(fg != Swarm.NOT_FEASIBLE and (last['mejorF2'] is None or -float(fg) > last['mejorF2'])):
+            last['mejorF2'] = -float(fg)
+            last['mejoresVariables'] = dict(zip(names, [float(value) for value in g]))
+        events.put((ticket, RUNNING, {'iteraciones': done['iteraciones']+it,
+                                      'evaluaciones': done['evaluaciones']+evaluations,
+                                      'mejorF2': last['mejorF2'], 'mejoresVariables': last['mejoresVariables']}))
+        if(cancelTickets[index] == ticket):
+            return CANCELLED
+
+    results = []
+    for start in starts:
+        optimizer = OptimizationExperiment.Optimizer(start)
+        names[:] = optimizer.variables.variables
+        data = optimizer.run(callback)
+        if(optimizer.info['razon'] == CANCELLED):
+            return (ticket, CANCELLED, None)
+        done['iteraciones'] += optimizer.info['iteraciones']
+        done['evaluaciones'] += optimizer.info['evaluaciones']
+        results.append((data, None if optimizer.fopt == Swarm.NOT_FEASIBLE else -float(optimizer.fopt)))
+
+    if('inicios' in fJSON):
+        data = OptimizationExperiment.combineStarts(results)
+        return (ticket, FINISHED, {'resultado': data, 'evaluaciones': data['evaluaciones']})
+    return (ticket, FINISHED, {'resultado': results[0][0], 'evaluaciones': done['evaluaciones']})
+
+# METODO: ciclo del hilo del proceso principal que recibe los eventos de los trabajadores y actualiza los trabajos
+# PARAMETROS DE ENTRADA:
+# - events(Queue): cola de eventos de los trabajadores
+# - cancelTickets(Array): ticket a cancelar por trabajador
+# PARAMETROS DE SALIDA:
+# - Ninguno
+def collectorLoop(events, cancelTickets):
+    while True:
+        ticket, status, values = events.get()
+        if(status == METRICS_EVENT):
+            # En el proceso de trabajos nadie más escribe sus métricas (ver Metrics.flush)
+            Metrics.merge(values)
+            Metrics.flush(True)
+            continue
+        with _lock:
+            job = _jobs.get(_tickets.get(ticket))
+            if(status != RUNNING):
+                _tickets.pop(ticket, None)
+            if(ticket in _cancelledTickets):
+                # El trabajo se canceló mientras estaba en cola, se avisa al trabajador que lo tomó
+                if(status == RUNNING and values and 'trabajador' in values):
+                    cancelTickets[values['trabajador']] = ticket
+                elif(status != RUNNING):
+                    _cancelledTickets.discard(ticket)
+            if job is None:
+                continue
+            job['actualizado'] = time.time()
+            if(job['estado'] == CANCELLED):
+                continue
+            job['estado'] = status
+            if values:
+                job.update(values)
+            notifyChange(job)
+
+# METODO: se registra un cambio del estado de un trabajo y se avisa a quienes lo esperan (ver waitJob). Se debe llamar
+# con el candado tomado.
+# PARAMETROS DE ENTRADA:
+# - job(Dict): estado del trabajo
+# PARAMETROS DE SALIDA:
+# - Ninguno
+def notifyChange(job):
+    job['cambios'] += 1
+    _changed.notify_all()
+
+# METODO: se inician los procesos trabajadores y el hilo que recibe sus eventos, la primera vez que se usan
+# PARAMETROS DE ENTRADA:
+# - Ninguno
+# PARAMETROS DE SALIDA:
+# - Ninguno
+def start():
+    with _lock:
+        if _state['iniciado']:
+            return
+        _state['tareas'] = multiprocessing.Queue(QUEUE_SIZE)
+        events = multiprocessing.Queue()
+        cancelTickets = multiprocessing.Array('l', WORKERS, lock=False)
+        _state['cancelar'] = cancelTickets
+        _state['trabajadores'] = []
+        for index in range(WORKERS):
+            worker = multiprocessing.Process(target=workerLoop, args=(index, _state['tareas'], events, cancelTickets))
+            worker.daemon = True
+            worker.start()
+            _state['trabajadores'].append(worker)
+        collector = threading.Thread(target=collectorLoop, args=(events, cancelTickets))
+        collector.daemon = True
+        collector.start()
+        _state['iniciado'] = True
+
+# METODO: se terminan los procesos trabajadores, si se iniciaron. Los trabajos en cola o en ejecución se pierden.
+# PARAMETROS DE ENTRADA:
+# - Ninguno
+# PARAMETROS DE SALIDA:
+# - Ninguno
+def stop():
+    with _lock:
+        if not _state['iniciado']:
+            return
+        for worker in _state['trabajadores']:
+            worker.terminate()
+        for worker in _state['trabajadores']:
+            worker.join()
+        _state['iniciado'] = False
+
+# METODO: se eliminan los trabajos terminados cuyo tiempo de vida venció y, si se supera el máximo de trabajos, los
+# terminados más antiguos. Se debe llamar con el candado tomado.
+# PARAMETROS DE ENTRADA:
+# - Ninguno
+# PARAMETROS DE SALIDA:
+# - Ninguno
+def evictJobs():
+    now = time.time()
+    finished = [jobId for jobId in _jobs if _jobs[jobId]['estado'] not in (QUEUED, RUNNING)]
+    excess = len(_jobs)-RESULTS_SIZE
+    for jobId in finished:
+        if(excess > 0 or now-_jobs[jobId]['actualizado'] > RESULTS_TTL):
+            del _jobs[jobId]
+            excess -= 1
+
+# METODO: se agrega una solicitud de optimización a la cola de trabajos
+# PARAMETROS DE ENTRADA:
+# - fJSON(JSON): solicitud de optimización (ver OptimizationExperiment.makeOptimization)
+# PARAMETROS DE SALIDA:
+# - jobId(String): identificador del trabajo
+def submitJob(fJSON):
+    if(_state['direccion'] is not None):
+        return callStore('submitJob', fJSON)
+    start()
+    with _lock:
+        evictJobs()
+        _state['ticket'] += 1
+        ticket = _state['ticket']
+        jobId = uuid.uuid4().hex
+        try:
+            _state['tareas'].put_nowait((ticket, fJSON))
+        except Queue.Full:
+            raise QueueFull('La cola de optimizaciones esta llena')
+        now = time.time()
+        _jobs[jobId] = {'id': jobId, 'estado': QUEUED, 'creado': now, 'actualizado': now, 'mejorF2': None,
+                        'mejoresVariables': None, 'evaluaciones': 0, 'iteraciones': 0, 'ticket': ticket,
+                        'cambios': 0}
+        _tickets[ticket] = jobId
+    return jobId
+
+# METODO: se obtiene la copia pública del estado de un trabajo, sin los datos internos de la cola
+# PARAMETROS DE ENTRADA:
+# - job(Dict): estado del trabajo
+# PARAMETROS DE SALIDA:
+# - job(Dict): copia del estado del trabajo
+def publicJob(job):
+    job = dict(job)
+    job.pop('ticket', None)
+    job.pop('trabajador', None)
+    job.pop('cambios', None)
+    return job
+
+# METODO: se obtiene el estado de un trabajo: estado, mejor F2 parcial, evaluaciones y, al terminar, su resultado
+# PARAMETROS DE ENTRADA:
+# - jobId(String): identificador del trabajo
+# PARAMETROS DE SALIDA:
+# - job(Dict): copia del estado del trabajo, o None si no existe o ya fue eliminado
+def getJob(jobId):
+    if(_state['direccion'] is not None):
+        return callStore('getJob', jobId)
+    with _lock:
+        evictJobs()
+        job = _jobs.get(jobId)
+        return publicJob(job) if job is not None else None
+
+# METODO: se espera a que cambie el estado de un trabajo, a lo sumo timeout segundos
+# PARAMETROS DE ENTRADA:
+# - jobId(String): identificador del trabajo
+# - changes(Int): número de cambios del trabajo ya conocido, o None para obtener su estado sin esperar
+# - timeout(Float): segundos de espera
+# PARAMETROS DE SALIDA:
+# - job(Dict): copia del estado del trabajo (cambiado o no), o None si no existe o ya fue eliminado
+# - changes(Int): número de cambios del trabajo
+def waitJob(jobId, changes, timeout):
+    if(_state['direccion'] is not None):
+        return callStore('waitJob', jobId, changes, timeout)
+    deadline = time.time()+timeout
+    with _lock:
+        job = _jobs.get(jobId)
+        while(job is not None and job['cambios'] == changes and time.time() < deadline):
+            _changed.wait(deadline-time.time())
+            job = _jobs.get(jobId)
+        if job is None:
+            return (None, changes)
+        return (publicJob(job), job['cambios'])
+
+# METODO: se cancela un trabajo en cola o en ejecución. Un trabajo en ejecución se detiene al final de su iteración.
+# PARAMETROS DE ENTRADA:
+# - jobId(String): identificador del trabajo
+# PARAMETROS DE SALIDA:
+# - job(Dict): copia del estado del trabajo, o None si no existe
+def cancelJob(jobId):
+    if(_state['direccion'] is not None):
+        return callStore('cancelJob', jobId)
+    with _lock:
+        job = _jobs.get(jobId)
+        if job is None:
+            return None
+        if(job['estado'] in (QUEUED, RUNNING)):
+            # Si ya está ejecutándose se avisa a su trabajador, si no se avisará cuando un trabajador lo tome
+            if(job['estado'] == RUNNING and 'trabajador' in job):
+                _state['cancelar'][job['trabajador']] = job['ticket']
+            elif(job['estado'] == QUEUED):
+                _cancelledTickets.add(job['ticket'])
+            job['estado'] = CANCELLED
+            job['actualizado'] = time.time()
+            notifyChange(job)
+        return publicJob(job)
+
+# METODO: se obtiene el evento de avance de un trabajo seguido en vivo. Al terminar el evento tiene el mismo mensaje que
+# OptimizationExperiment.makeOptimization ('optimizado' o 'no_optimizado', variables, razón y evaluaciones).
+# PARAMETROS DE ENTRADA:
+# - job(Dict): copia del estado del trabajo
+# PARAMETROS DE SALIDA:
+# - event(Dict): evento con el identificador ('id') y el estado ('estado') del trabajo
+def getStreamEvent(job):
+    if(job['estado'] == FINISHED):
+        event = dict(job['resultado'])
+    elif(job['estado'] == FAILED):
+        event = {'error': job.get('error')}
+    elif(job['estado'] == CANCELLED):
+        event = {}
+    else:
+        event = dict((key, job[key]) for key in ('iteraciones', 'evaluaciones', 'mejorF2', 'mejoresVariables'))
+    event['id'] = job['id']
+    event['estado'] = job['estado']
+    return event
+
+# METODO: se sigue en vivo un trabajo: se reporta su estado al inicio, cada PROGRESS_EVERY iteraciones (o antes si pasan
+# HEARTBEAT segundos sin reportar) y al terminar. Si quien lo sigue deja de leer antes de que termine (el cliente se
+# desconectó y el servidor cierra la respuesta) el trabajo se cancela.
+# PARAMETROS DE ENTRADA:
+# - jobId(String): identificador del trabajo
+# - every(Int): iteraciones entre reportes de avance
+# PARAMETROS DE SALIDA:
+# - events(Generator): eventos del trabajo (ver getStreamEvent), el último con el estado final
+def streamJob(jobId, every=PROGRESS_EVERY):
+    finished = False
+    try:
+        job, changes = waitJob(jobId, None, 0)
+        if job is None:
+            return
+        yield getStreamEvent(job)
+        reported = time.time()
+        iterations = 0
+        while True:
+            job, changes = waitJob(jobId, changes, HEARTBEAT)
+            if job is None:
+                return
+            if(job['estado'] not in (QUEUED, RUNNING)):
+                finished = True
+                yield getStreamEvent(job)
+                return
+            if(job['iteraciones'] >= iterations+every or time.time()-reported >= HEARTBEAT):
+                if(job['iteraciones'] >= iterations+every):
+                    iterations = job['iteraciones']
+                reported = time.time()
+                yield getStreamEvent(job)
+    finally:
+        if not finished:
+            cancelJob(jobId)
+
+# Clase con las operaciones que los procesos del servicio ejecutan en el proceso de trabajos (ver startService)
+class JobStore(object):
+
+    def submitJob(self, fJSON):
+        return submitJob(fJSON)
+
+    def getJob(self, jobId):
+        return getJob(jobId)
+
+    def waitJob(self, jobId, changes, timeout):
+        return waitJob(jobId, changes, timeout)
+
+    def cancelJob(self, jobId):
+        return cancelJob(jobId)
+
+# Clase del proceso de trabajos y de la conexión de los procesos del servicio con él
+class JobsManager(BaseManager):
+    pass
+
+JobsManager.register('Trabajos', JobStore)
+
+# METODO: se prepara el proceso de trabajos al crearse: sus trabajos son los locales, el proceso principal del servicio
+# decide cuándo termina y los trabajadores se crean antes de que el proceso atienda conexiones en otros hilos
+# PARAMETROS DE ENTRADA:
+# - Ninguno
+# PARAMETROS DE SALIDA:
+# - Ninguno
+def initService():
+    _state['direccion'] = None
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+    start()
+
+# METODO: se crea el proceso de trabajos. Con varios procesos del servicio (ver Server.serve) los trabajos se guardan y
+# se ejecutan en este proceso, así cualquier proceso del servicio puede consultar o cancelar un trabajo creado en otro.
+# Los procesos del servicio que se crean después se conectan a él en la dirección dada. Si ya había uno (terminó
+# inesperadamente) se reemplaza y sus trabajos se pierden.
+# PARAMETROS DE ENTRADA:
+# - address(String): ruta del socket del proceso de trabajos
+# PARAMETROS DE SALIDA:
+# - pid(Int): identificador del proceso de trabajos
+def startService(address):
+    stopService(False)
+    if os.path.exists(address):
+        os.remove(address)
+    manager = JobsManager(address)
+    manager.start(initService)
+    _state['servicio'] = manager
+    _state['direccion'] = address
+    return manager._process.pid
+
+# METODO: se termina el proceso de trabajos, si se creó. Los trabajos en cola o en ejecución se pierden.
+# PARAMETROS DE ENTRADA:
+# - alive(Bool): si es False el proceso ya terminó (el proceso principal lo recogió) y solo se descarta
+# PARAMETROS DE SALIDA:
+# - Ninguno
+def stopService(alive=True):
+    manager, _state['servicio'] = _state['servicio'], None
+    if manager is None:
+        return
+    if alive:
+        manager.shutdown()
+    else:
+        manager.shutdown.cancel()
+
+# METODO: en un proceso del servicio, se ejecuta una operación en el proceso de trabajos. La conexión se crea la primera
+# vez y, si falla (el proceso de trabajos se reemplazó), se vuelve a crear en la siguiente operación.
+# PARAMETROS DE ENTRADA:
+# - method(String): nombre de la operación (ver JobStore)
+# - args(Tuple): argumentos de la operación
+# PARAMETROS DE SALIDA:
+# - result(Object): resultado de la operación
+def callStore(method, *args):
+    with _storeLock:
+        if _state['almacen'] is None:
+            manager = JobsManager(_state['direccion'])
+            manager.connect()
+            _state['almacen'] = manager.Trabajos()
+        store = _state['almacen']
+    try:
+        return getattr(store, method)(*args)
+    except (EOFError, IOError):
+        with _storeLock:
+            if _state['almacen'] is store:
+                _state['almacen'] = None
+        raise
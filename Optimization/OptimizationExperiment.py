@@ -1,35 +1,72 @@
 # -*- coding: latin-1 -*-
-from pyswarm import pso
+import os
 import pandas as pd
 import numpy as np
 import json
-from ServicesDisolution.Retraining.Comparison import getModel
+import time
+from ServicesDisolution import Metrics
+from ServicesDisolution.Retraining.Comparison import getLoadedModel
 from ServicesDisolution.Retraining.Comparison import validateF2
 from ServicesDisolution.DataProcessing import Processing
+from ServicesDisolution.DataProcessing import ReferenceTables
+from ServicesDisolution.DataProcessing import FeatureStore
+from ServicesDisolution.DataProcessing import Schema
+from ServicesDisolution.Optimization import Swarm
+from ServicesDisolution.Optimization import BoundsIndex
+from ServicesDisolution.Simulation import PredictionCache
 
-# METODO: para las variables que se quieran optimizar se retornar los valores mximos y mnimos de cada una de ellas de
-# acuerdo a las entradas actualmente registradas
+INPUTS_FILE = '3_Entradas_Integracion.csv'
+
+# Fuente de los límites de las variables a optimizar: la tabla de entradas ('tabla') o el almacén de filas de entrada
+# ('almacen', ver FeatureStore)
+TABLE_SOURCE = 'tabla'
+STORE_SOURCE = 'almacen'
+BOUNDS_SOURCE = os.environ.get('SD_LIMITES_FUENTE', TABLE_SOURCE)
+
+# Modos de manejo de las restricciones: penalización (las partículas no factibles se descartan) o reparación (cada
+# partícula se proyecta a la región factible antes de evaluarla)
+PENALTY = 'penalizacion'
+REPAIR = 'reparacion'
+
+# Número máximo de veces que se reescalan los porcentajes al repararlos (los que quedan en su límite inferior se fijan y
+# se reescalan los demas)
+REPAIR_ROUNDS = 5
+
+# Número máximo de iteraciones y tamaño del enjambre del algoritmo de optimización
+MAX_ITER = 100
+SWARM_SIZE = 50
+
+# Razones de terminación de la política de parada: se alcanzó el F2 objetivo, el mejor F2 no mejoró en la ventana de
+# iteraciones, se agotaron las evaluaciones del modelo o se agotó el tiempo
+TARGET = 'objetivo'
+STAGNATION = 'estancamiento'
+EVALUATIONS = 'evaluaciones'
+DEADLINE = 'tiempo'
+
+# METODO: para las variables que se quieran optimizar se retornar los valores máximos y mínimos de cada una de ellas de
+# acuerdo a las entradas actualmente registradas. Los límites se toman del índice de la tabla de entradas (ver 
+# BoundsIndex), que solo lee las filas agregadas desde la última consulta, o del almacén de filas de entrada si
+# BOUNDS_SOURCE es STORE_SOURCE.
 # PARAMETROS DE ENTRADA:
 # - variables(List): lista de variables que se quieren optimizar
+# - percentiles(List): percentiles inferior y superior para una caja de búsqueda más estrecha, o None para usar los
+#   valores mínimos y máximos
 # PARAMETROS DE SALIDA:
-# - lb(List): lmites inferiores de las variables a optimizar
-# - ub(List): lmites superiores de las variables a optimizar
-def getBounds(variables):
-    #Se optiene la base de datos actual de entradas al simulador
-    inputs = pd.read_csv('C:/Users/ing-y-soft/Documents/Proyecto/Code/Integracion/tablas/3_Entradas_Integracion.csv')    
-    #inputs = pd.read_csv('C:\Users\ing-y-soft\Documents\Proyecto\Code\Integracion\tablas\3_Entradas_Integracion.csv')
-    
-    optimizables = inputs.loc[:,variables.iloc[:,0]]
-    lb = optimizables.min().values
-    ub = optimizables.max().values
-    return (lb,ub)
+# - lb(List): límites inferiores de las variables a optimizar
+# - ub(List): límites superiores de las variables a optimizar
+def getBounds(variables, percentiles=None):
+    if(BOUNDS_SOURCE == STORE_SOURCE):
+        return FeatureStore.getBounds(list(variables.iloc[:,0]),percentiles)
+    #Se optiene la base de datos actual de entradas al simulador, en la carpeta de tablas de referencia
+    route = ReferenceTables.getTableRoute(INPUTS_FILE)
+    return BoundsIndex.getBounds(route,list(variables.iloc[:,0]),percentiles)
 
-# METODO: de un perfil pasado como json, se obtiene los 3 valores de disolucin que se usarn como criterio
+# METODO: de un perfil pasado como json, se obtiene los 3 valores de disolución que se usarán como criterio
 # para optimizar, a saber, el primero, el inmediatamente por debajo de 85% y el inmediatamente por encima de 85%
 # PARAMETROS DE ENTRADA
 # - referenceProfile(json): perfil de referencia
 # PARAMETROS DE SALIDA
-# - profile(List): lista con los porcentajes de disolucin seleccionado
+# - profile(List): lista con los porcentajes de disolución seleccionado
 def getProfile(referenceProfile):
     i = 0
     while(referenceProfile[i]['media'] < 85):
@@ -38,13 +75,13 @@ def getProfile(referenceProfile):
     
     return(profile)
 
-# METODO: se retorna dos tablas, una con los nombres de los tipos de excipientes y los nombre de los tamaos de partculas
-# asociados a cada uno y otra con los nombres de tamaos de partculas y los nombres de tipos de excipientes asociados a cada
+# METODO: se retorna dos tablas, una con los nombres de los tipos de excipientes y los nombre de los tamaños de partículas
+# asociados a cada uno y otra con los nombres de tamaños de partículas y los nombres de tipos de excipientes asociados a cada
 # uno.
 # PARAMETROS DE ENTRADA:
 # PARAMETROS DE SALIDA:
-# - exciVar(DataFrame): nombres de tipo de excipientes junto con los nombres de tamao de partcula asociados.
-# - sizeVar(DataFrame): nombres de tamao de partculas junto con los nombres de tipo de excipientes asociados.
+# - exciVar(DataFrame): nombres de tipo de excipientes junto con los nombres de tamaño de partícula asociados.
+# - sizeVar(DataFrame): nombres de tamaño de partículas junto con los nombres de tipo de excipientes asociados.
 def getAssociates():
     var1 = [['aglutinantes','tamanoAglutinantes'],['desintegrantes','tamanoDesintegrantes'],
             ['deslizantes','tamanoDeslizantes'],['diluyentes','tamanoDiluyentes'],['lubricantes','tamanoLubricantes'],
@@ -54,13 +91,13 @@ def getAssociates():
             ['tamanoDeslizantes','deslizantes'],['tamanoDiluyentes','diluyente'],['tamanoLubricantes','lubricantes'],
             ['tamanoOtros','otros'],['tamanoSurfactantes','surfactantes']]
     
-    # Se crea una tabla en donde para cada tipo de excipiente se tiene asociado un tamao de partcula y viceversa
+    # Se crea una tabla en donde para cada tipo de excipiente se tiene asociado un tamaño de partícula y viceversa
     exciVar = pd.DataFrame(var1,columns=['variables','associates'])
     sizeVar = pd.DataFrame(var2,columns=['variables','associates'])
     
     return(exciVar,sizeVar)
 
-# METODO: de un grupo de variables a optimizar se eliminan aquellas relacionadas con porcentajes y tamaos de partculas
+# METODO: de un grupo de variables a optimizar se eliminan aquellas relacionadas con porcentajes y tamaños de partículas
 # que no tienen una variable asociada en el grupo y que en el experimento su variable asociada es cero
 # PARAMETROS DE ENTRADA:
 # - variables(DataFrame): tabla de variables a optimizar
@@ -73,12 +110,12 @@ def eliminateVariables(variables, experiment):
     
     exciVar,sizeVar = getAssociates()
     
-    # Se determinan los tipos de excipientes y tamaos de partculas presentes es la formulacin
+    # Se determinan los tipos de excipientes y tamaños de partículas presentes es la formulación
     exciPresents = pd.merge(variables,exciVar,on='variables')
     sizePresents = pd.merge(variables,sizeVar,on='variables')
     
-    # De los tipos de excipientes a optimizar, se determina cules no tienen un tamao de partcula asociado en el grupo. Lo
-    # mismo para los tipos de tamao de partcula.
+    # De los tipos de excipientes a optimizar, se determina cuáles no tienen un tamaño de partícula asociado en el grupo. Lo
+    # mismo para los tipos de tamaño de partícula.
     exciNoAs = exciPresents[~exciPresents.associates.isin(sizePresents.variables)]
     sizeNoAs = sizePresents[~sizePresents.associates.isin(exciPresents.variables)]
     
@@ -93,25 +130,25 @@ def eliminateVariables(variables, experiment):
     
     return variables
 
-# METODO: de un grupo de variables a optimizar, se retorna una tabla con los nombres de tipos de excipientes y tamaos de 
-# partcula que estan asociados.
+# METODO: de un grupo de variables a optimizar, se retorna una tabla con los nombres de tipos de excipientes y tamaños de 
+# partícula que estan asociados.
 # PARAMETROS DE ENTRADA:
 # - variables(DataFrame): tabla de variables a optimizar
 # PARAMETROS DE SALIDA:
-# - associatesVar(DataFrame): tabla de nombres de tipo de excipientes junto con los nombres de tamao de partcula asociados.
+# - associatesVar(DataFrame): tabla de nombres de tipo de excipientes junto con los nombres de tamaño de partícula asociados.
 def getAssociatesInVariables(variables):
     exciVar,sizeVar = getAssociates()    
     exciPresents = pd.merge(variables,exciVar,on='variables')
     associatesVariables = exciPresents[exciPresents.associates.isin(variables.variables)]
     return(associatesVariables)
 
-# METODO: de las variables relacionadas con porcentajes de una formulacin, se retorna el nombre de las que estan en las
+# METODO: de las variables relacionadas con porcentajes de una formulación, se retorna el nombre de las que estan en las
 # variables a optimizar y las que no.
 # PARAMETROS DE ENTRADA:
 # - variables(DataFrame): tabla de variables a optimizar
 # PARAMETROS DE SALIDA:
-# - inOpt(DataFrame): tabla con los nombres de variables relacionadas con porcentajes que si estan en el grupo de optimizacin
-# - outOpt(DataFrame): tabla con los nombres de variables relacionadas con porcentajes que no estan en el grupo de optimizacin
+# - inOpt(DataFrame): tabla con los nombres de variables relacionadas con porcentajes que si estan en el grupo de optimización
+# - outOpt(DataFrame): tabla con los nombres de variables relacionadas con porcentajes que no estan en el grupo de optimización
 def getInOut(variables):
     namePercentages = ['porcentajePA','aglutinantes','desintegrantes','deslizantes','diluyentes','lubricantes','otros','surfactantes']
     namePercentages = pd.DataFrame(namePercentages,columns=['variables'])
@@ -120,116 +157,324 @@ def getInOut(variables):
     outOpt = namePercentages[~namePercentages.variables.isin(variables.variables)]
     return(inOpt,outOpt)
 
-# METODO: a partir de un nuevo arreglo sugerido por el algoritmo de optimizacin, se verifica consistencia entre los 
-# valores correspondientes para tipos de excipientes y tamaos de partcula, es decir, su alguno de ellos es cero, su valor
+# METODO: se compila una sola vez, para una solicitud de optimización, el grupo de variables a optimizar en arreglos de
+# posiciones, para que la consistencia y las restricciones se evalúen con operaciones de NumPy sobre todo el enjambre.
+# PARAMETROS DE ENTRADA:
+# - variables(DataFrame): tabla de variables a optimizar
+# - experiment(DataFrame): experimento organizado según la estructura de entrada del simulador
+# PARAMETROS DE SALIDA:
+# - compiled(Dict): posiciones compiladas
+#   - columnas(Array): posición de cada variable a optimizar en la fila del experimento
+#   - excipientes(Array), tamanos(Array): posiciones en el arreglo de variables de cada tipo de excipiente y de su
+#     tamaño de partícula asociado
+#   - enOptimizacion(Array): posiciones en el arreglo de variables de los porcentajes que se optimizan
+#   - sumaFija(Float): suma de los porcentajes del experimento que no se optimizan
+#   - mezcla(Array): posiciones de tiempoMezcladoGranulado y tiempoMezclaTotalFormula, o None si no se optimizan ambos
+def compileVariables(variables, experiment):
+    names = list(variables.variables)
+    associatesVariables = getAssociatesInVariables(variables)
+    inOpt,outOpt = getInOut(variables)
+    
+    compiled = {}
+    compiled['columnas'] = experiment.columns.get_indexer(names)
+    compiled['excipientes'] = np.array([names.index(name) for name in associatesVariables.iloc[:,0]],dtype=int)
+    compiled['tamanos'] = np.array([names.index(name) for name in associatesVariables.iloc[:,1]],dtype=int)
+    compiled['enOptimizacion'] = np.array([names.index(name) for name in inOpt.variables],dtype=int)
+    compiled['sumaFija'] = experiment.loc[:,outOpt.variables].values.sum()
+    compiled['mezcla'] = None
+    if('tiempoMezcladoGranulado' in names and 'tiempoMezclaTotalFormula' in names):
+        compiled['mezcla'] = np.array([names.index('tiempoMezcladoGranulado'),names.index('tiempoMezclaTotalFormula')])
+    return compiled
+
+# METODO: a partir de los nuevos arreglos sugeridos por el algoritmo de optimización, se verifica consistencia entre los 
+# valores correspondientes para tipos de excipientes y tamaños de partícula, es decir, su alguno de ellos es cero, su valor
 # asociado debe ser cero.
 # PARAMETROS DE ENTRADA
-# - variables_x(DataFrame): arreglo de valores determinado por el algoritmo de optimizacin asociados a los nombres de las 
-#   variables a optimizar.
-# - associatesVariables(DataFrame): nombres de tipos de excipientes junto con sus correspondientes nombre de tamao de 
-#   partcula asociados.
-def ensureConsistency(variables_x,associatesVariables):
-    for i in range(len(associatesVariables)):
-        iExci = variables_x.loc[variables_x.variables == associatesVariables.iloc[i,0]]
-        iSize = variables_x.loc[variables_x.variables == associatesVariables.iloc[i,1]]
-        if(iExci.iloc[0,1] == 0 or iSize.iloc[0,1] == 0):
-            variables_x.ix[iExci.index,1] = 0
-            variables_x.ix[iSize.index,1] = 0
-            
-    return variables_x
-
-# METODO: restricciones que sern aplicadas para un nuevo conjunto de valores determinado por el algoritmo de optimizacin
+# - X(Array): matriz de valores determinados por el algoritmo de optimización, una partícula por fila, o un solo
+#   arreglo de valores
+# - compiled(Dict): posiciones compiladas de las variables a optimizar (ver compileVariables)
+# PARAMETROS DE SALIDA
+# - X(Array): copia de los valores con la consistencia verificada
+def ensureConsistency(X, compiled):
+    X = np.array(X,dtype=float)
+    swarm = np.atleast_2d(X)
+    exci = compiled['excipientes']
+    size = compiled['tamanos']
+    zero = (swarm[:,exci] == 0) | (swarm[:,size] == 0)
+    swarm[:,exci] = np.where(zero,0,swarm[:,exci])
+    swarm[:,size] = np.where(zero,0,swarm[:,size])
+    return X
+
+# METODO: operador de reparación: se proyecta cada partícula a la región factible. Se verifica la consistencia entre
+# excipientes y tamaños de partícula, se reescalan los porcentajes que se optimizan para que junto con los porcentajes
+# fijos del experimento no superen 100 (respetando sus límites inferiores) y se corrige el orden de los tiempos de mezcla.
 # PARAMETROS DE ENTRADA
-# - x(Array): lista de nuevos valores determinados por el algoritmo de optimizacin
+# - X(Array): matriz de valores determinados por el algoritmo de optimización, una partícula por fila
+# - compiled(Dict): posiciones compiladas de las variables a optimizar (ver compileVariables)
+# - lb(Array): límites inferiores de las variables a optimizar
+# - ub(Array): límites superiores de las variables a optimizar
 # PARAMETROS DE SALIDA
-# - costrain(List): lista de restricciones aplicadas al conjunto de nuevos valores
-def constrains(x):
-    # globals: variables, inOpt, outOpt, experiment, mixConstrain
-    xDF = pd.DataFrame(x,columns=['values'])
-    variables_x = pd.concat([variables,xDF],axis=1)
-    variables_x = ensureConsistency(variables_x,associatesVariables)
+# - X(Array): copia de las partículas reparadas
+def repairSwarm(X, compiled, lb, ub):
+    X = ensureConsistency(X,compiled)
     
-    sumOutOpt = experiment.loc[:,outOpt.variables].sum(axis=1)
-    #print(variables_x.loc[variables_x.variables.isin(inOpt.variables)])
-    sumInOpt = variables_x.loc[variables_x.variables.isin(inOpt.variables)].iloc[:,1].sum()
-    sumPerc = sumOutOpt+sumInOpt
-    if mixConstrain:
-        tMin = variables_x.loc[variables_x.variables == 'tiempoMezcladoGranulado'].iloc[0,1]
-        tMax = variables_x.loc[variables_x.variables == 'tiempoMezclaTotalFormula'].iloc[0,1]
-        constrain = [100-sumPerc[0],tMax-tMin]
-    else:
-        constrain = [100-sumPerc[0]]
+    percentages = compiled['enOptimizacion']
+    if(len(percentages) > 0):
+        available = 100-compiled['sumaFija']
+        values = X[:,percentages]
+        lower = np.broadcast_to(lb[percentages],values.shape)
+        fixed = np.zeros(values.shape,dtype=bool)
+        for i in range(REPAIR_ROUNDS):
+            excess = values.sum(axis=1) > available
+            if(not excess.any()):
+                break
+            # Solo se reescalan los porcentajes que no han llegado a su límite inferior
+            free = np.where(fixed,0,values)
+            target = available-np.where(fixed,values,0).sum(axis=1)
+            freeSum = free.sum(axis=1)
+            scale = np.where(excess & (freeSum > 0),np.clip(target,0,None)/np.where(freeSum > 0,freeSum,1),1)
+            values = np.where(fixed,values,free*scale[:,np.newaxis])
+            below = (values < lower) & ~fixed
+            values = np.where(below,lower,values)
+            fixed = fixed | below
+        X[:,percentages] = values
     
-    return constrain
+    mix = compiled['mezcla']
+    if mix is not None:
+        # El tiempo de mezcla total no puede ser menor que el de mezclado del granulado
+        wrong = X[:,mix[1]] < X[:,mix[0]]
+        X[wrong,mix[1]] = np.minimum(X[wrong,mix[0]],ub[mix[1]])
+        X[wrong,mix[0]] = np.minimum(X[wrong,mix[0]],X[wrong,mix[1]])
+    
+    return X
+
+# METODO: se construye la función que aplica la política de parada de una solicitud al final de cada iteración del
+# algoritmo de optimización (ver Swarm.pso). Primero se llama a la función de la sesión (por ejemplo la cancelación de
+# un trabajo) y luego se revisan los criterios de la política.
+# PARAMETROS DE ENTRADA:
+# - policy(Dict): política de parada ya validada, con sus criterios convertidos a números (ver Schema.decodeStopping);
+#   todos los criterios son opcionales:
+#   - 'f2Objetivo'(Float): se termina cuando el mejor F2 lo alcanza
+#   - 'ventana'(Int) y 'tolerancia'(Float): se termina cuando el mejor F2 no mejoró más que la tolerancia (por defecto
+#     0) en las últimas 'ventana' iteraciones
+#   - 'maxEvaluaciones'(Int): se termina antes de una iteración que superaría ese número de evaluaciones del modelo
+#   - 'tiempoMaximo'(Float): segundos; se termina cuando la siguiente iteración, estimada con la duración de la
+#     anterior, terminaría después de ese tiempo
+# - swarmsize(Int): número de partículas, evaluaciones del modelo por iteración
+# - callback(Function): función de la sesión que se llama en cada iteración, o None
+# PARAMETROS DE SALIDA:
+# - stoppingCallback(Function): función para el parámetro callback de Swarm.pso
+def getStoppingCallback(policy, swarmsize, callback=None):
+    target = policy.get('f2Objetivo')
+    window = policy.get('ventana')
+    tolerance = policy.get('tolerancia') or 0
+    maxEvaluations = policy.get('maxEvaluaciones')
+    deadline = policy.get('tiempoMaximo')
+    start = time.time()
+    state = {'historia': [], 'ultimo': start}
+
+    def stoppingCallback(it, g, fg, evaluations):
+        if callback is not None:
+            reason = callback(it,g,fg,evaluations)
+            if reason:
+                return reason
+
+        # La función objetivo es -F2
+        history = state['historia']
+        bestF2 = None if fg == Swarm.NOT_FEASIBLE else -float(fg)
+        history.append(bestF2)
+        if(target is not None and bestF2 is not None and bestF2 >= target):
+            return TARGET
+        if(window is not None and len(history) > window and history[-window-1] is not None
+           and bestF2-history[-window-1] <= tolerance):
+            return STAGNATION
+        if(maxEvaluations is not None and evaluations+swarmsize > maxEvaluations):
+            return EVALUATIONS
+        if deadline is not None:
+            now = time.time()
+            if(now+(now-state['ultimo']) > start+deadline):
+                return DEADLINE
+            state['ultimo'] = now
+
+    return stoppingCallback
+
+# CLASE: sesión de optimización para una solicitud. Contiene todo su estado (experimento, modelo, perfil de referencia y
+# variables compiladas), así varias optimizaciones pueden correr al mismo tiempo sin interferir entre ellas. El
+# experimento organizado no se modifica durante la optimización.
+class Optimizer(object):
+
+    # METODO: se prepara la sesión de optimización a partir de la solicitud
+    # PARAMETROS DE ENTRADA
+    # - fJSON(JSON): solicitud de optimización con el experimento ('experimento'), el perfil de referencia ('perfil'),
+    #   las variables a optimizar ('variables') y opcionalmente la semilla del algoritmo ('semilla') y los percentiles
+    #   de la tabla de entradas que limitan la búsqueda ('percentiles', por ejemplo [5,95]) y el manejo de las
+    #   restricciones ('modo': 'penalizacion' o 'reparacion', por defecto 'penalizacion') y la política de parada
+    #   ('parada', ver getStoppingCallback)
+    # - model(Model): modelo con el que se hacen las predicciones, por defecto el actual modelo del sistema
+    # - version(String): versión del modelo, para usar la caché de predicciones (sin versión no se usa la caché)
+    def __init__(self, fJSON, model=None, version=None):
+        # Se valida la solicitud antes de cargar el modelo (Schema.SchemaError si no es válida); el experimento ya
+        # decodificado (por ejemplo en el servicio) no se vuelve a recorrer
+        fJSON = Schema.decodeOptimization(fJSON)
+        if model is None:
+            model,version = getLoadedModel()
+        self.model = model
+        self.version = version
+        experimentJSON = fJSON['experimento']
+        self.experiment = Processing.organizeExperiment(experimentJSON)
+        self.seed = fJSON.get('semilla')
+        self.percentiles = fJSON.get('percentiles')
+        self.mode = fJSON.get('modo') or PENALTY
+        self.policy = fJSON.get('parada') or {}
+        
+        self.profileReference = getProfile(fJSON['perfil'])
+        self.firstF2 = validateF2([self.profileReference],[getProfile(experimentJSON['tiempos'])])
+        
+        variables = pd.DataFrame(fJSON['variables'],columns=['variables'])
+        variables = eliminateVariables(variables,self.experiment)
+        variables.reset_index(drop=True,inplace=True)
+        self.variables = variables
+        self.compiled = compileVariables(variables,self.experiment)
+        self.row = self.experiment.values
 
-# METODO: funcin que utilizara el algoritmo de optimizcin para maximizar el valor de F2
+    # METODO: restricciones que serán aplicadas a todas las partículas del enjambre determinadas por el algoritmo de 
+    # optimización: la suma de porcentajes no debe superar 100 y, si se optimizan ambos tiempos de mezcla, el tiempo de
+    # mezcla total no debe ser menor al de mezclado del granulado.
+    # PARAMETROS DE ENTRADA
+    # - X(Array): matriz de nuevos valores determinados por el algoritmo de optimización, una partícula por fila
+    # PARAMETROS DE SALIDA
+    # - costrains(Array): matriz de restricciones aplicadas, una fila por partícula
+    def constrains(self, X):
+        start = time.time()
+        X = ensureConsistency(X,self.compiled)
+        
+        sumPerc = self.compiled['sumaFija']+X[:,self.compiled['enOptimizacion']].sum(axis=1)
+        constrain = [100-sumPerc]
+        mix = self.compiled['mezcla']
+        if mix is not None:
+            constrain.append(X[:,mix[1]]-X[:,mix[0]])
+        
+        constrain = np.column_stack(constrain)
+        Metrics.observeStage('restricciones',start)
+        return constrain
+
+    # METODO: función que utilizara el algoritmo de optimizción para maximizar el valor de F2. Se evalúa todo el 
+    # enjambre con un solo llamado a predict y, como el algoritmo minimiza, se retorna -F2.
+    # PARAMETROS DE ENTRADA
+    # - X(Array): matriz de nuevos valores determinados por el algoritmo de optimización, una partícula por fila
+    # PARAMETROS DE SALIDA
+    # - f2(Array): valores de F2 predichos, con signo negativo, a partir de los nuevos valores de cada partícula
+    def function(self, X):
+        start = time.time()
+        X = ensureConsistency(X,self.compiled)
+        
+        # Cada partícula es una copia de la fila del experimento con los nuevos valores
+        xExperiment = np.repeat(self.row,len(X),axis=0)
+        xExperiment[:,self.compiled['columnas']] = X
+        # Las partículas que quedan en los límites suelen repetir puntos ya evaluados, se toman de la caché
+        xEstimate = PredictionCache.predict(self.model,self.version,xExperiment)
+        f2 = validateF2([self.profileReference],xEstimate)
+        Metrics.observeStage('objetivo',start)
+        return -f2
+
+    # METODO: se ejecuta el algoritmo de optimización
+    # PARAMETROS DE ENTRADA
+    # - callback(Function): función que se llama al final de cada iteración del algoritmo (ver Swarm.pso), antes de
+    #   revisar la política de parada
+    # PARAMETROS DE SALIDA
+    # - data(Dict): mensaje 'optimizado' junto con los valores de las variables si se mejoró el F2 del experimento, o
+    #   mensaje 'no_optimizado', además de la razón de terminación ('razon') y las evaluaciones del modelo
+    #   ('evaluaciones')
+    def run(self, callback=None):
+        lb,ub = getBounds(self.variables,self.percentiles)
+        repair = None
+        if(self.mode == REPAIR):
+            repair = lambda X: repairSwarm(X,self.compiled,lb,ub)
+        
+        data = {}
+        if self.policy:
+            callback = getStoppingCallback(self.policy,SWARM_SIZE,callback)
+        xopt, fopt, info = Swarm.pso(self.function,lb,ub,f_ieqcons=self.constrains,maxiter=MAX_ITER,
+                                     swarmsize=SWARM_SIZE,seed=self.seed,callback=callback,repair=repair)
+        self.info = info
+        self.fopt = fopt
+        Metrics.observe(Metrics.EVALUATIONS,info['evaluaciones'])
+        data['razon'] = info['razon']
+        data['evaluaciones'] = info['evaluaciones']
+        if(fopt == Swarm.NOT_FEASIBLE):
+            data['mensaje'] = 'no_optimizado'
+        else:
+            # La función objetivo es -F2
+            if(-fopt > self.firstF2[0]):
+                varOpt = pd.DataFrame([xopt],columns=self.variables.variables)
+                varOpt = varOpt.iloc[0].to_json()
+                data['mensaje'] = 'optimizado'
+                data['variables'] = varOpt
+            else:
+                data['mensaje'] = 'no_optimizado'
+        
+        return data
+
+# METODO: se divide una solicitud de varios inicios ('inicios') en solicitudes independientes, una por inicio. Si la
+# solicitud tiene semilla cada inicio usa la semilla más su número, así el resultado es reproducible.
 # PARAMETROS DE ENTRADA
-# - x(Array): lista de nuevos valores determinados por el algoritmo de optimizacin
+# - fJSON(JSON): solicitud de optimización (ver Optimizer) con el número de inicios ('inicios', por defecto 1 y a lo
+#   sumo Schema.MAX_STARTS)
 # PARAMETROS DE SALIDA
-# - f2(float): valor de F2 predicho a partir de los nuevos valores para las variables optimizadas
-def function(x):
-    # globals: experiment, variables, model, profile, associatesVariables
-    xDF = pd.DataFrame(x,columns=['values'])
-    variables_x = pd.concat([variables,xDF],axis=1)
-    variables_x = ensureConsistency(variables_x,associatesVariables)
-    
-    xExperiment = experiment
-    #print(variables.variables)
-    #print(variables_x['values'])
-    #print(xExperiment.values)
-    xExperiment.loc[:,variables.variables] = variables_x['values'].values
-    #print(xExperiment.values)
-    xExperiment = xExperiment.values
-    xEstimate = model.predict(xExperiment)
-    f2 = validateF2([profileReference],xEstimate)
-    return f2
+# - starts(List): solicitudes de optimización de cada inicio
+def getStarts(fJSON):
+    n = int(fJSON.get('inicios',1))
+    if(n < 1 or n > Schema.MAX_STARTS):
+        raise ValueError('El numero de inicios debe estar entre 1 y %d' % Schema.MAX_STARTS)
+    seed = fJSON.get('semilla')
+    starts = []
+    for i in range(n):
+        start = dict(fJSON)
+        start.pop('inicios',None)
+        start['semilla'] = None if seed is None else seed+i
+        starts.append(start)
+    return starts
 
+# METODO: se ejecuta la optimización de un inicio
+# PARAMETROS DE ENTRADA
+# - fJSON(JSON): solicitud de optimización de un inicio
+# PARAMETROS DE SALIDA
+# - data(Dict): resultado de la optimización (ver Optimizer.run)
+# - f2(Float): mejor F2 encontrado, o None si no se encontró ninguna solución factible
+def runStart(fJSON):
+    optimizer = Optimizer(fJSON)
+    data = optimizer.run()
+    f2 = None if optimizer.fopt == Swarm.NOT_FEASIBLE else -float(optimizer.fopt)
+    return (data, f2)
+
+# METODO: se combinan los resultados de los inicios: se retorna el resultado del inicio con mayor F2 junto con la
+# dispersión del F2 entre los inicios y el total de evaluaciones del modelo
+# PARAMETROS DE ENTRADA
+# - results(List): resultados (data, f2) de cada inicio, ver runStart
+# PARAMETROS DE SALIDA
+# - data(Dict): resultado del mejor inicio con la información de los inicios ('inicios')
+def combineStarts(results):
+    f2 = [result[1] for result in results]
+    feasible = [value for value in f2 if value is not None]
+    best = 0
+    if feasible:
+        best = f2.index(max(feasible))
+    data = dict(results[best][0])
+    data['evaluaciones'] = sum([result[0]['evaluaciones'] for result in results])
+    data['inicios'] = {'numero': len(results), 'mejor': best, 'f2': f2, 'factibles': len(feasible)}
+    if feasible:
+        data['inicios'].update({'f2Minimo': min(feasible), 'f2Maximo': max(feasible),
+                                'f2Promedio': float(np.mean(feasible)), 'f2Desviacion': float(np.std(feasible))})
+    return data
+
+# METODO: se optimizan las variables seleccionadas de un experimento para maximizar el F2 frente a un perfil de referencia
+# PARAMETROS DE ENTRADA
+# - fJSON(JSON): solicitud de optimización (ver Optimizer). Con varios inicios ('inicios') se ejecutan uno tras otro y
+#   se retorna el mejor (ver Workers.runOptimization para ejecutarlos en paralelo)
+# PARAMETROS DE SALIDA
+# - data(JSON): resultado de la optimización
 def makeOptimization(fJSON):
-    global experiment
-    global model
-    global variables
-    global profileReference
-    global associatesVariables
-    global mixConstrain
-    global inOpt
-    global outOpt
-    
-    model = getModel()
-    experimentJSON = fJSON['experimento']
-    experiment = Processing.organizeExperiment(experimentJSON)
-    profileExperiment = getProfile(experimentJSON['tiempos'])
-    variables = fJSON['variables']
-    variables = pd.DataFrame(variables,columns=['variables'])
-    referenceProfile = fJSON['perfil']
-    
-    profileReference = getProfile(referenceProfile)
-    firstF2 = validateF2([profileReference],[profileExperiment])
-    
-    variables = eliminateVariables(variables,experiment)
-    variables.reset_index(drop=True,inplace=True)
-    associatesVariables = getAssociatesInVariables(variables)
-    
-    serie = pd.Series(['tiempoMezcladoGranulado','tiempoMezclaTotalFormula'])
-    serie = serie.isin(variables.variables)
-    mixConstrain = False
-    if(serie[0] and serie[1]):
-        mixConstrain == True
-    
-    inOpt,outOpt = getInOut(variables)
-    lb,ub = getBounds(variables)
-    
-    data = {}
-    xopt, fopt = pso(function,lb,ub,f_ieqcons=constrains,maxiter=100,swarmsize=50)
-    if(fopt == 1e+100):
-        data['mensaje'] = 'no_optimizado'
-    else:
-        print(fopt,firstF2)
-        if(fopt[0] > firstF2[0]):
-            varOpt = pd.DataFrame([xopt],columns=variables.variables)
-            varOpt = varOpt.iloc[0].to_json()
-            data['mensaje'] = 'optimizado'
-            data['variables'] = varOpt
-        else:
-            data['mensaje'] = 'no_optimizado'
-    
-    return json.dumps(data)
\ No newline at end of file
+    if('inicios' not in fJSON):
+        data = Optimizer(fJSON).run()
+        return json.dumps(data)
+    return json.dumps(combineStarts([runStart(start) for start in getStarts(fJSON)]))
@@ -0,0 +1,113 @@
+# -*- coding: latin-1 -*-
+import numpy as np
+
+# Valor de la función objetivo cuando no se encuentra ninguna partícula factible (el mismo que usa pyswarm)
+NOT_FEASIBLE = 1e+100
+
+# METODO: optimización por enjambre de partículas (PSO), con la misma dinámica de pyswarm.pso, pero evaluando todo el
+# enjambre en cada iteración: la función objetivo y las restricciones reciben una matriz con una partícula por fila, así
+# por iteración se hace un solo llamado a cada una de ellas. Se minimiza la función objetivo.
+# PARAMETROS DE ENTRADA:
+# - func(Function): función objetivo, recibe una matriz (partículas x variables) y retorna un arreglo con un valor por
+#   partícula
+# - lb(Array): límites inferiores de las variables
+# - ub(Array): límites superiores de las variables
+# - f_ieqcons(Function): restricciones de desigualdad, recibe la matriz de partículas y retorna una matriz (partículas x
+#   restricciones). Una partícula es factible si todas sus restricciones son mayores o iguales a cero.
+# - swarmsize(Int): número de partículas
+# - omega(Float): peso de la velocidad anterior
+# - phip(Float): peso de la mejor posición de cada partícula
+# - phig(Float): peso de la mejor posición del enjambre
+# - maxiter(Int): número máximo de iteraciones
+# - minstep(Float): tamaño mínimo del paso de la mejor posición antes de terminar
+# - minfunc(Float): cambio mínimo de la función objetivo en la mejor posición antes de terminar
+# - seed(Int): semilla del generador aleatorio, con la misma semilla el resultado es reproducible
+# - callback(Function): función que se llama al final de cada iteración con el número de la iteración, la mejor posición,
+#   su valor y el número de evaluaciones. Si retorna un valor (por ejemplo 'cancelado') el algoritmo termina y ese valor
+#   queda como razón de terminación.
+# - repair(Function): operador de reparación opcional, recibe la matriz de partículas ya dentro de los límites y retorna
+#   las partículas proyectadas a la región factible. Se aplica antes de cada evaluación.
+# PARAMETROS DE SALIDA:
+# - g(Array): mejor posición encontrada
+# - fg(Float): valor de la función objetivo en la mejor posición (NOT_FEASIBLE si ninguna partícula fue factible)
+# - info(Dict): número de iteraciones ('iteraciones'), número de evaluaciones de la función objetivo ('evaluaciones') y
+#   razón por la que terminó ('razon')
+def pso(func, lb, ub, f_ieqcons=None, swarmsize=100, omega=0.5, phip=0.5, phig=0.5, maxiter=100, minstep=1e-8,
+        minfunc=1e-8, seed=None, callback=None, repair=None):
+    lb = np.array(lb, dtype=float)
+    ub = np.array(ub, dtype=float)
+    rng = np.random.RandomState(seed)
+
+    if f_ieqcons is None:
+        isFeasible = lambda x: np.ones(len(x), dtype=bool)
+    else:
+        isFeasible = lambda x: np.all(np.asarray(f_ieqcons(x)) >= 0, axis=1)
+
+    vhigh = np.abs(ub-lb)
+    vlow = -vhigh
+    S = swarmsize
+    D = len(lb)
+
+    # Se inicializan las partículas, sus mejores posiciones y la mejor posición factible del enjambre
+    x = lb+rng.rand(S,D)*(ub-lb)
+    if repair is not None:
+        x = repair(x)
+    v = vlow+rng.rand(S,D)*(vhigh-vlow)
+    p = x.copy()
+    fp = np.asarray(func(x), dtype=float).reshape(S)
+    feasible = isFeasible(x)
+    evaluations = S
+
+    g = p[0].copy()
+    fg = NOT_FEASIBLE
+    if(feasible.any()):
+        best = np.flatnonzero(feasible)[np.argmin(fp[feasible])]
+        if(fp[best] < fg):
+            g = p[best].copy()
+            fg = fp[best]
+
+    info = {'iteraciones': 0, 'evaluaciones': evaluations, 'razon': 'maxiter'}
+    it = 1
+    while(it <= maxiter):
+        rp = rng.uniform(size=(S,D))
+        rg = rng.uniform(size=(S,D))
+
+        # Se actualizan las velocidades y posiciones de todo el enjambre, manteniendo las partículas en los límites
+        v = omega*v+phip*rp*(p-x)+phig*rg*(g-x)
+        x = np.clip(x+v,lb,ub)
+        if repair is not None:
+            x = repair(x)
+        fx = np.asarray(func(x), dtype=float).reshape(S)
+        evaluations += S
+        info['iteraciones'] = it
+        info['evaluaciones'] = evaluations
+
+        # Se actualizan las mejores posiciones de las partículas que mejoraron y son factibles
+        improved = fx < fp
+        if(improved.any()):
+            improved[improved] = isFeasible(x[improved])
+        p[improved] = x[improved]
+        fp[improved] = fx[improved]
+
+        if(improved.any()):
+            best = np.flatnonzero(improved)[np.argmin(fx[improved])]
+            if(fx[best] < fg):
+                tmp = x[best].copy()
+                stepsize = np.sqrt(np.sum((g-tmp)**2))
+                if(np.abs(fg-fx[best]) <= minfunc):
+                    info['razon'] = 'minfunc'
+                    return (tmp, fx[best], info)
+                elif(stepsize <= minstep):
+                    info['razon'] = 'minstep'
+                    return (tmp, fx[best], info)
+                g = tmp
+                fg = fx[best]
+
+        if callback is not None:
+            reason = callback(it,g,fg,evaluations)
+            if reason:
+                info['razon'] = reason
+                return (g, fg, info)
+        it += 1
+
+    return (g, fg, info)
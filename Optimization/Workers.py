@@ -0,0 +1,115 @@
+# -*- coding: latin-1 -*-
+import os
+import json
+import threading
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+from ServicesDisolution import Metrics
+from ServicesDisolution import Profiling
+from ServicesDisolution.Retraining import Comparison
+from ServicesDisolution.DataProcessing import ReferenceTables
+from ServicesDisolution.Optimization import OptimizationExperiment
+from ServicesDisolution.Optimization import BoundsIndex
+
+# Número de optimizaciones que se ejecutan al mismo tiempo y tipo de trabajadores ('procesos' o 'hilos'). Con procesos
+# cada optimización usa un núcleo; con hilos solo se paraleliza el tiempo que NumPy y el modelo liberan el GIL.
+WORKERS = int(os.environ.get('SD_OPTIMIZACION_TRABAJADORES', multiprocessing.cpu_count()))
+MODE = os.environ.get('SD_OPTIMIZACION_MODO', 'procesos')
+
+_pool = None
+_poolLock = threading.Lock()
+
+# METODO: se cargan en memoria el modelo, las tablas de referencia y el índice de límites de la tabla de entradas.
+# Se llama antes de crear los procesos trabajadores para que los hereden del proceso principal (copia al escribir) en
+# lugar de cargar cada uno su propia copia. Si aún no existen, cada trabajador los carga la primera vez que los usa.
+# PARAMETROS DE ENTRADA:
+# - Ninguno
+# PARAMETROS DE SALIDA:
+# - Ninguno
+def preload():
+    try:
+        Comparison.getLoadedModel()
+        ReferenceTables.preloadTables()
+        BoundsIndex.getIndex(ReferenceTables.getTableRoute(OptimizationExperiment.INPUTS_FILE))
+    except (IOError, OSError):
+        pass
+
+# METODO: se obtiene el grupo de trabajadores de optimización, se crea la primera vez que se usa
+# PARAMETROS DE ENTRADA:
+# - Ninguno
+# PARAMETROS DE SALIDA:
+# - pool(Pool): grupo de trabajadores
+def getPool():
+    global _pool
+    with _poolLock:
+        if _pool is None:
+            if(MODE == 'hilos'):
+                _pool = ThreadPool(WORKERS)
+            else:
+                preload()
+                _pool = multiprocessing.Pool(WORKERS)
+    return _pool
+
+# METODO: se cierra el grupo de trabajadores de optimización, esperando a que terminen las optimizaciones en curso
+# PARAMETROS DE ENTRADA:
+# - Ninguno
+# PARAMETROS DE SALIDA:
+# - Ninguno
+def closePool():
+    global _pool
+    with _poolLock:
+        if _pool is not None:
+            _pool.close()
+            _pool.join()
+            _pool = None
+
+# METODO: se ejecuta una tarea en un proceso trabajador (ver Profiling.runTask) y se retornan, junto con su resultado,
+# las métricas que el proceso registró al ejecutarla
+# PARAMETROS DE ENTRADA:
+# - task(Tuple): identificador de la solicitud (o None), función y tupla de argumentos
+# PARAMETROS DE SALIDA:
+# - result(Object): resultado de la función
+# - snapshot(List): métricas registradas (ver Metrics.popSnapshot)
+def runMeasuredTask(task):
+    result = Profiling.runTask(task)
+    return (result, Metrics.popSnapshot())
+
+# METODO: se ejecutan tareas en el grupo de trabajadores. Con procesos las métricas que registra cada trabajador se
+# suman a las del proceso del servicio, que es el que las reporta; con hilos ya quedan en él.
+# PARAMETROS DE ENTRADA:
+# - tasks(List): tareas (identificador de la solicitud, función, argumentos), ver Profiling.runTask
+# PARAMETROS DE SALIDA:
+# - results(List): resultados de las tareas, en el mismo orden
+def runTasks(tasks):
+    pool = getPool()
+    if isinstance(pool, ThreadPool):
+        return pool.map(Profiling.runTask,tasks,chunksize=1)
+    results = pool.map(runMeasuredTask,tasks,chunksize=1)
+    for result, snapshot in results:
+        Metrics.merge(snapshot)
+    return [result for result, snapshot in results]
+
+# METODO: se ejecuta una optimización en el grupo de trabajadores y se espera su resultado. Con varios inicios
+# ('inicios') cada inicio se ejecuta en un trabajador distinto y se retorna el mejor junto con la dispersión entre
+# inicios (ver OptimizationExperiment.combineStarts).
+# PARAMETROS DE ENTRADA:
+# - fJSON(JSON): solicitud de optimización (ver OptimizationExperiment.makeOptimization)
+# - profileId(String): identificador de la solicitud si se debe perfilar (el perfil se toma en el trabajador que
+#   ejecuta la optimización, ver Profiling.runTask), o None
+# PARAMETROS DE SALIDA:
+# - data(JSON): resultado de la optimización
+def runOptimization(fJSON, profileId=None):
+    if('inicios' not in fJSON):
+        return runTasks([(profileId,OptimizationExperiment.makeOptimization,(fJSON,))])[0]
+    starts = OptimizationExperiment.getStarts(fJSON)
+    tasks = [(profileId,OptimizationExperiment.runStart,(start,)) for start in starts]
+    results = runTasks(tasks)
+    return json.dumps(OptimizationExperiment.combineStarts(results))
+
+# METODO: se ejecutan varias optimizaciones en paralelo en el grupo de trabajadores
+# PARAMETROS DE ENTRADA:
+# - fJSONs(List): solicitudes de optimización
+# PARAMETROS DE SALIDA:
+# - results(List): resultados de las optimizaciones, en el mismo orden de las solicitudes
+def runOptimizations(fJSONs):
+    return runTasks([(None,OptimizationExperiment.makeOptimization,(fJSON,)) for fJSON in fJSONs])
@@ -0,0 +1,196 @@
+# -*- coding: latin-1 -*-
+import os
+import re
+import json
+import time
+import uuid
+import random
+import marshal
+import pstats
+import cProfile
+
+# Carpeta de los perfiles de ejecución de las solicitudes (variable de entorno SD_RUTA_PERFILES). Si no se define no se
+# perfila ninguna solicitud y el servicio no agrega ningún costo.
+PROFILE_ROUTE = os.environ.get('SD_RUTA_PERFILES')
+ENABLED = PROFILE_ROUTE is not None
+
+# Fracción de las solicitudes que se perfilan (0 a 1), encabezado con el que el cliente pide perfilar una solicitud y
+# clave que debe tener ese encabezado (si no se define basta con enviarlo)
+SAMPLE_RATE = float(os.environ.get('SD_PERFILES_MUESTREO', 0))
+HEADER = 'HTTP_X_PERFILAR'
+KEY = os.environ.get('SD_PERFILES_CLAVE')
+
+# Rutas del servicio que se pueden perfilar (nombre de la clase de la ruta, ver WebService)
+ROUTES = os.environ.get('SD_PERFILES_RUTAS', 'simulator,dataProcessing,optimization').split(',')
+
+# Número máximo de solicitudes perfiladas que se conservan (se eliminan las más antiguas) y número de funciones del
+# resumen
+MAX_PROFILES = int(os.environ.get('SD_PERFILES_MAXIMO', 100))
+TOP = int(os.environ.get('SD_PERFILES_FUNCIONES', 30))
+
+PROFILE_EXTENSION = '.prof'
+METADATA_EXTENSION = '.json'
+ID_PATTERN = re.compile(r'^[0-9a-f]+$')
+
+# METODO: se decide si se perfila una solicitud: si la ruta se puede perfilar y el cliente lo pidió con el encabezado
+# o la solicitud cae en la fracción de muestreo
+# PARAMETROS DE ENTRADA:
+# - route(String): nombre de la ruta
+# - environ(Dict): entorno WSGI de la solicitud
+# PARAMETROS DE SALIDA:
+# - profile(Bool): si se perfila la solicitud
+def shouldProfile(route, environ):
+    if route not in ROUTES:
+        return False
+    header = environ.get(HEADER)
+    if(header and (KEY is None or header == KEY)):
+        return True
+    return SAMPLE_RATE > 0 and random.random() < SAMPLE_RATE
+
+# METODO: se crea el identificador de una solicitud perfilada
+# PARAMETROS DE ENTRADA:
+# - Ninguno
+# PARAMETROS DE SALIDA:
+# - profileId(String): identificador
+def newProfileId():
+    return uuid.uuid4().hex
+
+# METODO: se crea la carpeta de perfiles si no existe
+# PARAMETROS DE ENTRADA:
+# - Ninguno
+# PARAMETROS DE SALIDA:
+# - Ninguno
+def createFolder():
+    if(not os.path.isdir(PROFILE_ROUTE)):
+        try:
+            os.makedirs(PROFILE_ROUTE)
+        except OSError:
+            # Otro proceso la pudo crear al mismo tiempo
+            if(not os.path.isdir(PROFILE_ROUTE)):
+                raise
+
+# METODO: se ejecuta una función con el perfilador determinista (cProfile) y se guarda su perfil en la carpeta de
+# perfiles. Una solicitud puede tener varios perfiles (por ejemplo uno por inicio de una optimización, cada uno en su
+# proceso), al consultarla se combinan.
+# PARAMETROS DE ENTRADA:
+# - profileId(String): identificador de la solicitud
+# - function(Function): función a ejecutar
+# - args(List): argumentos de la función
+# PARAMETROS DE SALIDA:
+# - result(Object): resultado de la función
+def runProfiled(profileId, function, *args):
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(function, *args)
+    finally:
+        route = os.path.join(PROFILE_ROUTE, '%s.%s%s' % (profileId, uuid.uuid4().hex[:8], PROFILE_EXTENSION))
+        try:
+            createFolder()
+            profiler.dump_stats(route)
+        except (IOError, OSError):
+            pass
+
+# METODO: se ejecuta una tarea de un grupo de trabajadores, con perfil si tiene identificador de solicitud (ver
+# Workers.runOptimization)
+# PARAMETROS DE ENTRADA:
+# - task(Tuple): identificador de la solicitud (o None), función y tupla de argumentos
+# PARAMETROS DE SALIDA:
+# - result(Object): resultado de la función
+def runTask(task):
+    profileId, function, args = task
+    if profileId is None:
+        return function(*args)
+    return runProfiled(profileId, function, *args)
+
+# METODO: se guardan los datos de una solicitud perfilada y se eliminan las solicitudes más antiguas si se supera
+# MAX_PROFILES
+# PARAMETROS DE ENTRADA:
+# - profileId(String): identificador de la solicitud
+# - route(String): nombre de la ruta
+# - seconds(Float): duración de la solicitud
+# PARAMETROS DE SALIDA:
+# - Ninguno
+def saveRequest(profileId, route, seconds):
+    try:
+        createFolder()
+        metadataFile = open(os.path.join(PROFILE_ROUTE, profileId+METADATA_EXTENSION), 'wb')
+        json.dump({'id': profileId, 'ruta': route, 'segundos': seconds, 'fecha': time.strftime('%Y-%m-%dT%H:%M:%S')},
+                  metadataFile)
+        metadataFile.close()
+        pruneProfiles()
+    except (IOError, OSError):
+        pass
+
+# METODO: se eliminan los archivos de las solicitudes perfiladas más antiguas, dejando las MAX_PROFILES más recientes
+# PARAMETROS DE ENTRADA:
+# - Ninguno
+# PARAMETROS DE SALIDA:
+# - Ninguno
+def pruneProfiles():
+    requests = {}
+    for fileName in os.listdir(PROFILE_ROUTE):
+        route = os.path.join(PROFILE_ROUTE, fileName)
+        try:
+            modified = os.path.getmtime(route)
+        except OSError:
+            continue
+        files, newest = requests.get(fileName.split('.')[0], ([], 0))
+        files.append(route)
+        requests[fileName.split('.')[0]] = (files, max(newest, modified))
+    ordered = sorted(requests.values(), key=lambda request: request[1], reverse=True)
+    for files, newest in ordered[MAX_PROFILES:]:
+        for route in files:
+            try:
+                os.remove(route)
+            except OSError:
+                pass
+
+# METODO: se obtienen los perfiles de una solicitud combinados
+# PARAMETROS DE ENTRADA:
+# - profileId(String): identificador de la solicitud
+# PARAMETROS DE SALIDA:
+# - stats(Stats): perfil combinado, o None si la solicitud no existe
+def getStats(profileId):
+    if(not ENABLED or not ID_PATTERN.match(profileId) or not os.path.isdir(PROFILE_ROUTE)):
+        return None
+    routes = [os.path.join(PROFILE_ROUTE, fileName) for fileName in sorted(os.listdir(PROFILE_ROUTE))
+              if fileName.startswith(profileId+'.') and fileName.endswith(PROFILE_EXTENSION)]
+    if not routes:
+        return None
+    return pstats.Stats(*routes)
+
+# METODO: se obtiene el resumen de una solicitud perfilada: las TOP funciones con mayor tiempo acumulado
+# PARAMETROS DE ENTRADA:
+# - profileId(String): identificador de la solicitud
+# - top(Int): número de funciones
+# PARAMETROS DE SALIDA:
+# - summary(Dict): datos de la solicitud, perfiles combinados ('perfiles'), tiempo total perfilado
+#   ('segundosPerfilados') y funciones ('funciones'), o None si la solicitud no existe
+def getSummary(profileId, top=TOP):
+    stats = getStats(profileId)
+    if stats is None:
+        return None
+    summary = {'id': profileId}
+    metadataRoute = os.path.join(PROFILE_ROUTE, profileId+METADATA_EXTENSION)
+    if os.path.exists(metadataRoute):
+        metadataFile = open(metadataRoute, 'rb')
+        summary.update(json.load(metadataFile))
+        metadataFile.close()
+    functions = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:top]
+    summary['perfiles'] = len(stats.files)
+    summary['segundosPerfilados'] = stats.total_tt
+    summary['funciones'] = [{'funcion': '%s:%d(%s)' % key, 'llamadas': value[1], 'llamadasPrimitivas': value[0],
+                             'tiempoPropio': value[2], 'tiempoAcumulado': value[3]} for key, value in functions]
+    return summary
+
+# METODO: se obtiene el perfil combinado de una solicitud en el formato de pstats, para abrirlo con pstats o con otras
+# herramientas (snakeviz, gprof2dot, ...)
+# PARAMETROS DE ENTRADA:
+# - profileId(String): identificador de la solicitud
+# PARAMETROS DE SALIDA:
+# - content(String): contenido del archivo de perfil, o None si la solicitud no existe
+def getDump(profileId):
+    stats = getStats(profileId)
+    if stats is None:
+        return None
+    return marshal.dumps(stats.stats)
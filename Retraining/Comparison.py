@@ -1,6 +1,119 @@
 # -*- coding: latin-1 -*-
 import numpy as np
 import pickle
+import hashlib
+import os
+import time
+import threading
+from ServicesDisolution import Metrics
+from ServicesDisolution.Retraining import Registry
+from ServicesDisolution.Simulation import CompiledModel
+
+# ¡¡¡REEMPLAZAR POR EL MODELO EN EL SERVIDOR!!! (o definir la variable de entorno SD_RUTA_MODELO)
+MODEL_ROUTE = os.environ.get('SD_RUTA_MODELO', 'C:\Users\ing-y-soft\Documents\Proyecto\Code\Integracion\model.pckl')
+
+# Modelo cargado en memoria para todo el proceso como una tupla (modelo, versión, firma del archivo). La tupla se
+# reemplaza completa, así el cambio de modelo es atómico y las predicciones en curso conservan el modelo con el que
+# empezaron.
+_loadedModel = (None, None, None)
+_loadLock = threading.Lock()
+
+# Extensión del archivo con la versión compilada del modelo, junto al pickle
+COMPILED_EXTENSION = '.compilado.npz'
+
+# METODO: se obtiene la ruta del archivo con el actual modelo del sistema: el de la versión actual del registro de
+# modelos si está configurado (ver Registry), si no MODEL_ROUTE
+# PARAMETROS DE ENTRADA:
+# - Ninguno
+# PARAMETROS DE SALIDA:
+# - route(String): ruta del archivo del modelo
+def getModelRoute():
+    if Registry.REGISTRY_ROUTE is not None:
+        return Registry.getModelRoute()
+    return MODEL_ROUTE
+
+# METODO: se obtiene la firma (ruta, fecha de modificación y tamaño) de un archivo para saber si ha cambiado
+# PARAMETROS DE ENTRADA:
+# - route(String): ruta del archivo
+# PARAMETROS DE SALIDA:
+# - signature(Tuple): firma del archivo
+def getSignature(route):
+    stat = os.stat(route)
+    return (route, stat.st_mtime, stat.st_size)
+
+# METODO: se obtiene el modelo con el que se harán las predicciones a partir del pickle del modelo: su versión compilada
+# en arreglos de NumPy si el tipo de modelo está soportado (ver CompiledModel), si no el modelo original. La versión
+# compilada se guarda junto al pickle y la próxima vez se carga directamente, sin deserializar el pickle.
+# PARAMETROS DE ENTRADA:
+# - route(String): ruta del archivo del modelo
+# - content(String): contenido del archivo del modelo
+# - checksum(String): checksum del contenido
+# PARAMETROS DE SALIDA:
+# - model(Model): modelo compilado o modelo original
+def loadInferenceModel(route, content, checksum):
+    compiledRoute = route+COMPILED_EXTENSION
+    if CompiledModel.ENABLED:
+        compiled = CompiledModel.loadModel(compiledRoute,checksum,route)
+        if compiled is not None:
+            return compiled
+    model = pickle.loads(content)
+    inference = CompiledModel.getInferenceModel(model)
+    if inference is not model:
+        try:
+            CompiledModel.saveModel(inference,compiledRoute,checksum)
+        except (IOError, OSError):
+            pass
+    return inference
+
+# METODO: se obtiene el actual modelo del sistema junto con su versión. El modelo se carga una sola vez y se mantiene
+# en memoria; si el archivo cambia (fecha de modificación o tamaño) se carga la nueva versión y se reemplaza sin
+# bloquear las predicciones en curso. La versión es el checksum MD5 del archivo. Un modelo que no corresponde a la
+# estructura de entrada del simulador (ver Registry.checkSchema) no se carga.
+# PARAMETROS DE ENTRADA:
+# - Ninguno
+# PARAMETROS DE SALIDA:
+# - model(Model): actual modelo del sistema
+# - version(String): versión del modelo cargado
+def getLoadedModel():
+    global _loadedModel
+    model, version, loadedSignature = _loadedModel
+    signature = getSignature(getModelRoute())
+    if(signature == loadedSignature):
+        return (model, version)
+
+    # Si otro hilo ya está cargando la nueva versión se sigue usando la anterior, solo se espera cuando no hay ninguna
+    if(not _loadLock.acquire(model is None)):
+        return (model, version)
+    try:
+        model, version, loadedSignature = _loadedModel
+        if(signature != loadedSignature):
+            route = open(signature[0], 'rb')
+            content = route.read()
+            route.close()
+            newVersion = hashlib.md5(content).hexdigest()
+            try:
+                # Si solo cambió la fecha del archivo no se vuelve a cargar el modelo
+                if(newVersion != version):
+                    start = time.time()
+                    newModel = loadInferenceModel(signature[0],content,newVersion)
+                    Metrics.observeStage('carga_modelo',start)
+                    Registry.checkSchema(newModel,Registry.getSchemaForRoute(signature[0]))
+                    model = newModel
+                    version = newVersion
+            except Registry.SchemaMismatch:
+                # Un modelo de otra estructura no se vuelve a leer hasta que el archivo cambie
+                if(model is None):
+                    raise
+            except Exception:
+                # Un archivo a medio escribir no reemplaza al modelo que ya está en memoria
+                if(model is None):
+                    raise
+                return (model, version)
+            _loadedModel = (model, version, signature)
+    finally:
+        _loadLock.release()
+
+    return (model, version)
 
 # METODO: se obtiene el actual modelo del sistema
 # PARAMETROS DE ENTRADA:
@@ -8,18 +121,22 @@ import pickle
 # PARAMETROS DE SALIDA:
 # - model(Model): actual modelo del sistema
 def getModel():
-    #REEMPLAZAR POR EL MODELO EN EL SERVIDOR!!!
-    route = open('C:\Users\ing-y-soft\Documents\Proyecto\Code\Integracion\model.pckl')
-    model = pickle.load(route)
-    route.close()
-    return model
-
-# Mtodo para calcular los valores de F1 a partir de los porcentajes de disolucin de dos matrices. Cada fila en la matices
-# representa un perfil de disolucin.
-# Parmetros: 
-# - val1: matriz con los porcentajes de disolucin de los perfiles de referencia reales. Cada fila representa un perfil
+    return getLoadedModel()[0]
+
+# METODO: se obtiene la versión del actual modelo del sistema
+# PARAMETROS DE ENTRADA:
+# - Ninguno
+# PARAMETROS DE SALIDA:
+# - version(String): checksum del archivo del modelo cargado en memoria
+def getModelVersion():
+    return getLoadedModel()[1]
+
+# Método para calcular los valores de F1 a partir de los porcentajes de disolución de dos matrices. Cada fila en la matices
+# representa un perfil de disolución.
+# Parámetros: 
+# - val1: matriz con los porcentajes de disolución de los perfiles de referencia reales. Cada fila representa un perfil
 #   diferente.
-# - val2: matriz con los porcentajes de disolucin de los perfiles estimados. Cada fila representa un perfil
+# - val2: matriz con los porcentajes de disolución de los perfiles estimados. Cada fila representa un perfil
 #   diferente.
 def validateF1(val1,val2):
     R = np.array(val1, dtype=float)
@@ -27,12 +144,12 @@ def validateF1(val1,val2):
     F1 = (((np.absolute(R-T)).sum(axis=1))/(R.sum(axis=1)))*100
     return(F1)
 
-# Mtodo para calcular los valores de F2 a partir de los porcentajes de disolucin de dos matrices. Cada fila en la matices
-# representa un perfil de disolucin.
-# Parmetros: 
-# - val1: matriz con los porcentajes de disolucin de los perfiles de referencia. Cada fila representa un perfil
+# Método para calcular los valores de F2 a partir de los porcentajes de disolución de dos matrices. Cada fila en la matices
+# representa un perfil de disolución.
+# Parámetros: 
+# - val1: matriz con los porcentajes de disolución de los perfiles de referencia. Cada fila representa un perfil
 #   diferente.
-# - val2: matriz con los porcentajes de disolucin de los perfiles estimados. Cada fila representa un perfil
+# - val2: matriz con los porcentajes de disolución de los perfiles estimados. Cada fila representa un perfil
 #   diferente.
 def validateF2(val1,val2):    
     R = np.array(val1, dtype=float)
@@ -0,0 +1,287 @@
+# -*- coding: latin-1 -*-
+import os
+import sys
+import json
+import time
+import pickle
+import shutil
+import hashlib
+import argparse
+import threading
+import numpy as np
+from ServicesDisolution.DataProcessing import Processing
+
+# Carpeta del registro de modelos (variable de entorno SD_RUTA_REGISTRO). Si no se define, el modelo del sistema es el
+# archivo Comparison.MODEL_ROUTE.
+REGISTRY_ROUTE = os.environ.get('SD_RUTA_REGISTRO')
+
+# Estructura del registro: una carpeta por versión con el modelo y sus metadatos, el archivo con la versión actual y el
+# historial de versiones promovidas (la última es la actual)
+VERSIONS_FOLDER = 'versiones'
+MODEL_FILE = 'modelo.pckl'
+METADATA_FILE = 'metadatos.json'
+CURRENT_FILE = 'ACTUAL'
+HISTORY_FILE = 'historial.json'
+
+# Número de predicciones de una fila con las que se mide la latencia de inferencia de un modelo al registrarlo
+LATENCY_ROUNDS = 50
+
+_lock = threading.Lock()
+
+# EXCEPCION: la estructura de entrada con la que se entrenó un modelo no corresponde a la del simulador
+class SchemaMismatch(ValueError):
+    pass
+
+# METODO: se obtiene la carpeta de una versión del registro
+# PARAMETROS DE ENTRADA:
+# - version(String): versión
+# PARAMETROS DE SALIDA:
+# - route(String): carpeta de la versión
+def getVersionRoute(version):
+    return os.path.join(REGISTRY_ROUTE, VERSIONS_FOLDER, version)
+
+# METODO: se escribe un archivo de texto de forma atómica (archivo temporal que luego reemplaza al anterior)
+# PARAMETROS DE ENTRADA:
+# - route(String): ruta del archivo
+# - content(String): contenido
+# PARAMETROS DE SALIDA:
+# - Ninguno
+def writeAtomic(route, content):
+    temporal = route+'.tmp'
+    output = open(temporal, 'wb')
+    output.write(content)
+    output.close()
+    if(os.name == 'nt' and os.path.exists(route)):
+        os.remove(route)
+    os.rename(temporal, route)
+
+# METODO: se obtiene la versión actual del registro
+# PARAMETROS DE ENTRADA:
+# - Ninguno
+# PARAMETROS DE SALIDA:
+# - version(String): versión actual, o None si aún no se ha promovido ninguna
+def getCurrentVersion():
+    route = os.path.join(REGISTRY_ROUTE, CURRENT_FILE)
+    if(not os.path.exists(route)):
+        return None
+    current = open(route, 'rb')
+    version = current.read().strip()
+    current.close()
+    return version or None
+
+# METODO: se obtiene la ruta del modelo de la versión actual del registro
+# PARAMETROS DE ENTRADA:
+# - Ninguno
+# PARAMETROS DE SALIDA:
+# - route(String): ruta del archivo del modelo actual
+def getModelRoute():
+    version = getCurrentVersion()
+    if version is None:
+        raise IOError('El registro de modelos no tiene una version actual: %s' % REGISTRY_ROUTE)
+    return os.path.join(getVersionRoute(version), MODEL_FILE)
+
+# METODO: se obtienen los metadatos de una versión
+# PARAMETROS DE ENTRADA:
+# - version(String): versión
+# PARAMETROS DE SALIDA:
+# - metadata(Dict): metadatos de la versión
+def getMetadata(version):
+    route = os.path.join(getVersionRoute(version), METADATA_FILE)
+    if(not os.path.exists(route)):
+        raise KeyError('Version no registrada: %s' % version)
+    metadataFile = open(route, 'rb')
+    metadata = json.load(metadataFile)
+    metadataFile.close()
+    return metadata
+
+# METODO: se obtiene el hash de la estructura de entrada con la que se entrenó el modelo de un archivo. Solo los
+# modelos del registro tienen esta información.
+# PARAMETROS DE ENTRADA:
+# - route(String): ruta del archivo del modelo
+# PARAMETROS DE SALIDA:
+# - schema(String): hash de la estructura de entrada, o None si el archivo no es de una versión del registro
+def getSchemaForRoute(route):
+    route = os.path.join(os.path.dirname(route), METADATA_FILE)
+    if(not os.path.exists(route)):
+        return None
+    metadataFile = open(route, 'rb')
+    schema = json.load(metadataFile).get('esquema')
+    metadataFile.close()
+    return schema
+
+# METODO: se verifica que un modelo corresponda a la estructura de entrada del simulador: el hash de la estructura con
+# la que se registró (si se conoce) y el número de variables que espera el modelo (si lo expone)
+# PARAMETROS DE ENTRADA:
+# - model(Model): modelo
+# - schema(String): hash de la estructura de entrada con la que se entrenó, o None si no se conoce
+# PARAMETROS DE SALIDA:
+# - Ninguno, se lanza SchemaMismatch si no corresponde
+def checkSchema(model, schema=None):
+    if(schema is not None and schema != Processing.getSchemaHash()):
+        raise SchemaMismatch('El modelo fue entrenado con otra estructura de entrada (%s)' % schema)
+    features = getattr(model, 'n_features_', None)
+    if(features is not None and features != len(Processing.ORDER)):
+        raise SchemaMismatch('El modelo espera %d variables y la estructura de entrada tiene %d' %
+                             (features, len(Processing.ORDER)))
+
+# METODO: se mide la latencia de inferencia de un modelo: mediana del tiempo de predecir una fila
+# PARAMETROS DE ENTRADA:
+# - model(Model): modelo
+# PARAMETROS DE SALIDA:
+# - latency(Float): latencia en milisegundos
+def measureLatency(model):
+    row = np.zeros((1, len(Processing.ORDER)))
+    times = []
+    for i in range(LATENCY_ROUNDS):
+        start = time.time()
+        model.predict(row)
+        times.append(time.time()-start)
+    return float(np.median(times))*1000
+
+# METODO: se registra un modelo como una nueva versión, sin promoverla. La versión se escribe en una carpeta temporal
+# que luego se renombra, así una versión registrada siempre está completa.
+# PARAMETROS DE ENTRADA:
+# - model(Model): modelo entrenado con la estructura de entrada actual del simulador
+# - metadata(Dict): metadatos adicionales, por ejemplo F1 y F2 de validación ('f1', 'f2')
+# PARAMETROS DE SALIDA:
+# - version(String): versión registrada
+def registerModel(model, metadata=None):
+    checkSchema(model)
+    content = pickle.dumps(model, pickle.HIGHEST_PROTOCOL)
+    version = time.strftime('%Y%m%d-%H%M%S')+'-'+hashlib.md5(content).hexdigest()[:8]
+    metadata = dict(metadata or {})
+    metadata.update({'version': version, 'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                     'esquema': Processing.getSchemaHash(), 'columnas': len(Processing.ORDER),
+                     'latenciaMs': measureLatency(model), 'checksum': hashlib.md5(content).hexdigest()})
+
+    folder = os.path.join(REGISTRY_ROUTE, VERSIONS_FOLDER)
+    if(not os.path.isdir(folder)):
+        os.makedirs(folder)
+    route = getVersionRoute(version)
+    if os.path.exists(route):
+        return version
+    temporal = route+'.tmp'
+    if os.path.exists(temporal):
+        shutil.rmtree(temporal)
+    os.makedirs(temporal)
+    modelFile = open(os.path.join(temporal, MODEL_FILE), 'wb')
+    modelFile.write(content)
+    modelFile.close()
+    metadataFile = open(os.path.join(temporal, METADATA_FILE), 'wb')
+    json.dump(metadata, metadataFile, indent=1, sort_keys=True)
+    metadataFile.close()
+    os.rename(temporal, route)
+    return version
+
+# METODO: se obtiene el historial de versiones promovidas
+# PARAMETROS DE ENTRADA:
+# - Ninguno
+# PARAMETROS DE SALIDA:
+# - history(List): versiones promovidas, la última es la actual
+def getHistory():
+    route = os.path.join(REGISTRY_ROUTE, HISTORY_FILE)
+    if(not os.path.exists(route)):
+        return []
+    historyFile = open(route, 'rb')
+    history = json.load(historyFile)
+    historyFile.close()
+    return history
+
+# METODO: se cambia la versión actual: se escribe el historial y luego el archivo de la versión actual, ambos de forma
+# atómica. Los servicios en ejecución cargan la nueva versión en su siguiente predicción (ver
+# Comparison.getLoadedModel). Se debe llamar con el candado tomado.
+# PARAMETROS DE ENTRADA:
+# - version(String): nueva versión actual
+# - history(List): nuevo historial
+# PARAMETROS DE SALIDA:
+# - Ninguno
+def setCurrentVersion(version, history):
+    writeAtomic(os.path.join(REGISTRY_ROUTE, HISTORY_FILE), json.dumps(history))
+    writeAtomic(os.path.join(REGISTRY_ROUTE, CURRENT_FILE), version)
+
+# METODO: se promueve una versión registrada a versión actual. Se rechaza si fue entrenada con otra estructura de
+# entrada del simulador.
+# PARAMETROS DE ENTRADA:
+# - version(String): versión registrada
+# PARAMETROS DE SALIDA:
+# - Ninguno
+def promote(version):
+    with _lock:
+        checkSchema(None, getMetadata(version)['esquema'])
+        history = getHistory()
+        if(history and history[-1] == version and getCurrentVersion() == version):
+            return
+        setCurrentVersion(version, history+[version])
+
+# METODO: se vuelve a la versión promovida antes de la actual
+# PARAMETROS DE ENTRADA:
+# - Ninguno
+# PARAMETROS DE SALIDA:
+# - version(String): nueva versión actual
+def rollback():
+    with _lock:
+        history = getHistory()
+        if(len(history) < 2):
+            raise ValueError('No hay una version anterior a la cual volver')
+        previous = history[-2]
+        checkSchema(None, getMetadata(previous)['esquema'])
+        setCurrentVersion(previous, history[:-1])
+        return previous
+
+# METODO: se listan las versiones registradas con sus metadatos
+# PARAMETROS DE ENTRADA:
+# - Ninguno
+# PARAMETROS DE SALIDA:
+# - versions(List): metadatos de cada versión, en orden de registro, indicando cuál es la actual ('actual')
+def listVersions():
+    folder = os.path.join(REGISTRY_ROUTE, VERSIONS_FOLDER)
+    if(not os.path.isdir(folder)):
+        return []
+    current = getCurrentVersion()
+    versions = []
+    for version in sorted(os.listdir(folder)):
+        if(not version.endswith('.tmp')):
+            metadata = getMetadata(version)
+            metadata['actual'] = (version == current)
+            versions.append(metadata)
+    return versions
+
+# METODO: punto de entrada de línea de comandos:
+# python -m ServicesDisolution.Retraining.Registry listar | registrar modelo.pckl [--promover] | promover VERSION |
+# revertir
+# PARAMETROS DE ENTRADA:
+# - argv(List): argumentos de la línea de comandos
+# PARAMETROS DE SALIDA:
+# - code(Int): código de salida
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Registro de modelos del simulador')
+    commands = parser.add_subparsers(dest='comando')
+    commands.add_parser('listar')
+    register = commands.add_parser('registrar')
+    register.add_argument('modelo', help='archivo pickle del modelo')
+    register.add_argument('--promover', action='store_true')
+    promoteCommand = commands.add_parser('promover')
+    promoteCommand.add_argument('version')
+    commands.add_parser('revertir')
+    args = parser.parse_args(argv)
+    if REGISTRY_ROUTE is None:
+        parser.error('Se debe definir la variable de entorno SD_RUTA_REGISTRO')
+
+    if(args.comando == 'listar'):
+        print(json.dumps(listVersions(), indent=1, sort_keys=True))
+    elif(args.comando == 'registrar'):
+        modelFile = open(args.modelo, 'rb')
+        model = pickle.load(modelFile)
+        modelFile.close()
+        version = registerModel(model)
+        if args.promover:
+            promote(version)
+        print(version)
+    elif(args.comando == 'promover'):
+        promote(args.version)
+    else:
+        print(rollback())
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
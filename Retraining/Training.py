@@ -0,0 +1,185 @@
+# -*- coding: latin-1 -*-
+import os
+import sys
+import json
+import time
+import pickle
+import shutil
+import argparse
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestRegressor
+from ServicesDisolution.Retraining import Comparison
+from ServicesDisolution.Retraining import Registry
+from ServicesDisolution.DataProcessing import Processing
+from ServicesDisolution.DataProcessing import ReferenceTables
+
+INPUTS_FILE = '3_Entradas_Integracion.csv'
+
+# Columnas de la tabla de entradas con las medias de disolución registradas (salidas del simulador)
+TARGETS = ['media1','media2','media3']
+
+# Fracción de la tabla que se reserva para comparar los modelos, semilla de la partición, número de filas por bloque en
+# la evaluación, número de procesos del entrenamiento (-1 para todos los núcleos) y mejora mínima del F2 promedio para
+# promover al retador
+HOLDOUT = float(os.environ.get('SD_REENTRENAMIENTO_VALIDACION', 0.2))
+SEED = int(os.environ.get('SD_REENTRENAMIENTO_SEMILLA', 0))
+CHUNK_SIZE = int(os.environ.get('SD_REENTRENAMIENTO_BLOQUE', 10000))
+JOBS = int(os.environ.get('SD_REENTRENAMIENTO_PROCESOS', -1))
+MIN_IMPROVEMENT = float(os.environ.get('SD_REENTRENAMIENTO_MEJORA', 0))
+
+# METODO: se carga la tabla de entradas con sus medias de disolución y se divide en entrenamiento y validación. La
+# partición depende solo de la semilla y del número de filas.
+# PARAMETROS DE ENTRADA:
+# - route(String): ruta de la tabla de entradas
+# - holdout(Float): fracción de filas de validación
+# - seed(Int): semilla de la partición
+# PARAMETROS DE SALIDA:
+# - features(Array): matriz de entradas del simulador (columnas en el orden Processing.ORDER)
+# - targets(Array): matriz de medias de disolución
+# - validation(Array): máscara de las filas de validación
+def loadTrainingTable(route, holdout=HOLDOUT, seed=SEED):
+    table = pd.read_csv(route, usecols=Processing.ORDER+TARGETS)
+    features = table.loc[:,Processing.ORDER].values.astype(float)
+    targets = table.loc[:,TARGETS].values.astype(float)
+    validation = np.random.RandomState(seed).rand(len(table)) < holdout
+    return (features, targets, validation)
+
+# METODO: se evalúa un modelo sobre un grupo de experimentos por bloques de CHUNK_SIZE filas: se predicen las medias de
+# cada bloque y se acumulan sus F1 y F2 frente a las medias registradas (ver Comparison.validateF1 y validateF2)
+# PARAMETROS DE ENTRADA:
+# - model(Model): modelo a evaluar
+# - features(Array): matriz de entradas del simulador
+# - targets(Array): matriz de medias de disolución registradas
+# PARAMETROS DE SALIDA:
+# - scores(Dict): F1 promedio ('f1'), F2 promedio ('f2') y porcentaje de experimentos con F2 >= 50 ('similares')
+def evaluateModel(model, features, targets):
+    f1 = 0.0
+    f2 = 0.0
+    similar = 0
+    for start in range(0,len(features),CHUNK_SIZE):
+        estimate = model.predict(features[start:start+CHUNK_SIZE])
+        real = targets[start:start+CHUNK_SIZE]
+        chunkF2 = Comparison.validateF2(real,estimate)
+        f1 += Comparison.validateF1(real,estimate).sum()
+        f2 += chunkF2.sum()
+        similar += (chunkF2 >= 50).sum()
+    n = float(max(len(features),1))
+    return {'f1': f1/n, 'f2': f2/n, 'similares': 100*similar/n}
+
+# METODO: se crea el modelo retador: un modelo sin entrenar con los mismos parámetros del modelo actual del sistema (o
+# un bosque aleatorio si no hay modelo actual), usando todos los núcleos si el modelo lo permite
+# PARAMETROS DE ENTRADA:
+# - champion(Model): modelo actual del sistema, o None
+# PARAMETROS DE SALIDA:
+# - challenger(Model): modelo sin entrenar
+def createChallenger(champion):
+    if champion is None:
+        return RandomForestRegressor(n_estimators=100,n_jobs=JOBS,random_state=SEED)
+    challenger = clone(champion)
+    if('n_jobs' in challenger.get_params()):
+        challenger.set_params(n_jobs=JOBS)
+    return challenger
+
+# METODO: se reemplaza el archivo del modelo del sistema de forma atómica: el modelo se escribe en un archivo temporal
+# en la misma carpeta que luego reemplaza al anterior, así el servicio nunca lee un archivo a medio escribir. Antes se
+# guarda una copia del modelo anterior con la extensión '.anterior'.
+# PARAMETROS DE ENTRADA:
+# - model(Model): modelo a promover
+# - route(String): ruta del archivo del modelo del sistema
+# PARAMETROS DE SALIDA:
+# - Ninguno
+def promoteModel(model, route):
+    temporal = route+'.tmp'
+    modelFile = open(temporal,'wb')
+    pickle.dump(model,modelFile,pickle.HIGHEST_PROTOCOL)
+    modelFile.close()
+    if os.path.exists(route):
+        shutil.copyfile(route,route+'.anterior')
+        if(os.name == 'nt'):
+            os.remove(route)
+    os.rename(temporal,route)
+
+# METODO: se obtiene el estado del modelo del sistema, para saber si cambió: la versión actual del registro de modelos o
+# la firma del archivo del modelo
+# PARAMETROS DE ENTRADA:
+# - Ninguno
+# PARAMETROS DE SALIDA:
+# - state(Object): estado del modelo del sistema, o None si aún no hay modelo
+def getModelState():
+    if Registry.REGISTRY_ROUTE is not None:
+        return Registry.getCurrentVersion()
+    route = Comparison.getModelRoute()
+    return Comparison.getSignature(route) if os.path.exists(route) else None
+
+# METODO: se reentrena el modelo del sistema: se entrena un retador con las filas de entrenamiento de la tabla de
+# entradas, se comparan retador y modelo actual (campeón) sobre las filas de validación y el retador se promueve solo si
+# su F2 promedio supera al del campeón en más de MIN_IMPROVEMENT (con registro de modelos se registra como una nueva
+# versión y se promueve, ver Registry). Si el modelo del sistema cambió durante el reentrenamiento el retador no se
+# promueve.
+# PARAMETROS DE ENTRADA:
+# - promote(Bool): si es False solo se comparan los modelos
+# PARAMETROS DE SALIDA:
+# - report(Dict): métricas del campeón y del retador, filas usadas, si se promovió el retador y duración
+def retrain(promote=True):
+    start = time.time()
+    champion = None
+    state = getModelState()
+    if state is not None:
+        # Se usa el modelo original y no su versión compilada (ver Comparison.loadInferenceModel), el retador se crea
+        # con sus parámetros
+        modelFile = open(Comparison.getModelRoute(),'rb')
+        champion = pickle.load(modelFile)
+        modelFile.close()
+
+    features,targets,validation = loadTrainingTable(ReferenceTables.getTableRoute(INPUTS_FILE))
+    if(validation.all() or not validation.any()):
+        raise ValueError('La tabla de entradas no tiene suficientes filas para entrenar y validar')
+    challenger = createChallenger(champion)
+    challenger.fit(features[~validation],targets[~validation])
+    # Las predicciones del servicio son de pocas filas, no se paralelizan como el entrenamiento
+    if('n_jobs' in challenger.get_params()):
+        challenger.set_params(n_jobs=champion.get_params()['n_jobs'] if champion is not None else 1)
+
+    report = {'filasEntrenamiento': int((~validation).sum()), 'filasValidacion': int(validation.sum())}
+    report['retador'] = evaluateModel(challenger,features[validation],targets[validation])
+    report['campeon'] = None
+    if champion is not None:
+        report['campeon'] = evaluateModel(champion,features[validation],targets[validation])
+    wins = champion is None or report['retador']['f2'] > report['campeon']['f2']+MIN_IMPROVEMENT
+    report['gana'] = bool(wins)
+
+    report['promovido'] = False
+    if(promote and wins):
+        if(getModelState() != state):
+            report['mensaje'] = 'El modelo del sistema cambio durante el reentrenamiento'
+        elif Registry.REGISTRY_ROUTE is not None:
+            # Con registro de modelos el retador se registra como una nueva versión con sus métricas y se promueve
+            metadata = {'f1': report['retador']['f1'], 'f2': report['retador']['f2'],
+                        'filasEntrenamiento': report['filasEntrenamiento'],
+                        'filasValidacion': report['filasValidacion']}
+            report['version'] = Registry.registerModel(challenger,metadata)
+            Registry.promote(report['version'])
+            report['promovido'] = True
+        else:
+            promoteModel(challenger,Comparison.getModelRoute())
+            report['promovido'] = True
+    report['segundos'] = time.time()-start
+    return report
+
+# METODO: punto de entrada de línea de comandos: python -m ServicesDisolution.Retraining.Training [--sin-promover]
+# PARAMETROS DE ENTRADA:
+# - argv(List): argumentos de la línea de comandos
+# PARAMETROS DE SALIDA:
+# - code(Int): código de salida
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Reentrena el modelo del sistema con la tabla de entradas')
+    parser.add_argument('--sin-promover', dest='promote', action='store_false',
+                        help='solo compara el retador con el modelo actual')
+    args = parser.parse_args(argv)
+    print(json.dumps(retrain(args.promote)))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,422 @@
+# -*- coding: latin-1 -*-
+import os
+import re
+import sys
+import time
+import errno
+import signal
+import socket
+import shutil
+import argparse
+import tempfile
+import threading
+import traceback
+import multiprocessing
+from web import wsgiserver
+from ServicesDisolution import Metrics
+from ServicesDisolution.Retraining import Comparison
+from ServicesDisolution.Optimization import Workers
+from ServicesDisolution.Optimization import Jobs
+
+# Dirección y puerto del servicio, número de procesos que atienden solicitudes (comparten el mismo puerto), hilos por
+# proceso y segundos que un proceso espera a que terminen sus solicitudes en curso antes de salir
+HOST = os.environ.get('SD_SERVIDOR_HOST', '0.0.0.0')
+PORT = int(os.environ.get('SD_SERVIDOR_PUERTO', 8080))
+PROCESSES = int(os.environ.get('SD_SERVIDOR_PROCESOS', multiprocessing.cpu_count()))
+THREADS = int(os.environ.get('SD_SERVIDOR_HILOS', 10))
+SHUTDOWN_TIMEOUT = float(os.environ.get('SD_SERVIDOR_CIERRE', 60))
+
+# Número máximo de solicitudes que se atienden al mismo tiempo entre todos los procesos, por grupo de rutas, y segundos
+# que una solicitud espera un lugar antes de responder 503. Así una optimización lenta no ocupa los hilos que
+# necesitan las simulaciones.
+OPTIMIZATION_LIMIT = int(os.environ.get('SD_SERVIDOR_OPTIMIZACIONES', max(1, multiprocessing.cpu_count()//2)))
+SIMULATION_LIMIT = int(os.environ.get('SD_SERVIDOR_SIMULACIONES', PROCESSES*THREADS))
+WAIT_TIMEOUT = float(os.environ.get('SD_SERVIDOR_ESPERA', 30))
+
+# Segundos entre revisiones del modelo del sistema: cuando se promueve un modelo nuevo se reinician los procesos de
+# forma ordenada para que lo compartan cargado desde el proceso principal
+CHECK_INTERVAL = float(os.environ.get('SD_SERVIDOR_REVISION', 5))
+
+# Grupos de rutas con límite de concurrencia: nombre, expresión de la ruta y límite. Una optimización seguida en vivo
+# (/optimization/stream) ocupa su lugar hasta que termina o se desconecta el cliente (ver LimitedResponse). Los trabajos
+# de /optimization/jobs no ocupan lugares: se ejecutan en el proceso de trabajos, con OPTIMIZATION_LIMIT trabajadores y
+# una cola de tamaño limitado (ver serve y Jobs).
+GROUPS = [('optimizacion', r'^/optimization(/stream)?/?$', OPTIMIZATION_LIMIT),
+          ('simulador', r'^/(simulator|sweep)(/|$)', SIMULATION_LIMIT)]
+
+_state = {'activo': True, 'recargar': False, 'permisos': None}
+_permitsLock = threading.Lock()
+
+# METODO: se crea el socket del servicio en el proceso principal; los procesos lo heredan y aceptan conexiones de él
+# PARAMETROS DE ENTRADA:
+# - host(String): dirección
+# - port(Int): puerto
+# PARAMETROS DE SALIDA:
+# - listener(Socket): socket escuchando
+def createListener(host, port):
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen(128)
+    return listener
+
+# METODO: se crean los semáforos de los grupos de rutas. Se crean en el proceso principal para que los compartan todos
+# los procesos, así el límite es del servicio y no de cada proceso.
+# PARAMETROS DE ENTRADA:
+# - groups(List): grupos (nombre, expresión de la ruta, límite)
+# PARAMETROS DE SALIDA:
+# - limits(List): grupos (nombre, expresión compilada, semáforo)
+def createLimits(groups=GROUPS):
+    return [(name, re.compile(pattern), multiprocessing.BoundedSemaphore(limit)) for name, pattern, limit in groups]
+
+# METODO: se envuelve la aplicación WSGI con los límites de concurrencia: una solicitud de un grupo espera a lo sumo
+# WAIT_TIMEOUT segundos un lugar libre y, si no lo obtiene, se responde 503 con Retry-After
+# PARAMETROS DE ENTRADA:
+# - application(Function): aplicación WSGI
+# - limits(List): grupos (nombre, expresión compilada, semáforo)
+# PARAMETROS DE SALIDA:
+# - application(Function): aplicación WSGI con límites
+def limitConcurrency(application, limits):
+    def limited(environ, startResponse):
+        path = environ.get('PATH_INFO', '')
+        for index in range(len(limits)):
+            name, pattern, semaphore = limits[index]
+            if pattern.match(path):
+                break
+        else:
+            return application(environ, startResponse)
+
+        if(not acquirePermit(semaphore, index)):
+            startResponse('503 Service Unavailable', [('Content-Type', 'application/json'), ('Retry-After', '30')])
+            return ['{"error": "Limite de solicitudes de %s alcanzado"}' % name]
+        try:
+            return LimitedResponse(application(environ, startResponse), semaphore, index)
+        except BaseException:
+            releasePermit(semaphore, index)
+            raise
+    return limited
+
+# METODO: se toma un lugar de un grupo de rutas, esperando a lo sumo WAIT_TIMEOUT segundos. El proceso lleva la cuenta
+# de los lugares que tiene tomados en un arreglo compartido con el proceso principal, así si el proceso muere (o sale
+# sin que terminen sus solicitudes) el proceso principal libera sus lugares (ver releaseWorkerPermits).
+# PARAMETROS DE ENTRADA:
+# - semaphore(Semaphore): semáforo del grupo
+# - index(Int): posición del grupo
+# PARAMETROS DE SALIDA:
+# - acquired(Bool): si se obtuvo el lugar
+def acquirePermit(semaphore, index):
+    if(not semaphore.acquire(True, WAIT_TIMEOUT)):
+        return False
+    permits = _state['permisos']
+    if permits is not None:
+        with _permitsLock:
+            permits[index] += 1
+    return True
+
+# METODO: se libera un lugar de un grupo de rutas tomado con acquirePermit
+# PARAMETROS DE ENTRADA:
+# - semaphore(Semaphore): semáforo del grupo
+# - index(Int): posición del grupo
+# PARAMETROS DE SALIDA:
+# - Ninguno
+def releasePermit(semaphore, index):
+    permits = _state['permisos']
+    if permits is not None:
+        with _permitsLock:
+            permits[index] -= 1
+    semaphore.release()
+
+# METODO: en el proceso principal, se liberan los lugares que un proceso del servicio que terminó tenía tomados
+# PARAMETROS DE ENTRADA:
+# - limits(List): grupos (nombre, expresión compilada, semáforo)
+# - permits(Array): lugares tomados por el proceso, por grupo
+# PARAMETROS DE SALIDA:
+# - Ninguno
+def releaseWorkerPermits(limits, permits):
+    for index in range(len(limits)):
+        for i in range(permits[index]):
+            try:
+                limits[index][2].release()
+            except ValueError:
+                # El proceso alcanzó a liberar el lugar pero no a descontarlo
+                break
+        permits[index] = 0
+
+# Clase de la respuesta de una solicitud con límite de concurrencia: el lugar se libera cuando el servidor cierra la
+# respuesta, así una respuesta que se genera por partes lo mantiene hasta el final
+class LimitedResponse(object):
+
+    # METODO: se crea la respuesta
+    # PARAMETROS DE ENTRADA
+    # - result(Iterable): respuesta de la aplicación WSGI
+    # - semaphore(Semaphore): semáforo del grupo de la ruta, ya tomado
+    # - index(Int): posición del grupo
+    def __init__(self, result, semaphore, index):
+        self.result = result
+        self.semaphore = semaphore
+        self.index = index
+
+    def __iter__(self):
+        return iter(self.result)
+
+    # METODO: se cierra la respuesta y se libera su lugar, una sola vez
+    # PARAMETROS DE ENTRADA
+    # - Ninguno
+    # PARAMETROS DE SALIDA
+    # - Ninguno
+    def close(self):
+        semaphore, self.semaphore = self.semaphore, None
+        try:
+            if hasattr(self.result, 'close'):
+                self.result.close()
+        finally:
+            if semaphore is not None:
+                releasePermit(semaphore, self.index)
+
+# METODO: ciclo de un proceso del servicio: acepta conexiones del socket compartido y las atiende en sus hilos. Con
+# SIGTERM deja de aceptar conexiones, espera a que terminen las solicitudes en curso y sale.
+# PARAMETROS DE ENTRADA:
+# - listener(Socket): socket compartido
+# - application(Function): aplicación WSGI
+# PARAMETROS DE SALIDA:
+# - Ninguno
+def runWorker(listener, application):
+    server = wsgiserver.CherryPyWSGIServer(listener.getsockname(), application, numthreads=THREADS,
+                                           shutdown_timeout=SHUTDOWN_TIMEOUT)
+    server.software = 'ServicesDisolution'
+    server.socket = listener
+
+    def stop(signum, frame):
+        server.ready = False
+    signal.signal(signal.SIGTERM, stop)
+    # El proceso principal decide cuándo salir y cuándo recargar
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGHUP, signal.SIG_IGN)
+
+    # Con espera el ciclo revisa cada segundo si debe salir; si otro proceso tomó la conexión accept solo retorna
+    listener.settimeout(1)
+    server.requests.start()
+    server.ready = True
+    while server.ready:
+        server.tick()
+    # Al vencer su plazo ThreadPool.stop espera sin límite a los hilos que siguen ocupados: se espera a lo sumo
+    # SHUTDOWN_TIMEOUT segundos y el proceso sale igual (el proceso principal libera sus lugares, ver
+    # releaseWorkerPermits)
+    def drain():
+        try:
+            server.requests.stop(SHUTDOWN_TIMEOUT)
+        except socket.error:
+            # Al vencer el plazo se cierran las conexiones ocupadas, falla si el cliente ya cerró la suya
+            pass
+    stopping = threading.Thread(target=drain)
+    stopping.daemon = True
+    stopping.start()
+    stopping.join(SHUTDOWN_TIMEOUT+1)
+    Metrics.flush(True)
+
+# METODO: se crea un proceso del servicio
+# PARAMETROS DE ENTRADA:
+# - listener(Socket): socket compartido
+# - application(Function): aplicación WSGI
+# - permits(Array): arreglo compartido en donde el proceso lleva la cuenta de sus lugares tomados (ver acquirePermit)
+# PARAMETROS DE SALIDA:
+# - pid(Int): identificador del proceso
+def spawnWorker(listener, application, permits=None):
+    pid = os.fork()
+    if(pid == 0):
+        code = 0
+        _state['permisos'] = permits
+        Metrics.reset()
+        try:
+            runWorker(listener, application)
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        os._exit(code)
+    return pid
+
+# METODO: se obtiene el estado del modelo del sistema para saber si se promovió uno nuevo: la firma de su archivo (o de
+# la versión actual del registro de modelos, ver Comparison.getModelRoute)
+# PARAMETROS DE ENTRADA:
+# - Ninguno
+# PARAMETROS DE SALIDA:
+# - state(Object): firma del archivo del modelo, o None si no se puede leer
+def getModelState():
+    try:
+        return Comparison.getSignature(Comparison.getModelRoute())
+    except (IOError, OSError):
+        return None
+
+# METODO: se envía una señal a un grupo de procesos, ignorando los que ya terminaron
+# PARAMETROS DE ENTRADA:
+# - pids(Iterable): identificadores de los procesos
+# - signum(Int): señal
+# PARAMETROS DE SALIDA:
+# - Ninguno
+def signalWorkers(pids, signum):
+    for pid in pids:
+        try:
+            os.kill(pid, signum)
+        except OSError as e:
+            if(e.errno != errno.ESRCH):
+                raise
+
+# METODO: se recogen los procesos que terminaron
+# PARAMETROS DE ENTRADA:
+# - Ninguno
+# PARAMETROS DE SALIDA:
+# - finished(List): identificadores de los procesos que terminaron
+def reapWorkers():
+    finished = []
+    while True:
+        try:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+        except OSError as e:
+            if(e.errno == errno.ECHILD):
+                break
+            raise
+        if(pid == 0):
+            break
+        finished.append(pid)
+    return finished
+
+# METODO: se atiende el servicio con varios procesos que comparten el socket. El modelo, las tablas de referencia y el
+# índice de límites se cargan en el proceso principal antes de crear los procesos (ver Workers.preload), así los
+# comparten en memoria (copia al escribir). Si un proceso termina se crea otro. Cuando cambia el modelo del sistema o
+# con SIGHUP se recarga todo en el proceso principal, se crean procesos nuevos y los anteriores terminan sus solicitudes
+# en curso antes de salir. Con SIGTERM o SIGINT todos los procesos terminan sus solicitudes y el servicio sale.
+# Los trabajos de /optimization/jobs (y los seguidos en vivo) se guardan y ejecutan en un solo proceso de trabajos
+# (ver Jobs.startService), así cualquier proceso los puede consultar o cancelar; si termina se crea otro.
+# PARAMETROS DE ENTRADA:
+# - application(Function): aplicación WSGI
+# - host(String): dirección
+# - port(Int): puerto
+# - processes(Int): número de procesos
+# PARAMETROS DE SALIDA:
+# - Ninguno
+def serve(application, host=HOST, port=PORT, processes=PROCESSES):
+    listener = createListener(host, port)
+    limits = createLimits()
+    application = limitConcurrency(application, limits)
+    # Cada proceso escribe sus métricas en una carpeta común para que /metrics reporte las de todos; las de una ejecución
+    # anterior se descartan
+    temporalMetrics = Metrics.METRICS_ROUTE is None
+    if temporalMetrics:
+        Metrics.METRICS_ROUTE = tempfile.mkdtemp(prefix='sd-metricas-')
+    else:
+        if(not os.path.isdir(Metrics.METRICS_ROUTE)):
+            os.makedirs(Metrics.METRICS_ROUTE)
+        for fileName in os.listdir(Metrics.METRICS_ROUTE):
+            if fileName.endswith(('.json', '.json.tmp')):
+                os.remove(os.path.join(Metrics.METRICS_ROUTE, fileName))
+    # Cada proceso ejecuta a lo sumo OPTIMIZATION_LIMIT optimizaciones a la vez, no necesita un trabajador por núcleo
+    if('SD_OPTIMIZACION_TRABAJADORES' not in os.environ):
+        Workers.WORKERS = min(Workers.WORKERS, OPTIMIZATION_LIMIT)
+    # Los trabajos de todos los procesos se ejecutan en el proceso de trabajos, también a lo sumo OPTIMIZATION_LIMIT
+    if('SD_TRABAJOS_PROCESOS' not in os.environ):
+        Jobs.WORKERS = OPTIMIZATION_LIMIT
+    jobsAddress = os.path.join(tempfile.mkdtemp(prefix='sd-trabajos-'), 'trabajos')
+
+    def stop(signum, frame):
+        _state['activo'] = False
+    def reload(signum, frame):
+        _state['recargar'] = True
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGHUP, reload)
+
+    # Lugares tomados por cada proceso, para liberarlos si el proceso termina sin hacerlo
+    permits = {}
+    def spawn():
+        workerPermits = multiprocessing.Array('i', len(limits), lock=False)
+        pid = spawnWorker(listener, application, workerPermits)
+        permits[pid] = workerPermits
+        return pid
+
+    Workers.preload()
+    Metrics.flush(True)
+    modelState = getModelState()
+    jobsPid = Jobs.startService(jobsAddress)
+    workers = set(spawn() for i in range(processes))
+    # Procesos de una generación anterior que terminan sus solicitudes en curso
+    draining = set()
+    print('http://%s:%d/ (%d procesos)' % (host, port, processes))
+    lastCheck = time.time()
+    while _state['activo']:
+        time.sleep(0.2)
+        for pid in reapWorkers():
+            if(pid == jobsPid):
+                jobsPid = None
+                Jobs.stopService(False)
+                if _state['activo']:
+                    jobsPid = Jobs.startService(jobsAddress)
+                continue
+            if pid in permits:
+                releaseWorkerPermits(limits, permits.pop(pid))
+            draining.discard(pid)
+            if pid in workers:
+                workers.discard(pid)
+                if _state['activo']:
+                    workers.add(spawn())
+
+        if(time.time()-lastCheck >= CHECK_INTERVAL):
+            lastCheck = time.time()
+            state = getModelState()
+            if(state is not None and state != modelState):
+                _state['recargar'] = True
+        if(_state['recargar'] and _state['activo']):
+            _state['recargar'] = False
+            Workers.preload()
+            Metrics.flush(True)
+            modelState = getModelState()
+            signalWorkers(workers, signal.SIGTERM)
+            draining.update(workers)
+            workers = set(spawn() for i in range(processes))
+            print('Procesos recargados, modelo %s' % Comparison.getModelVersion())
+
+    workers.update(draining)
+    signalWorkers(workers, signal.SIGTERM)
+    deadline = time.time()+SHUTDOWN_TIMEOUT+5
+    while(workers and time.time() < deadline):
+        finished = reapWorkers()
+        workers.difference_update(finished)
+        if jobsPid in finished:
+            jobsPid = None
+        time.sleep(0.2)
+    signalWorkers(workers, signal.SIGKILL)
+    Jobs.stopService(jobsPid is not None and jobsPid not in reapWorkers())
+    shutil.rmtree(os.path.dirname(jobsAddress), True)
+    if temporalMetrics:
+        shutil.rmtree(Metrics.METRICS_ROUTE, True)
+    listener.close()
+
+# METODO: punto de entrada de línea de comandos:
+# python -m ServicesDisolution.Server [--host HOST] [--puerto N] [--procesos N]
+# En Windows no hay fork, el servicio se atiende en un solo proceso.
+# PARAMETROS DE ENTRADA:
+# - argv(List): argumentos de la línea de comandos
+# PARAMETROS DE SALIDA:
+# - code(Int): código de salida
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Servicio de simulacion y optimizacion con varios procesos')
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--puerto', type=int, default=PORT)
+    parser.add_argument('--procesos', type=int, default=PROCESSES)
+    args = parser.parse_args(argv)
+
+    from ServicesDisolution import WebService
+    application = WebService.app.wsgifunc()
+    if(not hasattr(os, 'fork')):
+        Workers.preload()
+        server = wsgiserver.CherryPyWSGIServer((args.host, args.puerto),
+                                               limitConcurrency(application, createLimits()), numthreads=THREADS)
+        try:
+            server.start()
+        except KeyboardInterrupt:
+            server.stop()
+        return 0
+    serve(application, args.host, args.puerto, max(1, args.procesos))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
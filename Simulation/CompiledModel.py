@@ -0,0 +1,245 @@
+# -*- coding: latin-1 -*-
+import os
+import pickle
+import threading
+import numpy as np
+
+# Tipos de modelo compilado: conjunto de árboles (bosques aleatorios o árboles extremos de regresión) o
+# modelo lineal (regresión lineal, Ridge, Lasso, ElasticNet, ...)
+TREES = 'arboles'
+LINEAR = 'lineal'
+
+# Uso del modelo compilado (variable de entorno SD_MODELO_COMPILADO, '0' para usar siempre el modelo original), número
+# de filas aleatorias con las que se verifica que el modelo compilado prediga lo mismo que el original y tolerancia
+# relativa de la verificación
+ENABLED = os.environ.get('SD_MODELO_COMPILADO', '1') != '0'
+CHECK_ROWS = 2000
+TOLERANCE = 1e-9
+
+# Número máximo de filas que se predicen con un conjunto de árboles compilado. Con más filas el recorrido con NumPy es
+# más lento que el de scikit-learn y se usa el modelo original (que se carga del pickle la primera vez que se necesita).
+TREES_BATCH_LIMIT = 200
+
+# Clase del modelo compilado: solo arreglos de NumPy y una función predict vectorizada, se puede usar en lugar del
+# modelo original en cualquier llamado a predict
+class CompiledModel(object):
+
+    # METODO: se crea el modelo compilado a partir de sus arreglos
+    # PARAMETROS DE ENTRADA
+    # - arrays(Dict): arreglos del modelo compilado (ver compileModel)
+    # - estimator(Model): modelo original, o None si aún no se ha cargado
+    # - route(String): ruta del pickle del modelo original, para cargarlo cuando se necesite
+    def __init__(self, arrays, estimator=None, route=None):
+        self.arrays = arrays
+        self.kind = str(arrays['tipo'])
+        self.n_features_ = int(arrays['variables'])
+        self.estimator = estimator
+        self.route = route
+        self.lock = threading.Lock()
+
+    # METODO: se obtiene el modelo original, se carga del pickle la primera vez
+    # PARAMETROS DE ENTRADA
+    # - Ninguno
+    # PARAMETROS DE SALIDA
+    # - estimator(Model): modelo original, o None si no se conoce su pickle
+    def getEstimator(self):
+        if(self.estimator is None and self.route is not None):
+            with self.lock:
+                if self.estimator is None:
+                    modelFile = open(self.route, 'rb')
+                    self.estimator = pickle.load(modelFile)
+                    modelFile.close()
+        return self.estimator
+
+    # METODO: se realizan las predicciones de una matriz de entradas. Los lotes grandes de un conjunto de árboles se
+    # predicen con el modelo original si se conoce (ver TREES_BATCH_LIMIT).
+    # PARAMETROS DE ENTRADA
+    # - X(Array): matriz de entradas, una fila por experimento
+    # PARAMETROS DE SALIDA
+    # - estimate(Array): matriz de predicciones, una fila por experimento
+    def predict(self, X):
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        if(self.kind == TREES and len(X) > TREES_BATCH_LIMIT and self.getEstimator() is not None):
+            return self.estimator.predict(X)
+        return self.predictArrays(X)
+
+    # METODO: se realizan las predicciones de una matriz de entradas solo con los arreglos del modelo compilado
+    # PARAMETROS DE ENTRADA
+    # - X(Array): matriz de entradas, una fila por experimento
+    # PARAMETROS DE SALIDA
+    # - estimate(Array): matriz de predicciones, una fila por experimento
+    def predictArrays(self, X):
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        if(X.shape[1] != self.n_features_):
+            raise ValueError('El modelo espera %d variables y se recibieron %d' % (self.n_features_, X.shape[1]))
+        if(not np.isfinite(X).all()):
+            raise ValueError('Las entradas contienen NaN o infinito')
+        if(self.kind == LINEAR):
+            estimate = X.dot(self.arrays['coeficientes'].T)+self.arrays['intercepto']
+        else:
+            estimate = predictTrees(self.arrays, X)
+        if(int(self.arrays['salidas']) == 1):
+            return estimate.ravel()
+        return estimate
+
+# METODO: se recorren todos los árboles para todas las filas a la vez: en cada paso cada par (fila, árbol) que no está
+# en una hoja baja al hijo izquierdo o derecho según su variable y umbral. Igual que scikit-learn las entradas se
+# comparan en float32 y las predicciones de los árboles se suman en orden.
+# PARAMETROS DE ENTRADA
+# - arrays(Dict): arreglos del conjunto de árboles
+# - X(Array): matriz de entradas
+# PARAMETROS DE SALIDA
+# - estimate(Array): matriz de predicciones (filas x salidas)
+def predictTrees(arrays, X):
+    X = X.astype(np.float32).astype(np.float64)
+    feature = arrays['variable']
+    threshold = arrays['umbral']
+    left = arrays['izquierdo']
+    right = arrays['derecho']
+    roots = arrays['raices']
+    # Un par (fila, árbol) por posición; solo se siguen recorriendo los pares que aún no llegan a una hoja
+    nodes = np.tile(roots, len(X))
+    offsets = np.repeat(np.arange(len(X))*X.shape[1], len(roots))
+    flatX = X.ravel()
+    active = np.flatnonzero(left[nodes] >= 0)
+    while(len(active) > 0):
+        current = nodes[active]
+        goLeft = flatX[offsets[active]+feature[current]] <= threshold[current]
+        current = np.where(goLeft, left[current], right[current])
+        nodes[active] = current
+        active = active[left[current] >= 0]
+    nodes = nodes.reshape(len(X), len(roots))
+
+    values = arrays['valores']
+    estimate = values[nodes[:,0]].copy()
+    for tree in range(1, len(roots)):
+        estimate += values[nodes[:,tree]]
+    if(arrays['promedio']):
+        estimate /= len(roots)
+    return estimate
+
+# METODO: se obtienen los arreglos planos de un grupo de árboles de regresión de scikit-learn: los nodos de todos los
+# árboles se ponen uno tras otro y los hijos se desplazan a la posición global
+# PARAMETROS DE ENTRADA
+# - trees(List): árboles (atributo tree_ de cada estimador)
+# PARAMETROS DE SALIDA
+# - arrays(Dict): variable, umbral, hijos, valores y raíz de cada árbol
+def flattenTrees(trees):
+    offsets = np.cumsum([0]+[tree.node_count for tree in trees])
+    feature = []
+    threshold = []
+    left = []
+    right = []
+    values = []
+    for i in range(len(trees)):
+        tree = trees[i]
+        leaf = tree.children_left < 0
+        feature.append(np.where(leaf, 0, tree.feature))
+        threshold.append(tree.threshold)
+        left.append(np.where(leaf, -1, tree.children_left+offsets[i]))
+        right.append(np.where(leaf, -1, tree.children_right+offsets[i]))
+        values.append(tree.value[:,:,0])
+    return {'variable': np.concatenate(feature).astype(np.intp), 'umbral': np.concatenate(threshold),
+            'izquierdo': np.concatenate(left).astype(np.intp), 'derecho': np.concatenate(right).astype(np.intp),
+            'valores': np.concatenate(values), 'raices': offsets[:-1].astype(np.intp)}
+
+# METODO: se compila un modelo de scikit-learn en arreglos de NumPy. Se soportan bosques aleatorios y árboles extremos de
+# regresión y modelos lineales. Un solo árbol no se compila, scikit-learn ya lo recorre sin sobrecosto.
+# PARAMETROS DE ENTRADA
+# - model(Model): modelo original
+# PARAMETROS DE SALIDA
+# - compiled(CompiledModel): modelo compilado, o None si el tipo de modelo no está soportado
+def compileModel(model):
+    name = type(model).__name__
+    if(name in ('RandomForestRegressor', 'ExtraTreesRegressor') and hasattr(model, 'estimators_')):
+        arrays = flattenTrees([estimator.tree_ for estimator in model.estimators_])
+        arrays.update({'tipo': TREES, 'promedio': True, 'variables': model.n_features_,
+                       'salidas': model.n_outputs_})
+        return CompiledModel(arrays, model)
+
+    coefficients = getattr(model, 'coef_', None)
+    if(coefficients is not None and type(model).__module__.startswith('sklearn.linear_model') and
+       not hasattr(model, 'classes_')):
+        coefficients = np.atleast_2d(np.asarray(coefficients, dtype=np.float64))
+        intercept = np.asarray(getattr(model, 'intercept_', 0.0), dtype=np.float64)
+        return CompiledModel({'tipo': LINEAR, 'coeficientes': coefficients, 'intercepto': intercept,
+                              'variables': coefficients.shape[1], 'salidas': coefficients.shape[0]}, model)
+    return None
+
+# METODO: se verifica que el modelo compilado prediga lo mismo que el original: se comparan las predicciones de filas
+# aleatorias y de filas con los umbrales de los árboles (en donde una diferencia en la comparación cambia de rama)
+# PARAMETROS DE ENTRADA
+# - model(Model): modelo original
+# - compiled(CompiledModel): modelo compilado
+# - seed(Int): semilla de las filas aleatorias
+# PARAMETROS DE SALIDA
+# - equivalent(Bool): si las predicciones son iguales dentro de la tolerancia
+def verifyModel(model, compiled, seed=0):
+    rng = np.random.RandomState(seed)
+    n = compiled.n_features_
+    X = rng.normal(0, 100, (CHECK_ROWS, n))
+    if(compiled.kind == TREES):
+        arrays = compiled.arrays
+        internal = arrays['izquierdo'] >= 0
+        if(internal.any()):
+            # Cada fila toma para cada variable un umbral de algún nodo que usa esa variable, o un valor aleatorio
+            for j in range(n):
+                thresholds = arrays['umbral'][internal & (arrays['variable'] == j)]
+                if(len(thresholds) > 0):
+                    X[:,j] = rng.choice(thresholds, CHECK_ROWS)+rng.choice([0, 0, -1e-3, 1e-3], CHECK_ROWS)
+    expected = np.asarray(model.predict(X), dtype=np.float64)
+    estimate = compiled.predictArrays(X)
+    return expected.shape == estimate.shape and np.allclose(estimate, expected, rtol=TOLERANCE, atol=TOLERANCE)
+
+# METODO: se obtiene el modelo con el que se harán las predicciones: el modelo compilado si el tipo de modelo está
+# soportado y pasa la verificación, si no el modelo original
+# PARAMETROS DE ENTRADA
+# - model(Model): modelo original
+# PARAMETROS DE SALIDA
+# - model(Model): modelo compilado o el original
+def getInferenceModel(model):
+    if not ENABLED:
+        return model
+    compiled = compileModel(model)
+    if(compiled is None or not verifyModel(model, compiled)):
+        return model
+    return compiled
+
+# METODO: se guarda un modelo compilado en un archivo .npz, mucho más pequeño y rápido de cargar que el pickle
+# PARAMETROS DE ENTRADA
+# - compiled(CompiledModel): modelo compilado
+# - route(String): ruta del archivo
+# - checksum(String): checksum del pickle del que se compiló, para saber si el archivo sigue siendo válido
+# PARAMETROS DE SALIDA
+# - Ninguno
+def saveModel(compiled, route, checksum):
+    temporal = route+'.tmp'
+    output = open(temporal, 'wb')
+    np.savez(output, checksum=checksum, **compiled.arrays)
+    output.close()
+    if(os.name == 'nt' and os.path.exists(route)):
+        os.remove(route)
+    os.rename(temporal, route)
+
+# METODO: se carga un modelo compilado de un archivo .npz si corresponde al pickle con el checksum dado
+# PARAMETROS DE ENTRADA
+# - route(String): ruta del archivo
+# - checksum(String): checksum del pickle del modelo
+# - modelRoute(String): ruta del pickle, se carga si se necesita el modelo original (ver TREES_BATCH_LIMIT)
+# PARAMETROS DE SALIDA
+# - compiled(CompiledModel): modelo compilado, o None si el archivo no existe o es de otro pickle
+def loadModel(route, checksum, modelRoute=None):
+    if(not os.path.exists(route)):
+        return None
+    try:
+        stored = np.load(route)
+        arrays = dict((key, stored[key]) for key in stored.files)
+        stored.close()
+    except Exception:
+        return None
+    if(str(arrays.pop('checksum')) != checksum):
+        return None
+    for key in ('tipo', 'promedio', 'variables', 'salidas'):
+        if key in arrays:
+            arrays[key] = arrays[key][()]
+    return CompiledModel(arrays, route=modelRoute)
@@ -1,31 +1,109 @@
 # -*- coding: latin-1 -*-
 import json
+import time
+import numpy as np
+from ServicesDisolution import Metrics
 from ServicesDisolution.Retraining import Comparison
 from ServicesDisolution.DataProcessing import Processing
+from ServicesDisolution.DataProcessing import FeatureStore
+from ServicesDisolution.DataProcessing import Schema
+from ServicesDisolution.Simulation import PredictionCache
 
 # METODO: dado un conjunto de experimentos de entrada, se realiza predicciones con el actual modelo del sistema
 # PARAMETROS DE ENTRADA:
 # - experimentsJSON(JSON): arreglo de experimentos registrados
 # PARAMETROS DE SALIDA:
-# - profileEst(JSON): arreglo con los porcentajes de disolucin estimados para los experimentos
+# - profileEst(JSON): arreglo con los porcentajes de disolución estimados para los experimentos
 def makePrediction(experimentJSON):
-    # Se procesa la informacin de los experimentos para que queden organizados en una tabla segn la
-    # la estructura de estrada requerida por el simulador
-    experiments = Processing.organizeExperiment(experimentJSON)
+    # Se procesa la información de los experimentos para que queden organizados según la estructura de estrada
+    # requerida por el simulador (si el experimento ya está en el almacén de filas, sin cambios, se toma de allí)
+    experiments = FeatureStore.getFeatureRow(experimentJSON).reshape(1,-1)
     
-    #Se obtiene el actual modelo del sistema
-    model = Comparison.getModel()
+    #Se obtiene el actual modelo del sistema (se mantiene en memoria, solo se carga de nuevo si el archivo cambia)
+    start = time.time()
+    model,version = Comparison.getLoadedModel()
+    Metrics.observeStage('modelo',start)
     
-    experiments = experiments.values
+    # Si el mismo experimento ya se predijo con esta versión del modelo se toma de la caché
+    estimate = PredictionCache.predict(model,version,experiments)
     
-    estimate = model.predict(experiments)
+    data = getMeans(estimate[0])
     
-    estimate = estimate[0]
+    means_json = json.dumps(data)
+    
+    return means_json
+
+# Número de experimentos que se envían al modelo en cada llamado a predict en las predicciones por lotes
+CHUNK_SIZE = 1000
+
+# METODO: se asocian los nombres de las medias de disolución a los valores estimados para un experimento
+# PARAMETROS DE ENTRADA:
+# - estimate(Array): porcentajes de disolución estimados para un experimento
+# PARAMETROS DE SALIDA:
+# - data(Dict): porcentajes de disolución estimados con sus nombres (media1, media2, media3)
+def getMeans(estimate):
     data = {}
     names = ['media1','media2','media3']
     for i in range(len(names)):
         data[names[i]] = estimate[i]
+    return data
+
+# METODO: dado un grupo de experimentos, se organiza su información y se realizan las predicciones por bloques de
+# CHUNK_SIZE experimentos, con un solo llamado a predict por bloque. Un experimento con error no detiene el lote, su
+# resultado es un mensaje de error.
+# PARAMETROS DE ENTRADA:
+# - experimentsJSON(Iterable): experimentos registrados. Un elemento que no sea un JSON de experimento se reporta como
+#   error
+# PARAMETROS DE SALIDA:
+# - results(Generator): para cada experimento, en el orden de entrada, sus porcentajes de disolución estimados o el
+#   error que impidió la predicción
+def predictBatch(experimentsJSON):
+    model,version = Comparison.getLoadedModel()
     
-    means_json = json.dumps(data)
+    chunk = []
+    for experimentJSON in experimentsJSON:
+        chunk.append(experimentJSON)
+        if(len(chunk) == CHUNK_SIZE):
+            for result in predictChunk(model,version,chunk):
+                yield result
+            chunk = []
+    for result in predictChunk(model,version,chunk):
+        yield result
+
+# METODO: se realizan las predicciones de un bloque de experimentos con un solo llamado a predict
+# PARAMETROS DE ENTRADA:
+# - model(Model): modelo con el que se hacen las predicciones
+# - version(String): versión del modelo, para usar la caché de predicciones
+# - experimentsJSON(List): bloque de experimentos registrados
+# PARAMETROS DE SALIDA:
+# - results(List): para cada experimento, sus porcentajes de disolución estimados o el error que impidió la predicción
+def predictChunk(model, version, experimentsJSON):
+    results = [None]*len(experimentsJSON)
+    features = np.empty((len(experimentsJSON),len(Processing.ORDER)))
+    positions = []
+    for i in range(len(experimentsJSON)):
+        try:
+            if(not isinstance(experimentsJSON[i],dict)):
+                raise ValueError('Experimento no es un JSON valido')
+            FeatureStore.getFeatureRow(experimentsJSON[i],features[len(positions)])
+            positions.append(i)
+        except Schema.SchemaError as e:
+            results[i] = {'error': str(e), 'errores': e.errors}
+        except Exception as e:
+            results[i] = {'error': str(e)}
+    
+    if(len(positions) > 0):
+        estimate = PredictionCache.predict(model,version,features[:len(positions)])
+        for j in range(len(positions)):
+            results[positions[j]] = getMeans(estimate[j])
     
-    return means_json
\ No newline at end of file
+    return results
+
+# METODO: dado un arreglo de experimentos registrados, se realizan predicciones con el actual modelo del sistema
+# PARAMETROS DE ENTRADA:
+# - experimentsJSON(JSON): arreglo de experimentos registrados
+# PARAMETROS DE SALIDA:
+# - profilesEst(JSON): arreglo, en el orden de entrada, con los porcentajes de disolución estimados para cada 
+#   experimento o con el error que impidió la predicción
+def makeBatchPrediction(experimentsJSON):
+    return json.dumps(list(predictBatch(experimentsJSON)))
\ No newline at end of file
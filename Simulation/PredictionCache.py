@@ -0,0 +1,116 @@
+# -*- coding: latin-1 -*-
+import os
+import time
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+from ServicesDisolution import Metrics
+
+# Memoria máxima aproximada (bytes) y tiempo de vida (segundos) de las predicciones guardadas
+MAX_BYTES = int(os.environ.get('SD_CACHE_BYTES', 64*1024*1024))
+TTL = float(os.environ.get('SD_CACHE_TTL', 3600))
+
+# Memoria aproximada que ocupa cada entrada además de la llave y de la predicción (tupla, flotante y nodo del diccionario)
+ENTRY_OVERHEAD = 200
+
+# Predicciones guardadas: llave -> (predicción, momento en que se guardó), en orden de uso (la última es la más reciente)
+_cache = OrderedDict()
+_lock = threading.Lock()
+_state = {'bytes': 0, 'aciertos': 0, 'fallos': 0, 'versiones': 0}
+_versions = set()
+
+# METODO: se calcula la llave de una fila de entrada del simulador: hash de sus valores como flotantes de 64 bits junto
+# con la versión del modelo
+# PARAMETROS DE ENTRADA:
+# - row(Array): fila organizada según la estructura de entrada del simulador
+# - version(String): versión del modelo
+# PARAMETROS DE SALIDA:
+# - key(String): llave de la fila
+def getKey(row, version):
+    # Se suma 0.0 para que -0.0 y 0.0 tengan la misma llave
+    row = np.ascontiguousarray(row, dtype=np.float64)+0.0
+    return hashlib.sha1(str(version)+row.tobytes()).hexdigest()
+
+# METODO: se eliminan todas las predicciones guardadas
+# PARAMETROS DE ENTRADA:
+# - Ninguno
+# PARAMETROS DE SALIDA:
+# - Ninguno
+def clear():
+    with _lock:
+        _cache.clear()
+        _state['bytes'] = 0
+
+# METODO: se obtienen las estadísticas de la caché
+# PARAMETROS DE ENTRADA:
+# - Ninguno
+# PARAMETROS DE SALIDA:
+# - stats(Dict): aciertos, fallos, versiones del modelo vistas, entradas y memoria aproximada
+def getStats():
+    with _lock:
+        stats = dict(_state)
+        stats['entradas'] = len(_cache)
+        return stats
+
+# METODO: se realizan las predicciones de una matriz de entradas usando la caché: las filas ya predichas con la misma
+# versión del modelo se toman de la caché y las demas se predicen con un solo llamado a predict y se guardan. La llave
+# incluye la versión, así al cambiar el modelo no se vacía la caché (una optimización que sigue con el modelo anterior
+# y las simulaciones con el nuevo no se borran las predicciones entre sí): las del modelo anterior dejan de usarse y
+# salen por tiempo de vida o por memoria.
+# PARAMETROS DE ENTRADA:
+# - model(Model): modelo con el que se hacen las predicciones
+# - version(String): versión del modelo, si es None no se usa la caché
+# - features(Array): matriz de entradas organizadas según la estructura de entrada del simulador
+# PARAMETROS DE SALIDA:
+# - estimate(Array): matriz de predicciones, una fila por fila de entrada
+def predict(model, version, features):
+    if version is None:
+        start = time.time()
+        estimate = model.predict(features)
+        Metrics.observeStage('prediccion',start)
+        return estimate
+
+    keys = [getKey(row,version) for row in features]
+    now = time.time()
+    found = {}
+    with _lock:
+        if version not in _versions:
+            _versions.add(version)
+            _state['versiones'] = len(_versions)
+        for key in keys:
+            entry = _cache.get(key)
+            if(entry is not None and now-entry[1] <= TTL):
+                _cache[key] = _cache.pop(key)
+                found[key] = entry[0]
+        _state['aciertos'] += len(found)
+        _state['fallos'] += len(keys)-len(found)
+    Metrics.increment(Metrics.CACHE_HITS,value=len(found))
+    Metrics.increment(Metrics.CACHE_MISSES,value=len(keys)-len(found))
+
+    missing = [i for i in range(len(keys)) if keys[i] not in found]
+    if(len(missing) == 0):
+        return np.array([found[key] for key in keys])
+
+    start = time.time()
+    missingEstimate = np.asarray(model.predict(features[missing]))
+    Metrics.observeStage('prediccion',start)
+    estimate = np.empty((len(keys),)+missingEstimate.shape[1:], dtype=missingEstimate.dtype)
+    for i in range(len(keys)):
+        if keys[i] in found:
+            estimate[i] = found[keys[i]]
+    estimate[missing] = missingEstimate
+
+    with _lock:
+        for j in range(len(missing)):
+            key = keys[missing[j]]
+            if key in _cache:
+                _state['bytes'] -= len(key)+_cache.pop(key)[0].nbytes+ENTRY_OVERHEAD
+            value = missingEstimate[j].copy()
+            _cache[key] = (value, now)
+            _state['bytes'] += len(key)+value.nbytes+ENTRY_OVERHEAD
+        while(_state['bytes'] > MAX_BYTES and len(_cache) > 0):
+            key, entry = _cache.popitem(last=False)
+            _state['bytes'] -= len(key)+entry[0].nbytes+ENTRY_OVERHEAD
+
+    return estimate
@@ -0,0 +1,144 @@
+# -*- coding: latin-1 -*-
+import os
+import math
+import time
+import numpy as np
+import pandas as pd
+from ServicesDisolution import Metrics
+from ServicesDisolution.Retraining import Comparison
+from ServicesDisolution.DataProcessing import Processing
+from ServicesDisolution.DataProcessing import Schema
+from ServicesDisolution.Optimization import OptimizationExperiment
+from ServicesDisolution.Simulation import Prediction
+
+# Tipos de muestreo: malla (todas las combinaciones de valores equiespaciados) o hipercubo latino
+GRID = 'malla'
+LHS = 'lhs'
+
+# Número máximo de puntos de un barrido
+MAX_POINTS = int(os.environ.get('SD_BARRIDO_PUNTOS', 100000))
+
+# EXCEPCION: la solicitud de barrido no es válida (variables, rangos, muestreo o número de puntos), el cliente la debe
+# corregir. Los demas errores no son del cliente.
+class SweepError(ValueError):
+    pass
+
+# METODO: se decide si un valor de la solicitud es un número finito
+# PARAMETROS DE ENTRADA:
+# - value(Object): valor
+# PARAMETROS DE SALIDA:
+# - number(Bool): si es un número finito
+def isNumber(value):
+    return isinstance(value, (int, long, float)) and not isinstance(value, bool) and not math.isinf(value) and \
+        not math.isnan(value)
+
+# METODO: se obtienen los puntos de un barrido en el espacio normalizado [0,1] de las variables
+# PARAMETROS DE ENTRADA:
+# - sampling(String): tipo de muestreo, GRID o LHS
+# - points(Int): con GRID número de valores por variable, con LHS número total de puntos
+# - dimensions(Int): número de variables
+# - seed(Int): semilla del muestreo LHS
+# PARAMETROS DE SALIDA:
+# - unit(Array): matriz de puntos (puntos x variables) con valores entre 0 y 1
+def getUnitSample(sampling, points, dimensions, seed=None):
+    if(isinstance(points, bool) or not isinstance(points, (int, long)) or points < 1):
+        raise SweepError('El numero de puntos debe ser un entero mayor o igual a 1')
+    if(sampling == GRID):
+        total = points**dimensions
+        if(total > MAX_POINTS):
+            raise SweepError('El barrido tiene %d puntos, el maximo es %d' % (total,MAX_POINTS))
+        axis = np.linspace(0,1,points) if points > 1 else np.array([0.5])
+        grid = np.meshgrid(*([axis]*dimensions), indexing='ij')
+        return np.column_stack([g.ravel() for g in grid])
+    if(sampling == LHS):
+        if(points > MAX_POINTS):
+            raise SweepError('El barrido tiene %d puntos, el maximo es %d' % (points,MAX_POINTS))
+        # Cada variable se divide en tantos intervalos como puntos y cada intervalo se usa una sola vez
+        rng = np.random.RandomState(seed)
+        strata = np.column_stack([rng.permutation(points) for _ in range(dimensions)])
+        return (strata+rng.rand(points,dimensions))/points
+    raise SweepError('Tipo de muestreo desconocido: %s' % sampling)
+
+# METODO: se obtienen los límites del barrido de cada variable: los enviados en la solicitud o, por defecto, los límites
+# de la tabla de entradas (ver OptimizationExperiment.getBounds). SweepError si los rangos no son válidos.
+# PARAMETROS DE ENTRADA:
+# - variables(DataFrame): tabla de variables del barrido
+# - ranges(Dict): límites [mínimo, máximo] por variable enviados en la solicitud
+# - percentiles(List): percentiles de la tabla de entradas para los límites por defecto, ya validados (ver
+#   Schema.decodePercentiles), o None para mínimo y máximo
+# PARAMETROS DE SALIDA:
+# - lb(Array): límites inferiores
+# - ub(Array): límites superiores
+def getRanges(variables, ranges, percentiles=None):
+    if not isinstance(ranges, dict):
+        raise SweepError('Los rangos deben ser un objeto {variable: [minimo, maximo]}')
+    for name, limits in ranges.items():
+        if(not isinstance(limits, list) or len(limits) != 2 or not all(isNumber(value) for value in limits)
+           or limits[0] > limits[1]):
+            raise SweepError('El rango de %s debe ser [minimo, maximo]' % name)
+    names = list(variables.variables)
+    missing = [name for name in names if name not in ranges]
+    lb = np.empty(len(names))
+    ub = np.empty(len(names))
+    if missing:
+        lbMissing,ubMissing = OptimizationExperiment.getBounds(pd.DataFrame(missing,columns=['variables']),percentiles)
+        for i in range(len(missing)):
+            lb[names.index(missing[i])] = lbMissing[i]
+            ub[names.index(missing[i])] = ubMissing[i]
+    for name in names:
+        if name in ranges:
+            lb[names.index(name)],ub[names.index(name)] = ranges[name]
+    return (lb, ub)
+
+# METODO: se evalúa un barrido de una o varias variables de un experimento: se construye de una vez la matriz de
+# entradas de todos los puntos (aplicando la consistencia entre excipientes y tamaños de partícula de la optimización),
+# se predice por bloques de Prediction.CHUNK_SIZE puntos y, si se envía un perfil de referencia, se calcula el F2 de
+# cada punto. Las predicciones no pasan por la caché, los puntos de un barrido rara vez se repiten.
+# PARAMETROS DE ENTRADA:
+# - fJSON(JSON): solicitud con el experimento ('experimento'), las variables ('variables'), opcionalmente sus límites
+#   ('rangos', por ejemplo {'durezaPromedio': [5,12]}, por defecto los de la tabla de entradas limitados por
+#   'percentiles'), el tipo de muestreo ('muestreo': 'malla' o 'lhs', por defecto 'malla'), el número de puntos
+#   ('puntos': por variable en la malla, en total en lhs), la semilla ('semilla') y el perfil de referencia ('perfil')
+# PARAMETROS DE SALIDA:
+# - data(Dict): resultado en columnas: valores evaluados de cada variable ('variables'), medias estimadas ('media1',
+#   'media2', 'media3'), F2 si se envió un perfil ('f2') y número de puntos ('puntos')
+def makeSweep(fJSON):
+    # Se valida la solicitud antes de consultar tablas o modelo (Schema.SchemaError si no es válida)
+    fJSON = Schema.decodeSweep(fJSON)
+    experiment = Processing.organizeExperiment(fJSON['experimento'])
+    variables = pd.DataFrame(fJSON['variables'],columns=['variables'])
+    if(len(variables) == 0):
+        raise SweepError('Se debe enviar al menos una variable')
+    unknown = [name for name in variables.variables if name not in experiment.columns]
+    if unknown:
+        raise SweepError('Variables desconocidas: %s' % ', '.join(unknown))
+    # Un excipiente o tamaño de partícula cuyo valor asociado es cero en el experimento no se puede variar
+    fixed = variables[~variables.variables.isin(OptimizationExperiment.eliminateVariables(variables,experiment).variables)]
+    if len(fixed):
+        raise SweepError('Variables con su variable asociada en cero: %s' % ', '.join(fixed.variables))
+
+    lb,ub = getRanges(variables,fJSON.get('rangos') or {},fJSON.get('percentiles'))
+    unit = getUnitSample(fJSON.get('muestreo',GRID),fJSON.get('puntos',10),len(variables),fJSON.get('semilla'))
+    compiled = OptimizationExperiment.compileVariables(variables,experiment)
+    X = OptimizationExperiment.ensureConsistency(lb+unit*(ub-lb),compiled)
+
+    model,version = Comparison.getLoadedModel()
+    row = experiment.values
+    estimate = np.empty((len(X),3))
+    for start in range(0,len(X),Prediction.CHUNK_SIZE):
+        chunk = X[start:start+Prediction.CHUNK_SIZE]
+        features = np.repeat(row,len(chunk),axis=0)
+        features[:,compiled['columnas']] = chunk
+        stageStart = time.time()
+        estimate[start:start+len(chunk)] = model.predict(features)
+        Metrics.observeStage('prediccion',stageStart)
+
+    data = {'puntos': len(X), 'variables': {}}
+    for i in range(len(variables)):
+        data['variables'][variables.variables[i]] = X[:,i].tolist()
+    for i in range(3):
+        data['media%d' % (i+1)] = estimate[:,i].tolist()
+    if fJSON.get('perfil'):
+        reference = OptimizationExperiment.getProfile(fJSON['perfil'])
+        data['f2'] = Comparison.validateF2([reference],estimate).tolist()
+    return data
@@ -1,57 +1,372 @@
 #!/usr/bin/env python
+# -*- coding: latin-1 -*-
+import re
 import json
+import time
 
 import web
 import xml.etree.ElementTree as ET
+from ServicesDisolution import Metrics
+from ServicesDisolution import Profiling
 from ServicesDisolution.Simulation import Prediction
-from ServicesDisolution.DataProcessing import Processing
-from ServicesDisolution.Optimization import OptimizationExperiment
+from ServicesDisolution.Simulation import Sweep
+from ServicesDisolution.DataProcessing import Bulk
+from ServicesDisolution.DataProcessing import FeatureStore
+from ServicesDisolution.DataProcessing import Schema
+from ServicesDisolution.Optimization import Workers
+from ServicesDisolution.Optimization import Jobs
 
 urls = (
     '/simulator', 'simulator',
+    '/simulator/batch', 'simulatorBatch',
+    '/sweep', 'sweep',
     '/data_processing', 'dataProcessing',
+    '/data_processing/bulk', 'dataProcessingBulk',
     '/optimization', 'optimization',
+    '/optimization/stream', 'optimizationStream',
+    '/optimization/jobs', 'optimizationJobs',
+    '/optimization/jobs/([0-9a-f]+)', 'optimizationJob',
+    '/metrics', 'metrics',
+    '/profiling/([0-9a-f]+)', 'profiling',
 )
 
 app = web.application(urls, globals())
 
+# Rutas del servicio con el nombre de su clase, con el que se etiquetan las métricas de las solicitudes (así los
+# identificadores de los trabajos no crean una serie cada uno)
+routes = [(re.compile('^' + urls[i] + r'\Z'), urls[i + 1]) for i in range(0, len(urls), 2)]
+
+# METODO: se obtiene el nombre de la ruta de una solicitud (ver routes)
+# PARAMETROS DE ENTRADA:
+# - path(String): ruta de la solicitud
+# PARAMETROS DE SALIDA:
+# - name(String): nombre de la clase que atiende la ruta, u 'otra' si ninguna la atiende
+def getRouteName(path):
+    for pattern, name in routes:
+        if pattern.match(path):
+            return name
+    return 'otra'
+
+# METODO: procesador de web.py que registra la duración de cada solicitud y cuenta las solicitudes y los errores
+# (código 4xx o 5xx, o una excepción) por ruta
+# PARAMETROS DE ENTRADA:
+# - handler(Function): función que atiende la solicitud
+# PARAMETROS DE SALIDA:
+# - result(Object): respuesta de la solicitud
+def measureRequest(handler):
+    start = time.time()
+    route = getRouteName(web.ctx.path)
+    failed = True
+    try:
+        result = handler()
+        failed = not web.ctx.status.startswith(('2', '3'))
+        return result
+    except web.HTTPError:
+        failed = not web.ctx.status.startswith(('2', '3'))
+        raise
+    finally:
+        Metrics.observe(Metrics.REQUEST_SECONDS, time.time() - start, route)
+        Metrics.increment(Metrics.REQUESTS, route)
+        if failed:
+            Metrics.increment(Metrics.ERRORS, route)
+        Metrics.flush()
+
+app.add_processor(measureRequest)
+
+# METODO: procesador de web.py que perfila una fracción de las solicitudes, o las que llevan el encabezado X-Perfilar
+# (ver Profiling.shouldProfile). El identificador del perfil se retorna en el encabezado X-Perfil-Id. Una optimización
+# se perfila en el trabajador que la ejecuta (ver Workers.runOptimization), no en el hilo de la solicitud.
+# PARAMETROS DE ENTRADA:
+# - handler(Function): función que atiende la solicitud
+# PARAMETROS DE SALIDA:
+# - result(Object): respuesta de la solicitud
+def profileRequest(handler):
+    route = getRouteName(web.ctx.path)
+    if not Profiling.shouldProfile(route, web.ctx.env):
+        return handler()
+
+    profileId = Profiling.newProfileId()
+    web.ctx.profileId = profileId
+    web.header('X-Perfil-Id', profileId)
+    start = time.time()
+    try:
+        if route == 'optimization':
+            return handler()
+        return Profiling.runProfiled(profileId, handler)
+    finally:
+        Profiling.saveRequest(profileId, route, time.time() - start)
+
+# Sin perfilamiento el procesador no se instala
+if Profiling.ENABLED:
+    app.add_processor(profileRequest)
+
+# METODO: se crea la respuesta 400 de una solicitud no válida, con el error en JSON. Los errores de esquema incluyen
+# además todos los campos con problemas ('errores'), así el cliente los corrige todos a la vez.
+# PARAMETROS DE ENTRADA:
+# - error(Exception): error de la solicitud
+# PARAMETROS DE SALIDA:
+# - response(HTTPError): respuesta 400
+def badRequest(error):
+    body = {'error': str(error)}
+    if isinstance(error, Schema.SchemaError):
+        body['errores'] = error.errors
+    return web.HTTPError('400 Bad Request', {'Content-Type': 'application/json'}, json.dumps(body))
+
+# METODO: se lee el cuerpo JSON de la solicitud; si no es un JSON válido se responde 400 antes de consultar tablas o
+# el modelo
+# PARAMETROS DE ENTRADA:
+# - Ninguno
+# PARAMETROS DE SALIDA:
+# - data(JSON): cuerpo de la solicitud
+def readJSON():
+    try:
+        return json.loads(web.data())
+    except ValueError:
+        raise badRequest(ValueError('Datos enviados no son un JSON Valido'))
+
+# METODO: se lee y decodifica el experimento del cuerpo de la solicitud (ver Schema.decodeExperiment), 400 si no es
+# válido. Se pasa el experimento decodificado para que el procesamiento no vuelva a recorrer el JSON.
+# PARAMETROS DE ENTRADA:
+# - Ninguno
+# PARAMETROS DE SALIDA:
+# - experiment(Experiment): experimento decodificado
+def readExperiment():
+    try:
+        return Schema.decodeExperiment(readJSON())
+    except Schema.SchemaError as e:
+        raise badRequest(e)
+
+# METODO: se lee y valida la solicitud de optimización del cuerpo de la solicitud (ver Schema.decodeOptimization), 400
+# si no es válida
+# PARAMETROS DE ENTRADA:
+# - Ninguno
+# PARAMETROS DE SALIDA:
+# - fJSON(Dict): solicitud de optimización con el experimento decodificado
+def readOptimization():
+    try:
+        return Schema.decodeOptimization(readJSON())
+    except Schema.SchemaError as e:
+        raise badRequest(e)
+
 class simulator:
     def POST(self):
+        experiment = readExperiment()
         web.header('Content-Type', 'application/json')
+        return Prediction.makePrediction(experiment)
+
+# METODO: se leen los experimentos de un cuerpo NDJSON, uno por línea. Una línea que no es un JSON válido se pasa como
+# None para que el lote la reporte como error de ese elemento.
+# PARAMETROS DE ENTRADA:
+# - requestData(String): cuerpo de la solicitud
+# PARAMETROS DE SALIDA:
+# - experiments(Generator): experimentos, o None por cada línea no válida
+def readNDJSON(requestData):
+    for line in requestData.splitlines():
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+
+class simulatorBatch:
+    def POST(self):
         requestJSON = web.data()
-        json_load = ""
+        contentType = web.ctx.env.get('CONTENT_TYPE', '')
+        if 'ndjson' in contentType or not requestJSON.lstrip().startswith('['):
+            web.header('Content-Type', 'application/x-ndjson')
+            results = Prediction.predictBatch(readNDJSON(requestJSON))
+            return ''.join(json.dumps(result) + '\n' for result in results)
+
         try:
             json_load = json.loads(requestJSON)
         except ValueError:
-            print "Datos enviados no son un JSON Valido"
+            raise badRequest(ValueError('Datos enviados no son un JSON Valido'))
+        if not isinstance(json_load, list):
+            raise badRequest(ValueError('Se debe enviar un arreglo de experimentos'))
 
-        return Prediction.makePrediction(json_load)
+        # Los experimentos no válidos se reportan en su elemento (con sus errores de esquema), el resto del lote se
+        # predice igual
+        web.header('Content-Type', 'application/json')
+        return Prediction.makeBatchPrediction(json_load)
+
+class sweep:
+    def POST(self):
+        json_load = readJSON()
+        try:
+            data = Sweep.makeSweep(json_load)
+        except (Schema.SchemaError, Sweep.SweepError) as e:
+            raise badRequest(e)
+
+        web.header('Content-Type', 'application/json')
+
+        return json.dumps(data, separators=(',', ':'))
 
 class dataProcessing:
     def POST(self):
+        experiment = readExperiment()
         web.header('Content-Type', 'application/json')
-        requestJSON = web.data()
-        json_load = ""
+        return FeatureStore.getInputExperiment(experiment)
+
+# METODO: se obtiene el largo del cuerpo de la solicitud. Un cuerpo sin Content-Length ni Transfer-Encoding: chunked no
+# se distingue de uno vacío y se responde 411.
+# PARAMETROS DE ENTRADA:
+# - Ninguno
+# PARAMETROS DE SALIDA:
+# - length(Int): largo del cuerpo, o None si se envía por partes (se lee hasta el final)
+def readBodyLength():
+    length = web.ctx.env.get('CONTENT_LENGTH')
+    if length:
+        return int(length)
+    if 'chunked' in web.ctx.env.get('HTTP_TRANSFER_ENCODING', '').lower():
+        return None
+    raise web.HTTPError('411 Length Required', {'Content-Type': 'application/json'},
+                        json.dumps({'error': 'Se requiere Content-Length o Transfer-Encoding: chunked'}))
+
+# METODO: se leen las líneas del cuerpo de la solicitud en bloques de 1 MB de la entrada WSGI en lugar de web.data(),
+# así una carga NDJSON grande nunca está completa en memoria. Las líneas se separan aquí (la entrada por partes del
+# servidor incluido no tiene readline); una línea más larga que un bloque se une antes de retornarla.
+# PARAMETROS DE ENTRADA:
+# - remaining(Int): largo del cuerpo, o None para leer hasta el final (ver readBodyLength)
+# PARAMETROS DE SALIDA:
+# - lines(Generator): líneas del cuerpo
+def readBodyLines(remaining):
+    body = web.ctx.env['wsgi.input']
+    pieces = []
+    while remaining is None or remaining > 0:
+        size = 1024*1024 if remaining is None else min(remaining, 1024*1024)
+        block = body.read(size)
+        if not block:
+            break
+        if remaining is not None:
+            remaining -= len(block)
+        lines = block.split('\n')
+        pieces.append(lines[0])
+        if len(lines) > 1:
+            yield ''.join(pieces)+'\n'
+            for line in lines[1:-1]:
+                yield line+'\n'
+            pieces = [lines[-1]]
+    if ''.join(pieces):
+        yield ''.join(pieces)
+
+class dataProcessingBulk:
+    def POST(self):
+        web.header('Content-Type', 'application/json')
+        params = web.input(_method='get', procesos='1')
         try:
-            json_load = json.loads(requestJSON)
+            workers = int(params.procesos)
         except ValueError:
-            print "Datos enviados no son un JSON Valido"
-        
-        return Processing.getInputExperiment(json_load)
+            raise web.badrequest("procesos debe ser un entero")
+        if workers < 1:
+            raise web.badrequest("procesos debe ser mayor o igual a 1")
+        length = readBodyLength()
+
+        return json.dumps(Bulk.processBatch(readBodyLines(length), workers))
 
 class optimization:
     
     def POST(self):
-        print('llegooo')
+        fJSON = readOptimization()
+        web.header('Content-Type', 'application/json')
+        return Workers.runOptimization(fJSON, web.ctx.get('profileId'))
+
+class optimizationJobs:
+
+    def POST(self):
+        fJSON = readOptimization()
         web.header('Content-Type', 'application/json')
-        requestJSON = web.data()
-        json_load = ""
         try:
-            json_load = json.loads(requestJSON)
+            jobId = Jobs.submitJob(fJSON)
+        except Jobs.QueueFull as e:
+            raise queueFull(e)
+
+        web.ctx.status = '202 Accepted'
+        return json.dumps({'id': jobId, 'estado': Jobs.QUEUED})
+
+# METODO: se crea la respuesta 503 de una solicitud de optimización cuando la cola de trabajos está llena
+# PARAMETROS DE ENTRADA:
+# - error(QueueFull): error de la cola de trabajos
+# PARAMETROS DE SALIDA:
+# - response(HTTPError): respuesta 503 con Retry-After
+def queueFull(error):
+    return web.HTTPError('503 Service Unavailable', {'Content-Type': 'application/json', 'Retry-After': '30'},
+                         json.dumps({'error': str(error)}))
+
+# METODO: se escribe cada evento como una línea NDJSON. Si el cliente se desconecta el servidor descarta la respuesta y
+# se cierra el generador de eventos, lo que cancela su trabajo (ver Jobs.streamJob).
+# PARAMETROS DE ENTRADA:
+# - events(Generator): eventos
+# PARAMETROS DE SALIDA:
+# - lines(Generator): líneas NDJSON
+def writeNDJSON(events):
+    try:
+        for event in events:
+            yield json.dumps(event) + '\n'
+    finally:
+        events.close()
+
+# Clase de la optimización seguida en vivo: se ejecuta como un trabajo y su avance se envía en NDJSON. La primera línea
+# tiene el identificador del trabajo (DELETE /optimization/jobs/<id> lo cancela), luego cada ?cada=K iteraciones el
+# mejor F2, las mejores variables hasta el momento y las evaluaciones usadas, y la última línea tiene el mismo mensaje
+# de /optimization. Si el cliente se desconecta la optimización también se cancela.
+class optimizationStream:
+
+    def POST(self):
+        fJSON = readOptimization()
+        params = web.input(_method='get', cada=str(Jobs.PROGRESS_EVERY))
+        try:
+            every = max(int(params.cada), 1)
         except ValueError:
-            print "Datos enviados no son un JSON Valido"
-        
-        return OptimizationExperiment.makeOptimization(json_load)
+            raise badRequest(ValueError('cada debe ser un entero'))
+
+        try:
+            jobId = Jobs.submitJob(fJSON)
+        except Jobs.QueueFull as e:
+            raise queueFull(e)
+
+        web.header('Content-Type', 'application/x-ndjson')
+        web.header('Cache-Control', 'no-cache')
+        return writeNDJSON(Jobs.streamJob(jobId, every))
+
+class optimizationJob:
+
+    def GET(self, jobId):
+        web.header('Content-Type', 'application/json')
+        job = Jobs.getJob(jobId)
+        if job is None:
+            raise web.notfound()
+        return json.dumps(job)
+
+    def DELETE(self, jobId):
+        web.header('Content-Type', 'application/json')
+        job = Jobs.cancelJob(jobId)
+        if job is None:
+            raise web.notfound()
+        return json.dumps(job)
+
+class metrics:
+
+    def GET(self):
+        web.header('Content-Type', 'text/plain; version=0.0.4')
+        return Metrics.render()
+
+class profiling:
+
+    def GET(self, profileId):
+        params = web.input(formato='json')
+        if params.formato == 'pstats':
+            content = Profiling.getDump(profileId)
+            if content is None:
+                raise web.notfound()
+            web.header('Content-Type', 'application/octet-stream')
+            web.header('Content-Disposition', 'attachment; filename="%s.prof"' % profileId)
+            return content
+
+        web.header('Content-Type', 'application/json')
+        summary = Profiling.getSummary(profileId)
+        if summary is None:
+            raise web.notfound()
+        return json.dumps(summary)
 
 if __name__ == "__main__":
     app.run()